@@ -43,11 +43,13 @@ from utils import dump_yaml_rt, is_debug_mode, load_yaml_rt, timems, version, st
 from website import (ab_proxying, achievements, admin, auth_pages, aws_helpers,
                      cdn, classes, database, for_teachers, s3_logger, parsons,
                      profile, programs, querylog, quiz, statistics,
-                     translating, tags, surveys, public_adventures, user_activity)
+                     translating, tags, surveys, public_adventures, user_activity, transpile_cache,
+                     transpile_pool, preload)
 from website.auth import (current_user, is_admin, is_teacher, is_second_teacher, has_public_profile,
                           login_user_from_token_cookie, requires_login, requires_login_redirect, requires_teacher,
                           forget_current_user)
 from website.log_fetcher import log_fetcher
+from website.yaml_file import YAML_CACHE
 from website.frontend_types import Adventure, Program, ExtraStory, SaveInfo
 
 
@@ -107,6 +109,12 @@ ACHIEVEMENTS_TRANSLATIONS = hedyweb.AchievementTranslations()
 DATABASE = database.Database()
 ACHIEVEMENTS = achievements.Achievements(DATABASE, ACHIEVEMENTS_TRANSLATIONS)
 SURVEYS = surveys.SurveysModule(DATABASE)
+TRANSPILE_POOL = transpile_pool.TranspilePool(app, **config['transpile-pool'])
+TRANSPILE_CACHE = transpile_cache.TranspileCache(config['transpile-cache']['max_bytes'], backend=TRANSPILE_POOL)
+# The maximum number of programs that can be transpiled with one call to /parse/batch
+MAX_BATCH_PROGRAMS = 100
+# The time /parse/detect-level may take to find the lowest level at which a program is valid
+LEVEL_DETECTION_TIMEOUT_SECONDS = 10
 
 TAGS = collections.defaultdict(hedy_content.NoSuchAdventure)
 for lang in ALL_LANGUAGES.keys():
@@ -295,6 +303,8 @@ def before_request_begin_logging():
 @app.after_request
 def after_request_log_status(response):
     querylog.log_value(http_code=response.status_code)
+    YAML_CACHE.log_stats()
+    preload.log_memory_usage()
     return response
 
 
@@ -520,6 +530,8 @@ def parse():
         return "if present, body.adventure_name must be a string", 400
     if 'is_debug' not in body:
         return "body.is_debug must be a boolean", 400
+    if 'source_map' in body and not isinstance(body['source_map'], bool):
+        return "if present, body.source_map must be a boolean", 400
     error_check = False
     if 'error_check' in body:
         error_check = True
@@ -534,6 +546,9 @@ def parse():
 
     # true if kid enabled the read aloud option
     read_aloud = body.get('read_aloud', False)
+    # The whole source map is only needed by the debugger, otherwise we only send the
+    # mappings with errors, so that the client can underline the faulty code
+    full_source_map = body.get('source_map', False)
 
     response = {}
     username = current_user()['username'] or None
@@ -568,15 +583,10 @@ def parse():
 
         try:
             response['Code'] = transpile_result.code
-            source_map_result = transpile_result.source_map.get_result()
+            source_map_result = transpile_result.source_map.get_compact_result(errors_only=not full_source_map)
 
-            for i, mapping in source_map_result.items():
-                if mapping['error'] is not None:
-                    source_map_result[i]['error'] = translate_error(
-                        source_map_result[i]['error'].error_code,
-                        source_map_result[i]['error'].arguments,
-                        keyword_lang
-                    )
+            for i, error in source_map_result['errors'].items():
+                source_map_result['errors'][i] = translate_error(error.error_code, error.arguments, keyword_lang)
 
             response['source_map'] = source_map_result
 
@@ -639,6 +649,18 @@ def parse():
             pass
 
     querylog.log_value(server_error=response.get('Error'))
+    TRANSPILE_CACHE.log_stats()
+    TRANSPILE_POOL.log_stats()
+    parser_cache_stats = hedy.PARSER_CACHE.stats()
+    querylog.log_value(parser_cache_entries=parser_cache_stats['entries'],
+                       parser_cache_bytes=parser_cache_stats['bytes'],
+                       parser_cache_total_hits=parser_cache_stats['hits'],
+                       parser_cache_total_misses=parser_cache_stats['misses'],
+                       parser_cache_total_evictions=parser_cache_stats['evictions'])
+    fragment_cache_stats = hedy.FRAGMENT_CACHE.stats()
+    querylog.log_value(fragment_cache_entries=fragment_cache_stats['entries'],
+                       fragment_cache_bytes=fragment_cache_stats['bytes'],
+                       fragment_cache_total_evictions=fragment_cache_stats['evictions'])
     parse_logger.log({
         'session': utils.session_id(),
         'date': str(datetime.datetime.now()),
@@ -659,6 +681,70 @@ def parse():
     return jsonify(response)
 
 
+@app.route('/parse/batch', methods=['POST'])
+@querylog.timed_as('parse_batch_handler')
+@requires_login
+def parse_batch(user):
+    body = request.json
+    if not isinstance(body, dict):
+        return "body must be an object", 400
+    programs = body.get('programs')
+    if not isinstance(programs, list):
+        return "body.programs must be a list", 400
+    if len(programs) > MAX_BATCH_PROGRAMS:
+        return f"body.programs can contain at most {MAX_BATCH_PROGRAMS} programs", 400
+    for program in programs:
+        if not isinstance(program, dict) or not isinstance(program.get('code'), str):
+            return "body.programs[].code must be a string", 400
+        if not isinstance(program.get('level'), (int, str)) or try_parse_int(program['level']) is None:
+            return "body.programs[].level must be an integer", 400
+        if 'lang' in program and not isinstance(program['lang'], str):
+            return "if present, body.programs[].lang must be a string", 400
+    if 'is_debug' in body and not isinstance(body['is_debug'], bool):
+        return "if present, body.is_debug must be a boolean", 400
+
+    items = [(p['code'], int(p['level']), p.get('lang', g.lang)) for p in programs]
+    querylog.log_value(batch_programs=len(items), batch_unique_programs=len(set(items)))
+
+    response = []
+    for result in transpile_many(items, is_debug=body.get('is_debug', False)):
+        if result.error is None:
+            response.append({'Code': result.result.code,
+                             'has_turtle': result.result.has_turtle,
+                             'has_pygame': result.result.has_pygame,
+                             'has_clear': result.result.has_clear,
+                             'has_music': result.result.has_music})
+        elif isinstance(result.error, hedy.exceptions.HedyException):
+            if isinstance(result.error, hedy.exceptions.InputTooComplexException):
+                querylog.log_counter('program_too_complex')
+            response.append(hedy_error_to_response(result.error))
+        else:
+            response.append({'Error': str(result.error)})
+    return jsonify({'results': response})
+
+
+@app.route('/parse/detect-level', methods=['POST'])
+@querylog.timed_as('detect_level_handler')
+@requires_login
+def parse_detect_level(user):
+    body = request.json
+    if not isinstance(body, dict):
+        return "body must be an object", 400
+    if not isinstance(body.get('code'), str):
+        return "body.code must be a string", 400
+    if 'lang' in body and not isinstance(body['lang'], str):
+        return "if present, body.lang must be a string", 400
+
+    detection = detect_level(body['code'], body.get('lang', g.lang))
+    querylog.log_value(detected_level=detection.level, detect_level_invalid_levels=len(detection.errors),
+                       detect_level_timed_out=detection.timed_out)
+
+    response = {'level': detection.level, 'timed_out': detection.timed_out}
+    if detection.result is not None:
+        response['Code'] = detection.result.code
+    return jsonify(response)
+
+
 @app.route('/parse-by-id', methods=['POST'])
 @requires_login
 def parse_by_id(user):
@@ -672,7 +758,7 @@ def parse_by_id(user):
     program = DATABASE.program_by_id(body.get('id'))
     if program and program.get('username') == user['username']:
         try:
-            hedy.transpile(
+            TRANSPILE_CACHE.transpile(
                 program.get('code'),
                 program.get('level'),
                 program.get('lang')
@@ -760,16 +846,65 @@ def download_machine_file(filename, extension="zip"):
 def transpile_add_stats(code, level, lang_, is_debug):
     username = current_user()['username'] or None
     number_of_lines = code.count('\n')
+    transpile_stats = hedy.TranspileStats()
     try:
-        result = hedy.transpile(code, level, lang_, is_debug=is_debug)
+        # Students edit a program a line at a time, so most of the program was parsed before
+        result = TRANSPILE_CACHE.transpile(code, level, lang_, is_debug=is_debug, incremental=True,
+                                           stats=transpile_stats)
         statistics.add(
             username, lambda id_: DATABASE.add_program_stats(id_, level, number_of_lines, None))
         return result
     except Exception as ex:
         class_name = get_class_name(ex)
+        if isinstance(ex, hedy.exceptions.InputTooComplexException):
+            querylog.log_counter('program_too_complex')
         statistics.add(username, lambda id_: DATABASE.add_program_stats(
             id_, level, number_of_lines, class_name))
         raise
+    finally:
+        log_transpile_stats(transpile_stats)
+
+
+def transpile_many(items, **options):
+    """Transpile many (code, level, lang) programs, see hedy.transpile_many.
+
+    With the transpile pool the programs are transpiled by all its workers at the same
+    time. Otherwise they are transpiled one after the other in this process.
+
+    The transpile cache is not used: it is sized for the programs kids are editing, and
+    a batch (like the public programs on /explore) would evict those.
+    """
+    if TRANSPILE_POOL.enabled:
+        # The worker threads have no request, so they can't look up the locale themselves
+        with querylog.log_time('transpile_many'):
+            return hedy.transpile_many(items, TRANSPILE_POOL.transpile, max_workers=TRANSPILE_POOL.size,
+                                       locale=str(get_locale()), **options)
+    with querylog.log_time('transpile_many'):
+        return hedy.transpile_many(items, hedy.transpile, **options)
+
+
+def detect_level(code, lang):
+    """Find the lowest level at which the program is valid, see hedy.detect_level.
+
+    With the transpile pool the candidate levels are tried by all its workers at the same time.
+    Otherwise they are tried one after the other in this process, skipping the levels that are
+    estimated to take longer than the time that is left. The transpile cache is not used, the
+    results of the invalid levels would evict the programs kids are editing.
+    """
+    with querylog.log_time('detect_level'):
+        if TRANSPILE_POOL.enabled:
+            return hedy.detect_level(code, lang, timeout=LEVEL_DETECTION_TIMEOUT_SECONDS,
+                                     transpile_function=TRANSPILE_POOL.transpile, max_workers=TRANSPILE_POOL.size,
+                                     locale=str(get_locale()), unused_allowed=True)
+        return hedy.detect_level(code, lang, timeout=LEVEL_DETECTION_TIMEOUT_SECONDS, unused_allowed=True)
+
+
+def log_transpile_stats(transpile_stats):
+    """Write the timings and counters of the phases of a transpilation to the querylog record."""
+    querylog.log_value(**{
+        'transpile_' + name: round(value, 2) if name.endswith('_ms') else value
+        for name, value in transpile_stats.values.items()
+    })
 
 
 def get_class_name(i):
@@ -2114,10 +2249,10 @@ def normalize_public_programs(programs):
     - Change 'code' to only show the first 4 lines
     - Add 'number_lines'
     """
+    pre_process_explore_programs(programs)
+
     ret = []
     for program in programs:
-        program = pre_process_explore_program(program)
-
         ret.append(dict(program,
                         hedy_choice=True if program.get('hedy_choice') == 1 else False,
                         code="\n".join(program['code'].split("\n")[:4]),
@@ -2127,18 +2262,14 @@ def normalize_public_programs(programs):
 
 
 @querylog.timed
-def pre_process_explore_program(program):
-    # If program does not have an error value set -> parse it and set value
-    if 'error' not in program:
-        try:
-            hedy.transpile(program.get('code'), program.get('level'), program.get('lang'))
-            program['error'] = False
-        except BaseException:
-            program['error'] = True
+def pre_process_explore_programs(programs):
+    # If a program does not have an error value set -> parse it and set value
+    unchecked = [program for program in programs if 'error' not in program]
+    results = transpile_many([(p.get('code'), p.get('level'), p.get('lang')) for p in unchecked])
+    for program, result in zip(unchecked, results):
+        program['error'] = result.error is not None
         DATABASE.store_program(program)
 
-    return program
-
 
 @app.route('/highscores', methods=['GET'], defaults={'filter': 'global'})
 @app.route('/highscores/<filter>', methods=['GET'])
@@ -2685,7 +2816,22 @@ def on_server_start():
 
     Use this to initialize objects, dependencies and connections.
     """
-    pass
+    # Fork the transpile workers now, so they have loaded their parsers by the time the first program comes in
+    TRANSPILE_POOL.start()
+
+
+def preload_for_fork():
+    """Called in the gunicorn master before it forks the workers, if the app is preloaded (see gunicorn.conf.py).
+
+    Loads the content, parsers and translations that all workers need, so they share
+    a single copy of them. Must not start threads or open connections: they don't
+    survive the fork.
+    """
+    languages = [lang for lang in config['preload']['languages'] if lang in ALL_LANGUAGES]
+    content = [COMMANDS, ADVENTURES, PARSONS, QUIZZES, TUTORIALS, SLIDES]
+    preload.preload_content(per_lang[lang] for per_lang in content for lang in languages)
+    preload.preload_parsers(config['preload']['levels'])
+    preload.preload_translations(app, ALL_LANGUAGES.keys())
 
 
 def try_parse_int(x):
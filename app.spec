@@ -25,8 +25,10 @@ data_files = [
 
     # Folders
     ('content', 'content'),
+    ('content-bundle', 'content-bundle'),
     ('grammars', 'grammars'),
     ('grammars-Total', 'grammars-Total'),
+    ('parser-bundle', 'parser-bundle'),
     ('prefixes', 'prefixes'),
     ('static', 'static'),
     ('templates', 'templates'),
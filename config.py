@@ -53,4 +53,24 @@ config = {
     },
     # enables the quiz environment by setting the config variable on True
     'quiz-enabled': True,
+    'transpile-cache': {
+        # memory budget of the in-process cache of transpile results, 0 (the default) disables the cache
+        'max_bytes': int(os.getenv('TRANSPILE_CACHE_MAX_BYTES', 0)),
+    },
+    'transpile-pool': {
+        # number of worker processes that transpile programs, 0 transpiles in the web server process itself
+        'size': int(os.getenv('TRANSPILE_POOL_SIZE', 0)),
+        # wall-clock deadline in seconds for transpiling a single program, including waiting for a worker
+        'timeout': float(os.getenv('TRANSPILE_TIMEOUT_SECONDS', 10)),
+        # comma-separated levels of which the workers load the (English) parsers before they accept programs
+        'warm_levels': [int(level) for level in os.getenv('TRANSPILE_POOL_WARM_LEVELS', '').split(',') if level]
+        or list(range(1, 19)),
+    },
+    'preload': {
+        # comma-separated languages of which the gunicorn master loads the content before forking the workers
+        'languages': [lang for lang in os.getenv('PRELOAD_LANGUAGES', 'en,nl').split(',') if lang],
+        # comma-separated levels of which the gunicorn master loads the (English) parsers before forking the workers
+        'levels': [int(level) for level in os.getenv('PRELOAD_LEVELS', '').split(',') if level]
+        or list(range(1, 19)),
+    },
 }
@@ -4,17 +4,17 @@ import os
 import yaml
 
 
-def extract_Lark_grammar_from_yaml():
-    """Creates a lark file in ../grammars/ for  all yaml files located in ../content/keywords/.
-    If a keyword is not yet translated, it will use the English translation of the keyword
+dirname = os.path.dirname(__file__)
+input_path = os.path.join(dirname, 'keywords')
+current_grammar_path = os.path.join(dirname, '../grammars')
+
 
-    Args:
-        only_new_lang (bool, optional): Specifies if only a lark file should be created for a new keyword language
-        or for all languages. Defaults to True.
+def generate_Lark_grammars_from_yaml():
+    """Returns the keyword lark file for all yaml files located in ../content/keywords/,
+    as a dictionary from the file name to its content.
+    If a keyword is not yet translated, it will use the English translation of the keyword
     """
-    dirname = os.path.dirname(__file__)
-    input_path = os.path.join(dirname, 'keywords')
-    current_grammar_path = os.path.join(dirname, '../grammars')
+    grammars = {}
 
     yaml_languages = [f.replace('.yaml', '') for f in os.listdir(input_path) if
                       os.path.isfile(os.path.join(input_path, f)) and f.endswith('.yaml')]
@@ -54,12 +54,17 @@ def extract_Lark_grammar_from_yaml():
                 valid_translation = ' | '.join(['"' + option + '"' for option in options])
                 translations[k] = valid_translation
 
-        translated_template = template.format(**translations)
+        grammars['keywords-' + yaml_lang + '.lark'] = template.format(**translations)
+
+    return grammars
 
-        lark_filesname_with_path = os.path.join(current_grammar_path, 'keywords-' + yaml_lang + '.lark')
 
-        with open(lark_filesname_with_path, 'w', encoding='utf-8') as f:
-            f.write(translated_template)
+def extract_Lark_grammar_from_yaml():
+    """Creates a lark file in ../grammars/ for  all yaml files located in ../content/keywords/."""
+    for filename, grammar in generate_Lark_grammars_from_yaml().items():
+        with open(os.path.join(current_grammar_path, filename), 'w', encoding='utf-8') as f:
+            f.write(grammar)
 
 
-extract_Lark_grammar_from_yaml()
+if __name__ == '__main__':
+    extract_Lark_grammar_from_yaml()
@@ -28,6 +28,9 @@ import platform
 
 from doit.tools import LongRunning
 
+# The content directories that are compiled into the content bundle
+from website.content_bundle import BUNDLED_CONTENT
+
 if os.getenv('GITHUB_ACTION') and platform.system() == 'Windows':
     # Add MSYS2 to the path, so we can use commands like 'bash' and 'cp' and 'mv'.
     # https://github.com/actions/runner-images/blob/win22/20240204.1/images/windows/Windows2022-Readme.md
@@ -243,6 +246,43 @@ def task_lark():
     )
 
 
+def task_parser_bundle():
+    """Build the parsers for all levels and languages ahead of time."""
+    script = 'build-tools/heroku/generate-parser-bundle'
+
+    return dict(
+        title=lambda _: 'Build parser bundle',
+        file_dep=[
+            script,
+            'hedy.py',
+            *glob('grammars/*.lark'),
+        ],
+        task_dep=['lark'],
+        actions=[
+            [python3, script],
+        ],
+        targets=['parser-bundle/manifest.json'],
+    )
+
+
+def task_content_bundle():
+    """Compile the content of every language into a bundle."""
+    script = 'build-tools/heroku/generate-content-bundle'
+
+    return dict(
+        title=lambda _: 'Build content bundle',
+        file_dep=[
+            script,
+            'website/content_bundle.py',
+            *[f for content_type in BUNDLED_CONTENT for f in glob(f'content/{content_type}/*.yaml')],
+        ],
+        actions=[
+            [python3, script],
+        ],
+        targets=['content-bundle/en.bundle'],
+    )
+
+
 def task_prefixes():
     """Generate Python prefixes for TypeScript"""
     script = 'build-tools/heroku/generate-prefixes-ts'
@@ -322,6 +362,39 @@ def task_devserver():
     )
 
 
+def task_benchmark():
+    """Replay the public programs through the transpiler, and compare with the baseline.
+
+    Fails if the p50 or p95 latency of a level or language got slower than in the
+    baseline by more than 20%. Create the baseline with `doit benchmark_baseline`
+    before making a change. Timings depend on the machine, so the baseline is not
+    checked in.
+
+    No file dependencies, so this task is never skipped.
+    """
+    return dict(
+        title=lambda _: 'Benchmark the transpiler',
+        actions=[
+            [python3, '-m', 'tests.benchmarks.transpile_corpus', '--baseline', BENCHMARK_BASELINE],
+        ],
+        verbosity=2,
+    )
+
+
+def task_benchmark_baseline():
+    """Replay the public programs through the transpiler, and save the results as the baseline."""
+    return dict(
+        title=lambda _: 'Save a transpiler benchmark baseline',
+        actions=[
+            [python3, '-m', 'tests.benchmarks.transpile_corpus', '--save', BENCHMARK_BASELINE],
+        ],
+        targets=[BENCHMARK_BASELINE],
+        # Always run when invoked, the code may have changed since the last baseline
+        uptodate=[False],
+        verbosity=2,
+    )
+
+
 ######################################################################################
 # Some useful task groups
 #
@@ -334,6 +407,8 @@ def task_backend():
             'compile_babel',
             'generate_static_babel_content',
             'lark',
+            'parser_bundle',
+            'content_bundle',
         ],
     )
 
@@ -385,6 +460,10 @@ def task__offline():
             # the file (spec file copies cannot do that).
             'cp data-for-testing.json dist/offlinehedy/database.json',
             'cp OFFLINE_README.txt dist/offlinehedy/README.txt',
+            # pyinstaller doesn't keep the modification times of the data files, and the content
+            # bundle is only used for YAML files with the modification time it was built from.
+            'cp -rp ' + ' '.join(f'content/{content_type}' for content_type in BUNDLED_CONTENT)
+            + ' dist/offlinehedy/_internal/content/',
             # There are some research papers in the distribution that take up a lot
             # of space.
             'rm -rf dist/offlinehedy/_internal/content/research/*',
@@ -429,6 +508,9 @@ def is_running_on_heroku():
     return 'DYNO' in os.environ
 
 
+# The results of `doit benchmark_baseline`, which `doit benchmark` compares with
+BENCHMARK_BASELINE = 'tests/benchmarks/baseline.json'
+
 # These are used in more than one task. Find all .po files, and calculate the
 # .mo files that would be generated from them.
 pofiles = glob('translations/*/*/*.po')
@@ -40,6 +40,19 @@ class HedyException(Exception):
             return [self.arguments['line_number']]
         return None
 
+    def __reduce__(self):
+        # The subclasses don't accept the positional arguments Exception.__reduce__
+        # would pass to them, so restore the attributes directly. This makes the
+        # exceptions picklable, which we need to send them between processes.
+        return (_restore_exception, (self.__class__, self.args, self.__dict__))
+
+
+def _restore_exception(cls, args, attributes):
+    ex = cls.__new__(cls)
+    ex.args = args
+    ex.__dict__.update(attributes)
+    return ex
+
 
 class WarningException(HedyException):
     """Fixed That For You warning/exception.
@@ -173,6 +186,11 @@ class InputTooBigException(HedyException):
                          max_lines=max_lines)
 
 
+class InputTooComplexException(HedyException):
+    def __init__(self, line_number):
+        super().__init__('Too Complex', line_number=line_number)
+
+
 class InvalidCommandException(WarningException):
     def __init__(
             self,
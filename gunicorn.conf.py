@@ -1,11 +1,37 @@
 # This file is used to configure gunicorn,
 # used on Heroku.
+import gc
+import os
+
+# With PRELOAD_APP=true, import the app in the master and fork the workers from it, so that the workers
+# share the memory of everything that is loaded before the fork. See website/preload.py. This is opt-in:
+# the app's import-time code then runs once in the master instead of in every worker, and a HUP signal
+# no longer loads new code, the master has to be restarted for that.
+preload_app = os.getenv('PRELOAD_APP', 'false') == 'true'
+
+
+def when_ready(server):
+    """When the master has loaded the app (if preloaded), just before it forks the workers."""
+    if not preload_app:
+        return
+
+    # Don't leave holes in the memory pages of the master that the workers would fill up
+    # (and so copy), and collect garbage in the workers only. See the documentation of gc.freeze().
+    gc.disable()
+    import app
+    from website import preload
+    app.preload_for_fork()
+    # Keep the garbage collector of the workers from writing to the objects they share
+    gc.freeze()
+    server.log.info('Preloaded the app in the master: %s', preload.format_memory_usage(preload.memory_usage()))
+
 
 def worker_exit(server, worker):
     # When the worker is being exited (perhaps because of a timeout),
     # give the query_log handler a chance to flush to disk.
-    from website import querylog, user_activity
+    from website import preload, querylog, user_activity
     import app
+    server.log.info('Worker %s exits: %s', worker.pid, preload.format_memory_usage(preload.memory_usage()))
     querylog.emergency_shutdown()
     app.parse_logger.emergency_shutdown()
     user_activity.logger.emergency_shutdown()
@@ -13,5 +39,6 @@ def worker_exit(server, worker):
 
 def post_fork(server, worker):
     """When the worker has started."""
+    gc.enable()
     import app
     app.on_server_start()
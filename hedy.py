@@ -1,11 +1,20 @@
+import bisect
+import concurrent.futures
+import contextlib
+import copy
+import gc
+import glob
 import textwrap
-from functools import lru_cache, cache
+import threading
+import types
+from functools import cache
 
 import lark
 from flask_babel import gettext
 from lark import Lark
+from lark.load_grammar import load_grammar
 from lark.exceptions import UnexpectedEOF, UnexpectedCharacters, VisitError
-from lark import Tree, Transformer, visitors, v_args
+from lark import Token, Tree, Transformer, visitors, v_args
 from os import path, getenv
 
 import warnings
@@ -13,22 +22,21 @@ import hedy
 import hedy_translation
 from utils import atomic_write_file
 from hedy_content import ALL_KEYWORD_LANGUAGES
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 import re
 import regex
 from dataclasses import dataclass, field
 import exceptions
 import program_repair
-import yaml
 import hashlib
 import os
 import pickle
 import sys
 import tempfile
-import utils
+import time
 
 # Some useful constants
-from hedy_content import KEYWORDS
+from hedy_content import KEYWORDS, KEYWORD_INDEX
 from hedy_sourcemap import SourceMap, source_map_transformer
 
 from prefixes.music import notes_mapping
@@ -37,17 +45,26 @@ from prefixes.music import notes_mapping
 HEDY_MAX_LEVEL = 18
 HEDY_MAX_LEVEL_SKIPPING_FAULTY = 5
 MAX_LINES = 100
+# Programs that are estimated to take longer to transpile are rejected, see check_program_complexity_is_valid
+MAX_PROGRAM_COST_MS = int(getenv('MAX_PROGRAM_COST_MS', 10000))
 LEVEL_STARTING_INDENTATION = 8
 
 # Boolean variables to allow code which is under construction to not be executed
 local_keywords_enabled = True
+# Share one parser per level between all keyword languages, see get_parser
+shared_parsers_enabled = getenv('SHARED_PARSERS', 'true').lower() != 'false'
+# Parse the levels in LALR_LEVELS with a LALR parser first, see get_parser_backend
+lalr_parsers_enabled = getenv('LALR_PARSERS', 'true').lower() != 'false'
+
+# Levels whose grammar can be parsed with LALR and a contextual lexer. A level may
+# only be added here when tests/test_parser_backends.py shows that LALR produces the
+# same parse trees as Earley for it. The other levels are ambiguous (reduce/reduce
+# collisions between the error rules and the regular rules) and stay on Earley.
+LALR_LEVELS = {1}
 
 # dictionary to store transpilers
 TRANSPILER_LOOKUP = {}
 
-# define source-map
-source_map = SourceMap()
-
 # builtins taken from 3.11.0 docs: https://docs.python.org/3/library/functions.html
 PYTHON_BUILTIN_FUNCTIONS = [
     'abs',
@@ -160,14 +177,6 @@ LIBRARIES = ['time']
 # Python keywords and function names need hashing when used as var names
 reserved_words = set(PYTHON_BUILTIN_FUNCTIONS + PYTHON_KEYWORDS + LIBRARIES)
 
-# Let's retrieve all keywords dynamically from the cached KEYWORDS dictionary
-indent_keywords = {}
-for lang, keywords in KEYWORDS.items():
-    indent_keywords[lang] = []
-    for keyword in ['if', 'elif', 'for', 'repeat', 'while', 'else', 'define', 'def']:
-        indent_keywords[lang].append(keyword)  # always also check for En
-        indent_keywords[lang].append(keywords.get(keyword))
-
 # These are the preprocessor rules that we use to specify changes in the rules that
 # are expected to work across several rules
 # Example
@@ -317,6 +326,9 @@ commands_per_level = {
     18: ['is', 'print', 'forward', 'turn', 'color', 'sleep', 'at', 'random', 'add', 'to', 'remove', 'from', 'in', 'if', 'not_in', 'else', 'for', 'ifpressed', 'assign_button', 'range', 'repeat', 'and', 'or', 'while', 'elif', 'input', 'clear', 'define', 'call', 'play'],
 }
 
+# The same commands as sets, to look them up in constant time
+keywords_per_level = {level: frozenset(commands) for level, commands in commands_per_level.items()}
+
 command_turn_literals = ['right', 'left']
 english_colors = ['black', 'blue', 'brown', 'gray', 'green', 'orange', 'pink', 'purple', 'red', 'white', 'yellow']
 
@@ -403,30 +415,15 @@ def get_list_keywords(commands, to_lang):
     """
 
     translation_commands = []
-    dir = path.abspath(path.dirname(__file__))
-    path_keywords = dir + "/content/keywords"
-
-    to_yaml_filesname_with_path = path.join(path_keywords, to_lang + '.yaml')
-    en_yaml_filesname_with_path = path.join(path_keywords, 'en' + '.yaml')
-
-    with open(en_yaml_filesname_with_path, 'r', encoding='utf-8') as stream:
-        en_yaml_dict = yaml.safe_load(stream)
+    en_keywords = KEYWORD_INDEX.translations('en')
+    local_keywords = KEYWORD_INDEX.translations(to_lang)
 
-    try:
-        with open(to_yaml_filesname_with_path, 'r', encoding='utf-8') as stream:
-            to_yaml_dict = yaml.safe_load(stream)
-        for command in commands:
-            if command == 'ifpressed':  # TODO: this is a bit of a hack
-                command = 'pressed'    # since in the yamls they are called pressed
-            if command == 'assign_button':  # but in the grammar 'ifpressed'
-                command = 'button'         # should be changed in the yaml eventually!
-            try:
-                translation_commands.append(to_yaml_dict[command])
-            except Exception:
-                translation_commands.append(en_yaml_dict[command])
-    except Exception:
-        for command in commands:
-            translation_commands.append(en_yaml_dict[command])
+    for command in commands:
+        if command == 'ifpressed':  # TODO: this is a bit of a hack
+            command = 'pressed'    # since in the yamls they are called pressed
+        if command == 'assign_button':  # but in the grammar 'ifpressed'
+            command = 'button'         # should be changed in the yaml eventually!
+        translation_commands.append(local_keywords.get(command, en_keywords[command])[0])
 
     return translation_commands
 
@@ -472,16 +469,9 @@ def style_command(command):
 
 def closest_command_with_min_distance(invalid_command, commands, threshold):
     # FH, early 2020: simple string distance, could be more sophisticated MACHINE LEARNING!
-
-    minimum_distance = 1000
-    closest_command = None
-    for command in commands:
-        minimum_distance_for_command = calculate_minimum_distance(command, invalid_command)
-        if minimum_distance_for_command < minimum_distance and minimum_distance_for_command <= threshold:
-            minimum_distance = minimum_distance_for_command
-            closest_command = command
-
-    return closest_command
+    if not isinstance(commands, SuggestionIndex):
+        commands = SuggestionIndex(commands)
+    return commands.closest(invalid_command, threshold)
 
 
 def calculate_minimum_distance(s1, s2):
@@ -500,6 +490,91 @@ def calculate_minimum_distance(s1, s2):
     return distances[-1]
 
 
+def bounded_distance(s1, s2, limit):
+    """Return calculate_minimum_distance(s1, s2) if it is at most `limit`, otherwise limit + 1.
+
+    Only the cells of the distance matrix within `limit` of the diagonal can lead to a distance
+    of at most `limit`, and we stop as soon as no cell of a row is within the limit.
+    """
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    too_far = limit + 1
+    if len(s2) - len(s1) > limit:
+        return too_far
+    distances = [index1 if index1 < too_far else too_far for index1 in range(len(s1) + 1)]
+    for index2, char2 in enumerate(s2):
+        first = index2 - limit if index2 > limit else 0
+        last = min(len(s1), index2 + limit + 1)
+        new_distances = [too_far] * (len(s1) + 1)
+        left = new_distances[0] = index2 + 1 if index2 < limit else too_far
+        row_minimum = left
+        for index1 in range(first, last):
+            distance = distances[index1]
+            if s1[index1] != char2:
+                if distances[index1 + 1] < distance:
+                    distance = distances[index1 + 1]
+                if left < distance:
+                    distance = left
+                distance += 1
+                if distance > too_far:
+                    distance = too_far
+            new_distances[index1 + 1] = left = distance
+            if distance < row_minimum:
+                row_minimum = distance
+        if row_minimum > limit:
+            return too_far
+        distances = new_distances
+    return distances[-1]
+
+
+class SuggestionIndex:
+    """The commands that can be suggested for an invalid command, with their lengths.
+
+    The distance between two strings is at least the difference of their lengths, so only
+    the commands of about the same length as the invalid command are compared with it, and
+    every comparison stops as soon as the command can't be closer than the closest so far.
+    Of the commands at the same distance the first one is suggested, as in a plain scan.
+    """
+
+    def __init__(self, commands):
+        self.commands = list(commands)
+        self.lengths = [len(command) for command in self.commands]
+        self.command_set = set(self.commands)
+
+    def closest(self, invalid_command, threshold):
+        if invalid_command in self.command_set and threshold >= 0:
+            # nothing is closer than the command itself
+            return invalid_command
+
+        length = len(invalid_command)
+        closest_command = None
+        limit = threshold
+        for command, command_length in zip(self.commands, self.lengths):
+            if abs(command_length - length) > limit:
+                continue
+            distance = bounded_distance(command, invalid_command, limit)
+            if distance <= limit:
+                closest_command = command
+                # a later command is only suggested if it is closer
+                limit = distance - 1
+                if limit < 1:
+                    # only the command itself could be closer, and it is not in the index
+                    break
+
+        return closest_command
+
+
+@cache
+def _get_suggestion_index(lang, level):
+    return SuggestionIndex(get_suggestions_for_language(lang, level))
+
+
+def get_suggestion_index(lang, level):
+    if not local_keywords_enabled:
+        lang = 'en'
+    return _get_suggestion_index(lang, level)
+
+
 @dataclass
 class InvalidInfo:
     error_type: str
@@ -521,6 +596,71 @@ class LookupEntry:
     currently_inferring: bool = False  # used to detect cyclic type inference
 
 
+class SymbolTable:
+    """The lookup table of a program: its LookupEntries in the order in which they were collected.
+
+    The entries are indexed by their (escaped) name, and the definition lines of every
+    name are kept sorted, so checking whether a name is defined before a line is a bisect
+    instead of a scan of all entries. The names of entries can't change once they are added.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = []
+        # name -> entries with that name, in the order in which they were added
+        self.entries_by_name = {}
+        # name -> sorted definition lines of the entries with that name
+        self.definition_lines = {}
+        # all names that are strings, sorted, to find names by prefix
+        self.sorted_names = []
+        for entry in entries:
+            self.add(entry)
+
+    @staticmethod
+    def key(name):
+        # Tokens of different types are not equal, even with the same value
+        return str(name) if isinstance(name, str) else name
+
+    def add(self, entry):
+        key = SymbolTable.key(entry.name)
+        if key not in self.entries_by_name:
+            self.entries_by_name[key] = []
+            self.definition_lines[key] = []
+            if isinstance(key, str):
+                bisect.insort(self.sorted_names, key)
+        self.entries.append(entry)
+        self.entries_by_name[key].append(entry)
+        if entry.definition_line is not None:
+            bisect.insort(self.definition_lines[key], entry.definition_line)
+
+    def get(self, name):
+        """Returns the entries with the given name, in the order in which they were added."""
+        return self.entries_by_name.get(SymbolTable.key(name), [])
+
+    def is_defined_before(self, name, line):
+        """Returns whether the name has a definition on or before the given line."""
+        lines = self.definition_lines.get(SymbolTable.key(name))
+        return bool(lines) and bisect.bisect_right(lines, line) > 0
+
+    def with_prefix(self, prefix):
+        """Returns the entries of which the name starts with the given prefix."""
+        start = bisect.bisect_left(self.sorted_names, prefix)
+        entries = []
+        for name in self.sorted_names[start:]:
+            if not name.startswith(prefix):
+                break
+            entries.extend(self.entries_by_name[name])
+        return entries
+
+    def __contains__(self, name):
+        return SymbolTable.key(name) in self.entries_by_name
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
 class TypedTree(Tree):
     def __init__(self, data, children, meta, type_):
         super().__init__(data, children, meta)
@@ -578,7 +718,7 @@ class LookupEntryCollector(visitors.Visitor):
     def __init__(self, level):
         super().__init__()
         self.level = level
-        self.lookup = []
+        self.lookup = SymbolTable()
 
     def ask(self, tree):
         # in level 1 there is no variable name on the left side of the ask command
@@ -649,8 +789,7 @@ class LookupEntryCollector(visitors.Visitor):
 
     def call(self, tree):
         function_name = tree.children[0].children[0]
-        names = [x.name for x in self.lookup]
-        if function_name + "()" not in names:
+        if function_name + "()" not in self.lookup:
             raise exceptions.UndefinedFunctionException(function_name, tree.meta.line)
 
         args_str = ""
@@ -663,19 +802,20 @@ class LookupEntryCollector(visitors.Visitor):
         entry = LookupEntry(name, tree, definition_line, access_line, skip_hashing)
         hashed_name = escape_var(entry)
         entry.name = hashed_name
-        self.lookup.append(entry)
+        self.lookup.add(entry)
 
 
 # The transformer traverses the whole AST and infers the type of each node. It alters the lookup table entries with
 # their inferred type. It also performs type validation for commands, e.g. 'text' + 1 results in error.
 @v_args(tree=True)
 class TypeValidator(Transformer):
-    def __init__(self, lookup, level, lang, input_string):
+    def __init__(self, lookup, level, lang, input_string, skip_faulty=False):
         super().__init__()
         self.lookup = lookup
         self.level = level
         self.lang = lang
         self.input_string = input_string
+        self.skip_faulty = skip_faulty
 
     def print(self, tree):
         self.validate_args_type_allowed(Command.print, tree.children, tree.meta)
@@ -905,7 +1045,8 @@ class TypeValidator(Transformer):
                     meta.line,
                     meta.end_line,
                     meta.column - 1,
-                    meta.end_column - 2)
+                    meta.end_column - 2,
+                    self.skip_faulty)
                 result = {k: v for k, v in result.items()}
                 command = ' '.join([v.strip() for v in result.values() if v is not None])
             raise exceptions.InvalidArgumentTypeException(command=command, invalid_type=arg_type,
@@ -961,9 +1102,8 @@ class TypeValidator(Transformer):
         return type_ in [HedyType.any, HedyType.none]
 
     def save_type_to_lookup(self, name, inferred_type):
-        for entry in self.lookup:
-            if entry.name == escape_var(name):
-                entry.type_ = inferred_type
+        for entry in self.lookup.get(escape_var(name)):
+            entry.type_ = inferred_type
 
     # Usually, variable definitions are sequential and by the time we need the type of a lookup entry, it would already
     #  be inferred. However, there are valid cases in which the lookup entries will be accessed before their type
@@ -974,7 +1114,7 @@ class TypeValidator(Transformer):
     #  lookup entry is used to infer the type and continue the started validation. This approach might cause issues
     #  in case of cyclic references, e.g. b is b + 1. The flag `inferring` is used as a guard against these cases.
     def try_get_type_from_lookup(self, name):
-        matches = [entry for entry in self.lookup if entry.name == escape_var(name)]
+        matches = self.lookup.get(escape_var(name))
         if matches:
             match = matches[0]
             if not match.type_:
@@ -984,7 +1124,8 @@ class TypeValidator(Transformer):
                 else:
                     match.currently_inferring = True
                     try:
-                        TypeValidator(self.lookup, self.level, self.lang, self.input_string).transform(match.tree)
+                        TypeValidator(self.lookup, self.level, self.lang, self.input_string,
+                                      self.skip_faulty).transform(match.tree)
                     except VisitError as ex:
                         raise ex.orig_exc
                     match.currently_inferring = False
@@ -1073,36 +1214,29 @@ while not pygame_end:
 class AllCommands(Transformer):
     def __init__(self, level):
         self.level = level
+        self.commands = keywords_per_level[level]
+
+    # some keywords have names that are not a valid name for a command
+    # that's why we call them differently in the grammar
+    # we have to translate them to the regular names here for further communciation
+    RULE_KEYWORDS = {
+        'assign': 'is',
+        'assign_list': 'is',
+        'ifelse': 'else',
+        'ifs': 'if',
+        'elifs': 'elif',
+        'for_loop': 'for',
+        'for_list': 'for',
+        'or_condition': 'or',
+        'and_condition': 'and',
+        'while_loop': 'while',
+        'in_list_check': 'in',
+        'input_empty_brackets': 'input',
+        'print_empty_brackets': 'print',
+    }
 
     def standardize_keyword(self, keyword):
-        # some keywords have names that are not a valid name for a command
-        # that's why we call them differently in the grammar
-        # we have to translate them to the regular names here for further communciation
-        if keyword in ['assign', 'assign_list']:
-            return 'is'
-        if keyword == 'ifelse':
-            return 'else'
-        if keyword == 'ifs':
-            return 'if'
-        if keyword == 'elifs':
-            return 'elif'
-        if keyword == 'for_loop':
-            return 'for'
-        if keyword == 'for_list':
-            return 'for'
-        if keyword == 'or_condition':
-            return 'or'
-        if keyword == 'and_condition':
-            return 'and'
-        if keyword == 'while_loop':
-            return 'while'
-        if keyword == 'in_list_check':
-            return 'in'
-        if keyword == 'input_empty_brackets':
-            return 'input'
-        if keyword == 'print_empty_brackets':
-            return 'print'
-        return str(keyword)
+        return self.RULE_KEYWORDS.get(keyword, str(keyword))
 
     def __default__(self, args, children, meta):
         # if we are matching a rule that is a command
@@ -1111,7 +1245,7 @@ class AllCommands(Transformer):
         # for the achievements we want to be able to also detect which operators were used by a kid
         operators = ['addition', 'subtraction', 'multiplication', 'division']
 
-        if production_rule_name in commands_per_level[self.level] or production_rule_name in operators or production_rule_name == 'ifpressed_else':
+        if production_rule_name in self.commands or production_rule_name in operators or production_rule_name == 'ifpressed_else':
             # ifpressed_else is not in the yamls, upsetting lookup code to get an alternative later
             # lookup should be fixed instead, making a special case for now
             if production_rule_name == 'else':  # use of else also has an if
@@ -1163,15 +1297,17 @@ class IsValid(Filter):
     # this function is used to generate more informative error messages
     # tree is transformed to a node of [Bool, args, command number]
 
-    def __init__(self, level, lang, input_string):
+    def __init__(self, level, lang, input_string, skip_faulty=False):
         self.level = level
         self.lang = lang
         self.input_string = input_string
+        # repaired programs are transpiled in the same mode as the program itself
+        self.skip_faulty = skip_faulty
 
     def error_invalid_space(self, meta, args):
         line = args[0][2].line
         # the error here is a space at the beginning of a line, we can fix that!
-        fixed_code, result = repair_leading_space(self.input_string, self.lang, self.level, line)
+        fixed_code, result = repair_leading_space(self.input_string, self.lang, self.level, line, self.skip_faulty)
         raise exceptions.InvalidSpaceException(
             level=self.level, line_number=line, fixed_code=fixed_code, fixed_result=result)
 
@@ -1202,10 +1338,10 @@ class IsValid(Filter):
 
     def error_invalid(self, meta, args):
         invalid_command = args[0][1]
-        closest = closest_command(invalid_command, get_suggestions_for_language(self.lang, self.level))
+        closest = closest_command(invalid_command, get_suggestion_index(self.lang, self.level))
 
         if closest == 'keyword':  # we couldn't find a suggestion
-            invalid_command_en = hedy_translation.translate_keyword_to_en(invalid_command, lang)
+            invalid_command_en = hedy_translation.translate_keyword_to_en(invalid_command, self.lang)
             if invalid_command_en == Command.turn:
                 arg = args[0][0]
                 raise hedy.exceptions.InvalidArgumentException(command=invalid_command,
@@ -1222,7 +1358,8 @@ class IsValid(Filter):
             fixed_code = self.input_string.replace(invalid_command, closest)
             if fixed_code != self.input_string:  # only if we have made a successful fix
                 try:
-                    fixed_result = transpile_inner(fixed_code, self.level)
+                    fixed_result = transpile_inner(
+                        fixed_code, self.level, context=TranspileContext(self.level, skip_faulty=self.skip_faulty))
                     result = fixed_result
                 except exceptions.HedyException:
                     # The fixed code contains another error. Only report the original error for now.
@@ -1288,6 +1425,37 @@ class IsValid(Filter):
     # other rules are inherited from Filter
 
 
+def skip_error_production(name):
+    error_production = getattr(IsValid, name)
+
+    def skip(self, meta, args):
+        # the repairs that are suggested with the error are tried on the faulty code only
+        faulty_code = IsValid(self.level, self.lang, self.input_string[meta.start_pos:meta.end_pos], self.skip_faulty)
+        try:
+            error_production(faulty_code, meta, args)
+        except Exception as error:
+            self.skipped_errors.append((meta, error))
+        return [True]
+
+    return skip
+
+
+def init_skipping_faulty(self, level, lang, input_string, skip_faulty=False, skipped_errors=None):
+    IsValid.__init__(self, level, lang, input_string, skip_faulty)
+    # the meta and the exception of every error production, in the order in which they were found
+    self.skipped_errors = skipped_errors if skipped_errors is not None else []
+
+
+# When skipping faulty code, we transpile the program while allowing all error productions,
+# so the valid part of the program is transpiled and the faulty parts are mapped to 'pass'.
+# The exception IsValid would raise is kept for every error production, so the errors of the
+# faulty parts are known without transpiling them again.
+IsValidSkippingFaulty = v_args(meta=True)(type('IsValidSkippingFaulty', (IsValid,), {
+    '__init__': init_skipping_faulty,
+    **{name: skip_error_production(name) for name in dir(IsValid) if name.startswith('error')}
+}))
+
+
 @v_args(meta=True)
 def valid_echo(ast):
     commands = ast.children
@@ -1343,6 +1511,96 @@ class IsComplete(Filter):
     # other rules are inherited from Filter
 
 
+class AnalyzeProgram:
+    """Runs IsValid, ExtractAST and AllCommands in one pass over the parse tree, and
+    IsComplete and LookupEntryCollector in one pass over the resulting AST.
+
+    The callbacks of the analyses are called on each node with the results of that
+    analysis for its children, like their own Transformer would do. The nodes for which
+    ExtractAST has no callback of its own are reused as nodes of the AST instead of
+    being copied, so the parse tree can't be used after the analysis.
+
+    Errors of the validator are raised right away, because it is the first to run. The
+    errors of the other analyses are kept, so create_AST can raise them in the order in
+    which the analyses used to run one after the other.
+    """
+
+    def __init__(self, validator, level):
+        self.validator = validator
+        self.extractor = ExtractAST()
+        self.completeness = IsComplete(level)
+        self.collector = LookupEntryCollector(level)
+        self.all_commands = AllCommands(level)
+        self.errors = {}
+        # the number of nodes of the parse tree
+        self.nodes = 0
+
+    def analyze(self, program_root):
+        _, self.ast, self.commands = self._analyze_tree(program_root)
+        if 'extract' in self.errors:
+            self.errors.setdefault('complete', self.errors['extract'])
+            self.errors.setdefault('lookup', self.errors['extract'])
+        else:
+            self.completeness_result = self._analyze_ast(self.ast)
+            self.lookup = self.collector.lookup
+        return self
+
+    def raise_error(self, analysis):
+        if analysis in self.errors:
+            raise self.errors[analysis]
+
+    def _analyze_tree(self, tree):
+        self.nodes += 1
+        valid_children = []
+        ast_children = []
+        command_children = []
+        for child in tree.children:
+            if isinstance(child, Tree):
+                valid, ast, commands = self._analyze_tree(child)
+            elif isinstance(child, Token):
+                valid = self.validator._call_userfunc_token(child)
+                ast = self._run('extract', self.extractor._call_userfunc_token, child)
+                commands = self._run('commands', self.all_commands._call_userfunc_token, child)
+            else:
+                valid = ast = commands = child
+            valid_children.append(valid)
+            ast_children.append(ast)
+            command_children.append(commands)
+
+        valid = self.validator._call_userfunc(tree, valid_children)
+        commands = self._run('commands', self.all_commands._call_userfunc, tree, command_children)
+        if hasattr(self.extractor, tree.data):
+            ast = self._run('extract', self.extractor._call_userfunc, tree, ast_children)
+        else:
+            # Same as the default callback of ExtractAST, without copying the node
+            tree.children = ast_children
+            ast = tree
+        return valid, ast, commands
+
+    def _analyze_ast(self, ast):
+        # The collector visits the nodes top-down, so the node is collected before its children
+        self._run('lookup', self.collector._call_userfunc, ast)
+        completeness_children = []
+        for child in ast.children:
+            if isinstance(child, Tree):
+                completeness = self._analyze_ast(child)
+            elif isinstance(child, Token):
+                completeness = self._run('complete', self.completeness._call_userfunc_token, child)
+            else:
+                completeness = child
+            completeness_children.append(completeness)
+        return self._run('complete', self.completeness._call_userfunc, ast, completeness_children)
+
+    def _run(self, analysis, callback, *args):
+        if analysis in self.errors:
+            return None
+        try:
+            return callback(*args)
+        except Exception as error:
+            self.errors[analysis] = error
+            return None
+
+
 def process_characters_needing_escape(value):
     # defines what happens if a kids uses ' or \ in in a string
     for c in characters_that_need_escaping:
@@ -1368,11 +1626,13 @@ def hedy_transpiler(level):
 
 @v_args(meta=True)
 class ConvertToPython(Transformer):
-    def __init__(self, lookup, language="en", numerals_language="Latin", is_debug=False):
+    def __init__(self, lookup, language="en", numerals_language="Latin", is_debug=False, source_map=None):
         self.lookup = lookup
         self.language = language
         self.numerals_language = numerals_language
         self.is_debug = is_debug
+        # the map of the current transpilation, filled by the methods wrapped by source_map_transformer
+        self.source_map = source_map if source_map is not None else SourceMap()
 
     def add_debug_breakpoint(self):
         if self.is_debug:
@@ -1383,11 +1643,9 @@ class ConvertToPython(Transformer):
     # default for line number is max lines so if it is not given, there
     # is no check on whether the var is defined
     def is_variable(self, variable_name, access_line_number=100):
-        all_names = [a.name for a in self.lookup]
-        all_names_before_access_line = [a.name for a in self.lookup if a.definition_line <= access_line_number]
-        if variable_name in all_names and variable_name not in all_names_before_access_line:
+        if variable_name in self.lookup and not self.lookup.is_defined_before(variable_name, access_line_number):
             # referenced before assignment!
-            definition_line_number = [a.definition_line for a in self.lookup if a.name == variable_name][0]
+            definition_line_number = self.lookup.get(variable_name)[0].definition_line
             raise hedy.exceptions.AccessBeforeAssignException(
                 name=variable_name,
                 access_line_number=access_line_number,
@@ -1400,9 +1658,9 @@ class ConvertToPython(Transformer):
         if isinstance(variable_name, str):
             pattern = r'^([a-zA-Z_][a-zA-Z0-9_]*)\('
             match = re.match(pattern, variable_name)
-            is_function = match and [a.name for a in self.lookup if match.group(1) + "()" == a.name]
+            is_function = match and match.group(1) + "()" in self.lookup
 
-        return escape_var(variable_name) in all_names_before_access_line or is_function
+        return self.lookup.is_defined_before(escape_var(variable_name), access_line_number) or is_function
 
     def process_variable(self, arg, access_line_number=100):
         # processes a variable by hashing and escaping when needed
@@ -1433,8 +1691,8 @@ class ConvertToPython(Transformer):
         # store the line of access (or string value) in the lookup table
         # so we know what variable is used where
         if isinstance(variable_name, str):
-            vars = [a for a in self.lookup if isinstance(a.name, str) and a.name[:len(variable_name)] == variable_name]
-            for v in vars:  # vars can be defined multiple times, access validates all of them
+            # vars can be defined multiple times, access validates all of them
+            for v in self.lookup.with_prefix(variable_name):
                 corresponding_lookup_entry = v
                 corresponding_lookup_entry.access_line = access_line_number
 
@@ -1550,14 +1808,11 @@ class ConvertToPython(Transformer):
 
 @v_args(meta=True)
 @hedy_transpiler(level=1)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_1(ConvertToPython):
 
-    def __init__(self, lookup, language, numerals_language, is_debug):
-        self.numerals_language = numerals_language
-        self.language = language
-        self.lookup = lookup
-        self.is_debug = is_debug
+    def __init__(self, lookup, language, numerals_language, is_debug, source_map=None):
+        super().__init__(lookup, language, numerals_language, is_debug, source_map)
         __class__.level = 1
 
     def program(self, meta, args):
@@ -1709,8 +1964,11 @@ class ConvertToPython_1(ConvertToPython):
         lists_names = []
         list_args = []
         var_regex = r"[\p{Lu}\p{Ll}\p{Lt}\p{Lm}\p{Lo}\p{Nl}_]+|[\p{Mn}\p{Mc}\p{Nd}\p{Pc}·]+"
-        # List usage comes in indexation and random choice
-        list_regex = fr"(({var_regex})+\[int\(({var_regex})\)-1\])|(random\.choice\(({var_regex})\))"
+        var_chars = r"\p{Lu}\p{Ll}\p{Lt}\p{Lm}\p{Lo}\p{Nl}_\p{Mn}\p{Mc}\p{Nd}\p{Pc}·"
+        # List usage comes in indexation and random choice. A name is only matched from its start and
+        # never backtracked into, otherwise a long word takes time cubic in its length
+        list_regex = (fr"((?<![{var_chars}])(?>({var_regex})+)\[int\(({var_regex})\)-1\])"
+                      fr"|(random\.choice\(({var_regex})\))")
         for arg in args:
             # Expressions come inside a Tree object, so unpack them
             if isinstance(arg, Tree):
@@ -1730,7 +1988,7 @@ class ConvertToPython_1(ConvertToPython):
 
 @v_args(meta=True)
 @hedy_transpiler(level=2)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_2(ConvertToPython_1):
 
     # ->>> why doesn't this live in isvalid? refactor now that isvalid is cleaned up!
@@ -1869,7 +2127,7 @@ class ConvertToPython_2(ConvertToPython_1):
 
 @v_args(meta=True)
 @hedy_transpiler(level=3)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_3(ConvertToPython_2):
     def assign_list(self, meta, args):
         parameter = args[0]
@@ -1932,7 +2190,7 @@ class ConvertToPython_3(ConvertToPython_2):
 
 @v_args(meta=True)
 @hedy_transpiler(level=4)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_4(ConvertToPython_3):
 
     def process_variable_for_fstring(self, name):
@@ -1996,10 +2254,10 @@ except NameError:
 
 @v_args(meta=True)
 @hedy_transpiler(level=5)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_5(ConvertToPython_4):
-    def __init__(self, lookup, language, numerals_language, is_debug):
-        super().__init__(lookup, language, numerals_language, is_debug)
+    def __init__(self, lookup, language, numerals_language, is_debug, source_map=None):
+        super().__init__(lookup, language, numerals_language, is_debug, source_map)
 
     def ifs(self, meta, args):  # might be worth asking if we want a debug breakpoint here
         return f"""if {args[0]}:{self.add_debug_breakpoint()}
@@ -2087,7 +2345,7 @@ else:
 
 @v_args(meta=True)
 @hedy_transpiler(level=6)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_6(ConvertToPython_5):
 
     def convert_tree_to_number(self, a):
@@ -2234,7 +2492,7 @@ def add_sleep_to_command(commands, indent=True, is_debug=False, location="after"
 
 @v_args(meta=True)
 @hedy_transpiler(level=7)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_7(ConvertToPython_6):
     def repeat(self, meta, args):
         var_name = self.get_fresh_var('__i__')
@@ -2251,7 +2509,7 @@ class ConvertToPython_7(ConvertToPython_6):
 @hedy_transpiler(level=8)
 @v_args(meta=True)
 @hedy_transpiler(level=9)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_8_9(ConvertToPython_7):
 
     def command(self, meta, args):
@@ -2346,7 +2604,7 @@ if event.unicode == '{args[0]}':
 
 @v_args(meta=True)
 @hedy_transpiler(level=10)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_10(ConvertToPython_8_9):
     def for_list(self, meta, args):
         args = [a for a in args if a != ""]  # filter out in|dedent tokens
@@ -2363,7 +2621,7 @@ class ConvertToPython_10(ConvertToPython_8_9):
 
 @v_args(meta=True)
 @hedy_transpiler(level=11)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_11(ConvertToPython_10):
     def for_loop(self, meta, args):
         args = [a for a in args if a != ""]  # filter out in|dedent tokens
@@ -2383,7 +2641,7 @@ for {iterator} in range({begin}, {end} + {stepvar_name}, {stepvar_name}):{self.a
 
 @v_args(meta=True)
 @hedy_transpiler(level=12)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_12(ConvertToPython_11):
     def define(self, meta, args):
         function_name = args[0]
@@ -2402,7 +2660,7 @@ class ConvertToPython_12(ConvertToPython_11):
         self.add_variable_access_location(args[0], meta.line)
 
         function_name = args[0]
-        function_tree = [x.tree for x in self.lookup if x.name == function_name + "()"]
+        function_tree = [x.tree for x in self.lookup.get(function_name + "()")]
         tree_arguments = [x for x in function_tree[0].children if x.data == 'arguments']
 
         number_of_defined_arguments = 0 if tree_arguments == [] else len(tree_arguments[0].children)
@@ -2557,7 +2815,7 @@ class ConvertToPython_12(ConvertToPython_11):
 
 @v_args(meta=True)
 @hedy_transpiler(level=13)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_13(ConvertToPython_12):
     def and_condition(self, meta, args):
         return ' and '.join(args)
@@ -2568,7 +2826,7 @@ class ConvertToPython_13(ConvertToPython_12):
 
 @v_args(meta=True)
 @hedy_transpiler(level=14)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_14(ConvertToPython_13):
     def process_comparison(self, meta, args, operator):
 
@@ -2603,7 +2861,7 @@ class ConvertToPython_14(ConvertToPython_13):
 
 @v_args(meta=True)
 @hedy_transpiler(level=15)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_15(ConvertToPython_14):
     def while_loop(self, meta, args):
         args = [a for a in args if a != ""]  # filter out in|dedent tokens
@@ -2639,7 +2897,7 @@ if event.unicode == '{args[0]}':
 
 @v_args(meta=True)
 @hedy_transpiler(level=16)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_16(ConvertToPython_15):
     def assign_list(self, meta, args):
         parameter = args[0]
@@ -2665,7 +2923,7 @@ class ConvertToPython_16(ConvertToPython_15):
 
 @v_args(meta=True)
 @hedy_transpiler(level=17)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_17(ConvertToPython_16):
     def elifs(self, meta, args):
         args = [a for a in args if a != ""]  # filter out in|dedent tokens
@@ -2699,7 +2957,7 @@ if event.key == {button_name}:
 
 @v_args(meta=True)
 @hedy_transpiler(level=18)
-@source_map_transformer(source_map)
+@source_map_transformer
 class ConvertToPython_18(ConvertToPython_17):
     def input(self, meta, args):
         return self.ask(meta, args)
@@ -2934,12 +3192,26 @@ def create_grammar(level, lang, skip_faulty):
             )
             merged_grammars = merged_grammars.replace(non_empty_program_rule, non_empty_program_rule_changed)
 
-    # ready? Save to file to ease debugging
-    # this could also be done on each merge for performance reasons
-    save_total_grammar_file(level, merged_grammars, lang)
+    # The merged grammars are saved to grammars-Total at build time, to ease debugging
     return merged_grammars
 
 
+@cache
+def create_lalr_grammar(level, lang):
+    """Return the grammar of a level, rewritten to be parsed with LALR.
+
+    The Earley parser resolves the ambiguity between keywords and text (is it
+    `color purple` or `color` followed by the text 'purple'?) on the parse tree. The
+    contextual lexer of LALR has to pick a terminal up front, so in this variant the
+    keyword terminals take precedence over the text terminals.
+    """
+    grammar = create_grammar(level, lang, False)
+    keyword_terminals = re.findall(r'^(_[A-Z_]+)\s*:', get_keywords_for_language(lang), re.MULTILINE)
+    for terminal in keyword_terminals:
+        grammar = re.sub(rf'^{terminal}\s*:', f'{terminal}.2:', grammar, flags=re.MULTILINE)
+    return grammar
+
+
 def save_total_grammar_file(level, grammar, lang):
     # Load Lark grammars relative to directory of current file
     script_dir = path.abspath(path.dirname(__file__))
@@ -2994,7 +3266,99 @@ def get_terminals():
     return terminals
 
 
-PARSER_CACHE = {}
+class ParserCache:
+    """In-memory cache of Lark parsers with a memory budget.
+
+    A parser takes between 0.5 and 3 MB of memory, and there is one for every
+    combination of level, keyword language and flags, so we can't keep them all.
+    This cache keeps the parsers that are used most often, until their combined
+    (measured) size reaches `max_bytes`. When the cache is full, the parser with
+    the fewest uses is evicted, and of those the least recently used one. The use
+    counts are halved every `DECAY_INTERVAL` lookups, so parsers that were popular
+    a while ago don't stay around forever.
+    """
+    DECAY_INTERVAL = 10000
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # key -> [parser, size, uses, last used]
+        self.entries = {}
+        self.current_bytes = 0
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.mutex = threading.Lock()
+
+    def get(self, key):
+        with self.mutex:
+            self.lookups += 1
+            if self.lookups % self.DECAY_INTERVAL == 0:
+                for entry in self.entries.values():
+                    entry[2] //= 2
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry[2] += 1
+            entry[3] = self.lookups
+            return entry[0]
+
+    def put(self, key, parser, size=None):
+        if size is None:
+            size = _memory_footprint(parser)
+        if size > self.max_bytes:
+            return
+        with self.mutex:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            while self.entries and self.current_bytes + size > self.max_bytes:
+                victim = min(self.entries, key=lambda k: (self.entries[k][2], self.entries[k][3]))
+                self.current_bytes -= self.entries.pop(victim)[1]
+                self.evictions += 1
+            self.entries[key] = [parser, size, 1, self.lookups]
+            self.current_bytes += size
+
+    def clear(self):
+        with self.mutex:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self.mutex:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def _memory_footprint(root):
+    """Return the number of bytes used by an object and everything it refers to.
+
+    Modules, classes and functions are shared with the rest of the program, so
+    they are not counted.
+    """
+    shared = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType)
+    seen = set()
+    todo = [root]
+    size = 0
+    while todo:
+        obj = todo.pop()
+        if id(obj) in seen or isinstance(obj, shared):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        todo.extend(gc.get_referents(obj))
+    return size
+
+
+PARSER_CACHE = ParserCache(int(getenv('PARSER_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
 
 
 def _get_parser_cache_directory():
@@ -3004,15 +3368,55 @@ def _get_parser_cache_directory():
     return tempfile.gettempdir()
 
 
-def _save_parser_to_file(lark, pickle_file):
+def get_parser_bundle_directory():
+    """Return the directory with the parsers that were built ahead of time.
+
+    The bundle is generated by `doit run parser_bundle` and contains the same files
+    get_parser would otherwise build on first use and cache to the temp directory.
+    It is versioned by the grammars, the Python version and the Lark version, and is
+    only ever read at runtime.
+    """
+    return path.join(path.abspath(path.dirname(__file__)), "parser-bundle", _get_parser_bundle_version())
+
+
+@cache
+def _get_parser_bundle_version():
+    script_dir = path.abspath(path.dirname(__file__))
+    digest = hashlib.sha1()
+    for filename in sorted(glob.glob(path.join(script_dir, "grammars", "*.lark"))):
+        with open(filename, "rb") as file:
+            digest.update(file.read())
+    python_version = "{}.{}".format(*sys.version_info[:2])
+    return f"py{python_version}-lark{lark.__version__}-{digest.hexdigest()[:16]}"
+
+
+def _find_cached_file(filename):
+    """Return the path of a cached file, and whether it comes from the (read-only) parser bundle."""
+    bundled_path = path.join(get_parser_bundle_directory(), filename)
+    if path.isfile(bundled_path):
+        return bundled_path, True
+    return path.join(_get_parser_cache_directory(), filename), False
+
+
+def _save_parser_to_file(lark, pickle_file, directory=None):
+    full_path = os.path.join(directory or _get_parser_cache_directory(), pickle_file)
+
+    if lark.options.parser == "lalr":
+        # Lark can store LALR parsers itself
+        try:
+            with atomic_write_file(full_path) as fp:
+                lark.save(fp)
+        except OSError:
+            # See below
+            pass
+        return
+
     # Store the parser to a file, a bit hacky because it is not
     # pickle-able out of the box
     # See https://github.com/lark-parser/lark/issues/1348
 
     # Note that if Lark ever implements the cache for Earley parser
-    # or if we switch to a LALR parser we don't need this hack anymore
-
-    full_path = os.path.join(_get_parser_cache_directory(), pickle_file)
+    # we don't need this hack anymore
 
     # These attributes can not be pickled as they are a module
     lark.parser.parser.lexer_conf.re_module = None
@@ -3033,30 +3437,53 @@ def _save_parser_to_file(lark, pickle_file):
     lark.parser.lexer_conf.re_module = regex
 
 
-def _restore_parser_from_file_if_present(pickle_file):
-    full_path = os.path.join(_get_parser_cache_directory(), pickle_file)
+def _restore_parser_from_file_if_present(pickle_file, backend="earley"):
+    if backend == "lalr":
+        return _restore_pickle_if_present(pickle_file, load=_load_lalr_parser)
+
+    lark = _restore_pickle_if_present(pickle_file)
+    if lark is not None:
+        # Restore the unpickle-able bits.
+        # Keep this in sync with the save method!
+        lark.parser.parser.lexer_conf.re_module = regex
+        lark.parser.lexer_conf.re_module = regex
+    return lark
+
+
+def _save_pickle_to_file(value, pickle_file, directory=None):
+    full_path = os.path.join(directory or _get_parser_cache_directory(), pickle_file)
+    try:
+        with atomic_write_file(full_path) as fp:
+            pickle.dump(value, fp)
+    except OSError:
+        # See _save_parser_to_file
+        pass
+
+
+def _restore_pickle_if_present(pickle_file, load=pickle.load):
+    full_path, bundled = _find_cached_file(pickle_file)
     if os.path.isfile(full_path):
         try:
             with open(full_path, "rb") as fp:
-                lark = pickle.load(fp)
-            # Restore the unpickle-able bits.
-            # Keep this in sync with the save method!
-            lark.parser.parser.lexer_conf.re_module = regex
-            lark.parser.lexer_conf.re_module = regex
-            return lark
+                return load(fp)
         except Exception:
             # If anything goes wrong try to remove the file
-            # and we will try again in the next cycle
-            try:
-                os.unlink(full_path)
-            except Exception:
-                pass
+            # and we will try again in the next cycle.
+            # The bundle is never modified at runtime.
+            if not bundled:
+                try:
+                    os.unlink(full_path)
+                except Exception:
+                    pass
     return None
 
 
-@lru_cache(maxsize=0 if utils.is_production() else 100)
-def get_parser(level, lang="en", keep_all_tokens=False, skip_faulty=False):
+def get_parser(level, lang="en", keep_all_tokens=False, skip_faulty=False, backend="earley", stats=None):
     """Return the Lark parser for a given level.
+
+    `backend` is "earley" or "lalr", see get_parser_backend for the levels that
+    can be parsed with LALR.
+
     Parser generation takes about 0.5 seconds depending on the level so
     we want to cache it, or we have latency of 500ms on the calculations
     and a high server load, and CI runs of 5+ hours.
@@ -3065,78 +3492,321 @@ def get_parser(level, lang="en", keep_all_tokens=False, skip_faulty=False):
     had 1000s of parsers and got into out-of-memory issue in the
     production environment.
 
-    Now we cache a limited number of the parsers to RAM, but introduce
-    a second tier of cache to disk.
+    Now we keep the most used parsers in RAM within a memory budget
+    (see ParserCache), and introduce a second tier of cache to disk.
+    On deploy, the disk cache is filled ahead of time (see
+    get_parser_bundle_directory).
+
+    On top of that, all keyword languages share the parser of the English
+    grammar of a level, see _with_keyword_language.
 
     This is not implemented by Lark natively for the Earley parser.
     See https://github.com/lark-parser/lark/issues/1348.
+
+    If `stats` is given, it counts where the parser came from: 'parser_memory',
+    'parser_shared' (from the English parser), 'parser_disk' or 'parser_build'.
     """
-    grammar = create_grammar(level, lang, skip_faulty)
-    parser_opts = {
+    stats = stats if stats is not None else NullTranspileStats()
+    key = (level, lang, keep_all_tokens, skip_faulty, backend)
+    lark = PARSER_CACHE.get(key)
+    if lark is not None:
+        stats.inc('parser_memory')
+        return lark
+
+    if shared_parsers_enabled and lang != "en" and backend == "earley":
+        english_parser = get_parser(level, "en", keep_all_tokens, skip_faulty)
+        lark = _with_keyword_language(english_parser, level, lang, skip_faulty)
+        if lark is not None:
+            # Everything but the keyword terminals is shared with the English parser
+            PARSER_CACHE.put(key, lark, size=_memory_footprint(lark.parser.parser.term_matcher.__self__.regexps))
+            stats.inc('parser_shared')
+            return lark
+
+    cached_parser_file = _get_parser_file_name(level, lang, keep_all_tokens, skip_faulty, backend)
+
+    use_cache = True
+    lark = None
+    if use_cache:
+        lark = _restore_parser_from_file_if_present(cached_parser_file, backend)
+    if lark is None:
+        lark = _build_parser(level, lang, keep_all_tokens, skip_faulty, backend)
+        stats.inc('parser_build')
+        if use_cache:
+            _save_parser_to_file(lark, cached_parser_file)
+    else:
+        stats.inc('parser_disk')
+
+    PARSER_CACHE.put(key, lark)
+    return lark
+
+
+def get_parser_backend(level, skip_faulty=False):
+    """Return the parser backend that parse_input tries first for a level.
+
+    LALR with a contextual lexer is much faster than Earley, and its cost does not
+    grow with the length of a line. It is only used for correct programs: as soon as
+    the LALR parser fails, parse_input parses with Earley again, so the errors are
+    always those of the Earley parser. The grammar changes for skip_faulty are
+    ambiguous, so they are always parsed with Earley.
+    """
+    if lalr_parsers_enabled and level in LALR_LEVELS and not skip_faulty:
+        return "lalr"
+    return "earley"
+
+
+def _get_parser_options(keep_all_tokens, backend="earley"):
+    options = {
         "regex": True,
         "propagate_positions": True,
         "keep_all_tokens": keep_all_tokens,
     }
-    unique_parser_hash = hashlib.sha1("_".join((
+    if backend == "lalr":
+        options.update(parser="lalr", lexer="contextual")
+    return options
+
+
+def _get_grammar_hash(grammar, parser_opts):
+    return hashlib.sha1("_".join((
         grammar,
         str(sys.version_info[:2]),
         str(parser_opts),
     )).encode()).hexdigest()
 
-    cached_parser_file = f"cached-parser-{level}-{lang}-{unique_parser_hash}.pkl"
 
-    use_cache = True
-    lark = None
-    if use_cache:
-        lark = _restore_parser_from_file_if_present(cached_parser_file)
-    if lark is None:
-        lark = Lark(grammar, **parser_opts)  # ambiguity='explicit'
-        if use_cache:
-            _save_parser_to_file(lark, cached_parser_file)
+def _get_parser_file_name(level, lang, keep_all_tokens, skip_faulty, backend="earley"):
+    grammar = create_lalr_grammar(level, lang) if backend == "lalr" else create_grammar(level, lang, skip_faulty)
+    unique_parser_hash = _get_grammar_hash(grammar, _get_parser_options(keep_all_tokens, backend))
+    return f"cached-parser-{level}-{lang}-{unique_parser_hash}.pkl"
+
+
+def _get_terminals_file_name(level, lang, skip_faulty):
+    grammar = create_grammar(level, lang, skip_faulty)
+    return f"cached-terminals-{level}-{lang}-{_get_grammar_hash(grammar, 'terminals')}.pkl"
+
+
+def _build_parser(level, lang, keep_all_tokens, skip_faulty, backend="earley"):
+    if backend == "lalr":
+        return Lark(create_lalr_grammar(level, lang), lexer_callbacks=LALR_LEXER_CALLBACKS,
+                    **_get_parser_options(keep_all_tokens, backend))
+    grammar = create_grammar(level, lang, skip_faulty)
+    return Lark(grammar, **_get_parser_options(keep_all_tokens, backend))  # ambiguity='explicit'
+
+
+def _end_at_last_character(token):
+    """Give a token that ends with a newline the end position Earley gives it.
+
+    The Earley parser ends a token right after its last character, on the same line.
+    The LALR lexer ends it at the start of the next line. The positions end up in the
+    source map, so they have to be the same.
+    """
+    if token.value.endswith('\n'):
+        previous_newline = token.value.rfind('\n', 0, len(token.value) - 1)
+        if previous_newline == -1:
+            column = token.column + len(token.value) - 1
+        else:
+            column = len(token.value) - 1 - previous_newline
+        token.end_line -= 1
+        token.end_column = column + 1
+    return token
+
+
+# _EOL is the only terminal that can end with a newline
+LALR_LEXER_CALLBACKS = {'_EOL': _end_at_last_character}
+
+
+def _load_lalr_parser(fp):
+    # Lark.load does not take the lexer callbacks, which are not stored with the parser
+    return Lark.__new__(Lark)._load(fp, lexer_callbacks=LALR_LEXER_CALLBACKS)
+
+
+def write_parser_bundle_files(directory, level, lang, skip_faulty):
+    """Build what get_parser needs for a level and language, and store it in `directory`.
 
+    Used at build time by build-tools/heroku/generate-parser-bundle.
+    """
+    backend = get_parser_backend(level, skip_faulty)
+    if backend != "earley":
+        lark = _build_parser(level, lang, False, skip_faulty, backend)
+        _save_parser_to_file(lark, _get_parser_file_name(level, lang, False, skip_faulty, backend), directory)
+
+    if shared_parsers_enabled and lang != "en":
+        terminals = _compile_language_terminals(level, lang, skip_faulty)
+        _save_pickle_to_file(terminals, _get_terminals_file_name(level, lang, skip_faulty), directory)
+        return
+
+    for keep_all_tokens in [False, True]:
+        lark = _build_parser(level, lang, keep_all_tokens, skip_faulty)
+        _save_parser_to_file(lark, _get_parser_file_name(level, lang, keep_all_tokens, skip_faulty), directory)
+
+
+class KeywordMatcher:
+    """Matches the terminals of a shared parser using the patterns of one keyword language."""
+
+    def __init__(self, regexps):
+        self.regexps = regexps
+
+    def match(self, term, text, index=0):
+        return self.regexps[term.name].match(text, index)
+
+
+def _with_keyword_language(english_parser, level, lang, skip_faulty):
+    """Return a version of the English parser that recognizes the keywords of `lang`.
+
+    The grammars of all keyword languages have exactly the same rules and terminal
+    names, only the patterns of the keyword terminals differ. Earley parsing with
+    the dynamic lexer only uses those patterns when matching terminals against the
+    input, so we can share the (large) parser tables of the English parser and only
+    swap in the terminal patterns of the other language. The input itself is never
+    changed, so all positions in the parse tree and the errors are those of the
+    original text.
+
+    Returns None if the grammar of `lang` does not have the same structure, in which
+    case a separate parser has to be built.
+    """
+    structure, patterns = _get_language_terminals(level, lang, skip_faulty)
+    if structure != _get_grammar_structure(english_parser.rules, english_parser.terminals,
+                                           english_parser.ignore_tokens):
+        return None
+
+    english_frontend = english_parser.parser
+    flags = english_frontend.parser.lexer_conf.g_regex_flags
+    regexps = {name: regex.compile(pattern, flags) for name, pattern in patterns.items()}
+
+    earley = copy.copy(english_frontend.parser)
+    earley.term_matcher = KeywordMatcher(regexps).match
+    frontend = copy.copy(english_frontend)
+    frontend.parser = earley
+    lark = copy.copy(english_parser)
+    lark.parser = frontend
     return lark
 
 
+def _get_language_terminals(level, lang, skip_faulty):
+    """Return the structure of the grammar for `lang` and the regexps of its terminals.
+
+    Compiling the grammar takes a few hundred milliseconds, so the result is cached to disk.
+    """
+    terminals_file = _get_terminals_file_name(level, lang, skip_faulty)
+    result = _restore_pickle_if_present(terminals_file)
+    if result is None:
+        result = _compile_language_terminals(level, lang, skip_faulty)
+        _save_pickle_to_file(result, terminals_file)
+    return result
+
+
+def _compile_language_terminals(level, lang, skip_faulty):
+    grammar = create_grammar(level, lang, skip_faulty)
+    loaded_grammar, _ = load_grammar(grammar, "<string>", (), False)
+    terminals, rules, ignore_tokens = loaded_grammar.compile(["start"], set())
+    return (_get_grammar_structure(rules, terminals, ignore_tokens),
+            {t.name: t.pattern.to_regexp() for t in terminals})
+
+
+def _get_grammar_structure(rules, terminals, ignore_tokens):
+    # keep_all_tokens is left out, the terminals are the same with or without it
+    rules = [(r.origin, r.expansion, r.alias, r.options.expand1, r.options.priority, r.options.empty_indices)
+             for r in rules]
+    structure = repr(rules) + repr(sorted((t.name, t.priority) for t in terminals)) + repr(sorted(ignore_tokens))
+    return hashlib.sha1(structure.encode()).hexdigest()
+
+
 ParseResult = namedtuple('ParseResult', ['code', 'source_map', 'has_turtle',
                          'has_pygame', 'has_clear', 'has_music', 'commands'])
 
 
-def transpile_inner_with_skipping_faulty(input_string, level, lang="en", unused_allowed=True):
-    def skipping_faulty(meta, args): return [True]
+class TranspileStats:
+    """The timings and counters of the phases of a transpilation.
 
-    defined_errors = [method for method in dir(IsValid) if method.startswith('error')]
-    defined_errors_original = dict()
+    `timed(phase)` adds the time spent in a phase to '<phase>_ms' and counts it in
+    '<phase>_cnt', like the timers of the querylog, and `inc` and `set` record counters
+    and values. The web app writes them to the querylog record of the request.
+    """
 
-    def set_error_to_allowed():
-        # override IsValid methods to always be valid & store original
-        for error in defined_errors:
-            defined_errors_original[error] = getattr(IsValid, error)
-            setattr(IsValid, error, skipping_faulty)
+    def __init__(self):
+        self.values = {}
 
-    def set_errors_to_original():
-        # revert IsValid methods to original
-        for error in defined_errors:
-            setattr(IsValid, error, defined_errors_original[error])
+    @contextlib.contextmanager
+    def timed(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc(phase + '_ms', (time.perf_counter() - start) * 1000)
+            self.inc(phase + '_cnt')
+
+    def inc(self, name, amount=1):
+        self.values[name] = self.values.get(name, 0) + amount
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def update(self, values):
+        """Add the timings and counters of another transpilation, for instance from another process."""
+        for name, value in values.items():
+            if name.endswith('_ms') or name.endswith('_cnt'):
+                self.inc(name, value)
+            else:
+                self.set(name, value)
 
-    try:
-        set_error_to_allowed()
-        transpile_result = transpile_inner(
-            input_string, level, lang, populate_source_map=True, unused_allowed=unused_allowed
-        )
-    finally:
-        # make sure to always revert IsValid methods to original
-        set_errors_to_original()
 
-    # If transpiled successfully while allowing errors, transpile mapped code again to get original error
+class NullTranspileStats(TranspileStats):
+    """Records nothing, for transpilations that are not measured."""
+
+    @contextlib.contextmanager
+    def timed(self, phase):
+        yield
+
+    def inc(self, name, amount=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+
+@dataclass
+class TranspileContext:
+    """The state of a single transpilation.
+
+    This is passed along to the parser and the transformers instead of being kept in
+    module-level state, so that many programs can be transpiled at the same time.
+    """
+    level: int
+    lang: str = 'en'
+    # when skip_faulty is True, the grammar contains buckets for faulty code and the errors
+    # raised by the transformers are recorded in the source map instead of being raised
+    skip_faulty: bool = False
+    # accept the error productions in the parse tree, so the valid part of a faulty program can be transpiled
+    accept_errors: bool = False
+    # reuse the parse trees of unchanged lines and blocks from earlier transpilations, see parse_input_incrementally
+    incremental: bool = False
+    # when accept_errors is True, the meta and the exception of every accepted error production
+    skipped_errors: list = field(default_factory=list)
+    source_map: SourceMap = field(default_factory=SourceMap)
+    stats: TranspileStats = field(default_factory=NullTranspileStats)
+
+    def __post_init__(self):
+        self.source_map.set_level(self.level)
+        self.source_map.set_language(self.lang)
+        self.source_map.set_skip_faulty(self.skip_faulty)
+
+
+def transpile_inner_with_skipping_faulty(input_string, level, lang="en", unused_allowed=True, stats=None):
+    context = TranspileContext(level, lang, skip_faulty=True, accept_errors=True,
+                               stats=stats if stats is not None else NullTranspileStats())
+    transpile_result = transpile_inner(
+        input_string, level, lang, populate_source_map=True, unused_allowed=unused_allowed, context=context
+    )
+
+    # If transpiled successfully while allowing errors, the error of the skipped code is that of the
+    # error production in it, or else the one the transformer raised for it.
     # If none is found, raise error so that original error will be returned
     at_least_one_error_found = False
 
-    for hedy_source_code, python_source_code in source_map.map.copy().items():
+    for hedy_source_code, python_source_code in transpile_result.source_map.map.items():
         if hedy_source_code.error is not None or python_source_code.code == 'pass':
-            try:
-                transpile_inner(hedy_source_code.code, source_map.level, source_map.language)
-            except Exception as e:
-                hedy_source_code.error = e
+            error = find_skipped_error(context.skipped_errors, hedy_source_code.source_range)
+            if error is not None:
+                hedy_source_code.error = error
 
             if hedy_source_code.error is not None:
                 at_least_one_error_found = True
@@ -3147,7 +3817,18 @@ def transpile_inner_with_skipping_faulty(input_string, level, lang="en", unused_
     return transpile_result
 
 
-def transpile(input_string, level, lang="en", skip_faulty=True, is_debug=False, unused_allowed=False):
+def find_skipped_error(skipped_errors, source_range):
+    """Returns the exception of the first skipped error production that starts in the given range."""
+    start = (source_range.from_line, source_range.from_column)
+    end = (source_range.to_line, source_range.to_column)
+    for meta, error in skipped_errors:
+        if not meta.empty and start <= (meta.line, meta.column) <= end:
+            return error
+    return None
+
+
+def transpile(input_string, level, lang="en", skip_faulty=True, is_debug=False, unused_allowed=False,
+              incremental=False, stats=None):
     """
     Function that transpiles the Hedy code to Python
 
@@ -3157,22 +3838,38 @@ def transpile(input_string, level, lang="en", skip_faulty=True, is_debug=False,
     The second time, after the non-skipping approach raised an exception,
     we try transpile the code with skipping faulty code, if skip_faulty is True.
     After that either the partial program is returned or the original error
+
+    A faulty program is parsed twice on purpose: most programs are valid, and the
+    grammar with the buckets for faulty code is several times slower to parse with,
+    can't be parsed with LALR and can't reuse parse trees (see parse_input_incrementally).
+    The first pass of a faulty program mostly stops at the first error.
+
+    With incremental=True, the parse trees of the lines and blocks that were transpiled
+    before are reused, see parse_input_incrementally. The result is the same. Only the
+    parsing is saved, the rest of the transpilation still runs over the whole program.
+
+    If `stats` (a TranspileStats) is given, the timings and counters of the phases are added to it.
+
+    This function does not use any global state, so it can be called from multiple threads at once.
     """
 
+    stats = stats if stats is not None else NullTranspileStats()
+    stats.set('input_lines', input_string.count('\n') + 1)
     try:
-        source_map.set_skip_faulty(False)
         transpile_result = transpile_inner(input_string, level, lang, populate_source_map=True,
-                                           is_debug=is_debug, unused_allowed=unused_allowed)
+                                           is_debug=is_debug, unused_allowed=unused_allowed,
+                                           context=TranspileContext(int(level), lang, incremental=incremental,
+                                                                    stats=stats))
 
     except Exception as original_error:
         hedy_amount_lines = len(input_string.strip().split('\n'))
 
         if getenv('ENABLE_SKIP_FAULTY', False) and skip_faulty and hedy_amount_lines > 1:
-            if isinstance(original_error, source_map.exceptions_not_to_skip):
+            if isinstance(original_error, SourceMap.exceptions_not_to_skip):
                 raise original_error
             try:
-                source_map.set_skip_faulty(True)
-                transpile_result = transpile_inner_with_skipping_faulty(input_string, level, lang)
+                with stats.timed('skip_faulty'):
+                    transpile_result = transpile_inner_with_skipping_faulty(input_string, level, lang, stats=stats)
             except Exception:
                 raise original_error  # we could not skip faulty code, raise original exception
         else:
@@ -3181,6 +3878,172 @@ def transpile(input_string, level, lang="en", skip_faulty=True, is_debug=False,
     return transpile_result
 
 
+TranspileManyResult = namedtuple('TranspileManyResult', ['result', 'error'])
+
+
+def transpile_many(items, transpile_function=None, max_workers=None, **options):
+    """
+    Transpiles many programs, and returns a `TranspileManyResult` for every item, in order.
+
+    Every item is a (code, level, lang) tuple. `result` is the `ParseResult` of a program,
+    or None if it raised an exception, which is then the `error`. Any Exception counts as
+    an error of the program, also the ones that aren't a HedyException, so that one program
+    can't fail the whole batch. SystemExit and KeyboardInterrupt are raised as usual.
+
+    Identical programs are transpiled once, and the programs are transpiled grouped by
+    level and language, so that every parser is fetched once even if the parser cache
+    can't hold all the parsers of the batch.
+
+    The programs are transpiled by `transpile_function` (by default `transpile`), which
+    is called with the code, level, language and the `options`. With `max_workers` that
+    many programs are transpiled at the same time by a thread pool, which is only useful
+    if `transpile_function` transpiles in other processes (like a `TranspilePool`).
+    """
+    transpile_function = transpile_function or transpile
+    items = list(items)
+
+    groups = OrderedDict()
+    for code, level, lang in items:
+        groups.setdefault((level, lang), OrderedDict()).setdefault(code, None)
+    programs = [(code, level, lang) for (level, lang), codes in groups.items() for code in codes]
+
+    def transpile_one(program):
+        return _try_transpile(transpile_function, program, options)
+
+    if max_workers and max_workers > 1 and len(programs) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = dict(zip(programs, executor.map(transpile_one, programs)))
+    else:
+        results = {program: transpile_one(program) for program in programs}
+
+    return [results[(code, level, lang)] for code, level, lang in items]
+
+
+def _try_transpile(transpile_function, program, options):
+    code, level, lang = program
+    try:
+        return TranspileManyResult(transpile_function(code, level, lang, **options), None)
+    except Exception as ex:
+        return TranspileManyResult(None, ex)
+
+
+# The commands at the start of a line that narrow down the levels a program can be valid at, see candidate_levels
+LEVEL_DETECTION_COMMANDS = ('print', 'ask', 'echo', 'forward', 'turn', 'color', 'sleep', 'add', 'remove', 'clear',
+                            'play', 'if', 'else', 'elif', 'repeat', 'for', 'while', 'define', 'call')
+
+LevelDetection = namedtuple('LevelDetection', ['level', 'result', 'errors', 'timed_out'])
+
+
+def candidate_levels(input_string, lang='en'):
+    """
+    Returns the levels at which the program can be valid, judging by the commands its lines start with:
+    the levels whose commands_per_level don't have all of them are left out.
+    """
+    keywords = get_line_keyword_matcher(lang)
+    commands = {keywords.leading_command(LEVEL_DETECTION_COMMANDS, line) for line in input_string.split('\n')}
+    commands.discard(None)
+    return [level for level in range(1, HEDY_MAX_LEVEL + 1) if commands.issubset(keywords_per_level[level])]
+
+
+def detect_level(input_string, lang='en', levels=None, timeout=None, transpile_function=None, max_workers=None,
+                 **options):
+    """
+    Finds the lowest level at which the program is valid, and returns a `LevelDetection` with that level and
+    the `ParseResult` at that level. The level is None if the program is not valid at any of the levels.
+
+    The candidate `levels` are those of candidate_levels by default, and they are transpiled with
+    `transpile_function` and the `options` like in transpile_many. With `max_workers` that many levels are
+    transpiled at the same time, the lowest levels first, and the higher levels are abandoned as soon as a
+    lower level turns out to be valid.
+
+    No level is started after `timeout` seconds, and with `max_workers` the detection returns after
+    `timeout` seconds at the latest. The levels that are still being transpiled at that time are not
+    interrupted, their threads keep running until `transpile_function` returns, so use `max_workers` with a
+    `transpile_function` that transpiles in other processes and has a timeout of its own (like a
+    `TranspilePool`). Without `max_workers` a level can't be interrupted, so a level of which the estimated
+    cost (see estimate_program_cost) exceeds the time that is left is skipped.
+
+    A level is only invalid if the program raises a HedyException at that level. A level that could not be
+    decided, because it was skipped, timed out, was too complex to transpile or failed for another reason,
+    is passed over. `timed_out` tells whether the detection was cut short or levels were passed over, in
+    which case a higher level than the lowest valid level may have been returned, or none at all.
+    `errors` has the exception of every level that was found to be invalid.
+    """
+    if transpile_function is None:
+        # Skipping faulty code would make every level valid
+        transpile_function, options = transpile, dict(options, skip_faulty=False)
+    levels = sorted(candidate_levels(input_string, lang) if levels is None else levels)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+
+    def probe(level):
+        outcome = _try_transpile(transpile_function, (input_string, level, lang), options)
+        if outcome.error is None:
+            # Code that was skipped because of an error
+            skipped = [code.error for code in outcome.result.source_map.map if code.error is not None]
+            if skipped:
+                return TranspileManyResult(None, skipped[0])
+        return outcome
+
+    def is_invalid(outcome):
+        return isinstance(outcome.error, exceptions.HedyException) and \
+            not isinstance(outcome.error, exceptions.InputTooComplexException)
+
+    errors = {}
+    if not max_workers or max_workers <= 1 or len(levels) <= 1:
+        costs = {level: estimate_program_cost(measure_program_complexity(input_string, level), level)
+                 for level in levels} if deadline is not None else {}
+        timed_out = False
+        for level in levels:
+            if deadline is not None:
+                remaining_ms = (deadline - time.monotonic()) * 1000
+                if remaining_ms <= 0:
+                    return LevelDetection(None, None, errors, True)
+                if costs[level] > remaining_ms:
+                    timed_out = True
+                    continue
+            outcome = probe(level)
+            if outcome.error is None:
+                return LevelDetection(level, outcome.result, errors, timed_out)
+            if is_invalid(outcome):
+                errors[level] = outcome.error
+            else:
+                timed_out = True
+        return LevelDetection(None, None, errors, timed_out)
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(probe, level): level for level in levels}
+        outcomes = {}
+        pending = set(futures)
+        while pending:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            done, pending = concurrent.futures.wait(pending, remaining, concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                outcomes[futures[future]] = future.result()
+            # The lowest valid level is known once all the levels below it are done and not valid
+            undecided = False
+            for level in levels:
+                if level not in outcomes:
+                    break
+                if outcomes[level].error is None:
+                    return LevelDetection(level, outcomes[level].result, errors, undecided)
+                if is_invalid(outcomes[level]):
+                    errors[level] = outcomes[level].error
+                else:
+                    undecided = True
+
+        valid = [level for level in levels if level in outcomes and outcomes[level].error is None]
+        errors.update({level: o.error for level, o in outcomes.items() if is_invalid(o)})
+        if valid:
+            return LevelDetection(valid[0], outcomes[valid[0]].result, errors, True)
+        undecided = any(o.error is not None and not is_invalid(o) for o in outcomes.values())
+        return LevelDetection(None, None, errors, bool(pending) or undecided)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 def translate_characters(s):
     # this method is used to make it more clear to kids what is meant in error messages
     # for example ' ' is hard to read, space is easier
@@ -3228,25 +4091,111 @@ def find_indent_length(line):
     return number_of_spaces
 
 
-def line_requires_indentation(line, lang):
-    # this is done a bit half-assed, clearly *parsing* the one line would be superior
-    # because now a line like `repeat is 5` would also require indentation!
+class LineKeywordMatcher:
+    """Finds the keywords of one keyword language in lines of Hedy code, for the preprocessors.
 
-    line = line.lstrip()  # remove spaces since also `    for    ` requires indentation
-    if lang not in indent_keywords.keys():  # some language like Greek or Czech do not have local keywords
-        lang = 'en'
+    A keyword matches in English and in the keyword language. The patterns are compiled the first
+    time they are needed and kept, so the preprocessors don't rebuild them for every line.
+    In a language without keywords of its own only the English keywords match.
+    """
 
-    local_indent_keywords = indent_keywords[lang]
+    INDENT_KEYWORDS = ['if', 'elif', 'for', 'repeat', 'while', 'else', 'define', 'def']
 
-    for k in local_indent_keywords:
-        # does the line start with this keyword?
+    def __init__(self, lang):
+        self.has_keywords = lang in ALL_KEYWORD_LANGUAGES
+        self.keywords = KEYWORDS.get(lang, KEYWORDS['en'])
+        self.repeat = self.keyword_and_translation('repeat')
+        self.times = self.keyword_and_translation('times')
+        self._starts_with = {}
+        self._contains = {}
+        self._leading = {}
+
+        # this is done a bit half-assed, clearly *parsing* the one line would be superior
+        # because now a line like `repeat is 5` would also require indentation!
         # We can't just split since some langs like French have keywords containing a space
         # We also have to check space/lineending/: after or forward 100 wil also require indentation
-        end_of_line_or_word = (len(line) > len(k) and (
-            line[len(k)] == " " or line[len(k)] == ":")) or len(line) == len(k)
-        if end_of_line_or_word and line[:len(k)] == k:
-            return True
-    return False
+        indent_keywords = [k for keyword in self.INDENT_KEYWORDS for k in self.keyword_and_translation(keyword)]
+        self._requires_indentation = re.compile(rf'(?:{self.alternatives(indent_keywords)})(?:[ :]|\Z)')
+
+    def keyword_and_translation(self, keyword):
+        translation = self.keywords.get(keyword)
+        return (keyword, translation) if translation not in (None, keyword) else (keyword,)
+
+    @staticmethod
+    def alternatives(keywords):
+        return '|'.join(re.escape(k) for k in keywords)
+
+    def starts_with(self, command, line):
+        """Does the line start with the keyword, followed by a space or the end of the line?"""
+        pattern = self._starts_with.get(command)
+        if pattern is None:
+            if self.has_keywords:
+                pattern = re.compile(rf'(?:{self.alternatives(self.keyword_and_translation(command))})(?= |\Z)')
+            else:
+                pattern = re.compile(re.escape(command))
+            self._starts_with[command] = pattern
+        return pattern.match(line) is not None
+
+    def starts_with_after_repeat(self, command, line):
+        """Does the line start with the keyword, possibly after `repeat x times`?"""
+        elements_in_line = line.split()
+        if len(elements_in_line) > 2 and elements_in_line[0] in self.repeat and elements_in_line[2] in self.times:
+            line = ' '.join(elements_in_line[3:])
+        return self.starts_with(command, line)
+
+    def contains_any_of(self, commands, line):
+        """Does the line contain any of the keywords (a tuple), anywhere?"""
+        pattern = self._contains.get(commands)
+        if pattern is None:
+            if self.has_keywords:
+                # = is not a keyword, but its translation would be the symbol for 'is'
+                keywords = [k for c in commands for k in (self.keyword_and_translation(c) if c != '=' else (c,))]
+            else:
+                keywords = commands
+            pattern = self._contains[commands] = re.compile(self.alternatives(keywords))
+        return pattern.search(line) is not None
+
+    def contains(self, command, line):
+        return self.contains_any_of((command,), line)
+
+    def contains_two(self, command, line):
+        """Does the line contain the keyword twice, as a separate word?"""
+        if not self.has_keywords:
+            return False
+        # surround in spaces since we dont want to match something like 'dishwasher is sophie'
+        return any(line.count(' ' + c + ' ') >= 2 for c in self.keyword_and_translation(command))
+
+    def leading_command(self, commands, line):
+        """The command of the tuple of commands that the line starts with after its indentation, or None."""
+        leading = self._leading.get(commands)
+        if leading is None:
+            by_keyword = {}
+            for command in commands:
+                for keyword in self.keyword_and_translation(command) if self.has_keywords else (command,):
+                    by_keyword.setdefault(keyword, command)
+            keywords = sorted(by_keyword, key=len, reverse=True)
+            leading = self._leading[commands] = (re.compile(rf'(?:{self.alternatives(keywords)})(?=[ :]|\Z)'),
+                                                 by_keyword)
+        pattern, by_keyword = leading
+        match = pattern.match(line.lstrip())
+        return by_keyword[match.group()] if match else None
+
+    def requires_indentation(self, line):
+        # remove spaces since also `    for    ` requires indentation
+        return self._requires_indentation.match(line.lstrip()) is not None
+
+
+LINE_KEYWORD_MATCHERS = {lang: LineKeywordMatcher(lang) for lang in ALL_KEYWORD_LANGUAGES}
+# some language like Greek or Czech do not have local keywords
+ENGLISH_ONLY_LINE_KEYWORD_MATCHER = LineKeywordMatcher(None)
+
+
+def get_line_keyword_matcher(lang):
+    return LINE_KEYWORD_MATCHERS.get(lang, ENGLISH_ONLY_LINE_KEYWORD_MATCHER)
+
+
+def line_requires_indentation(line, lang):
+    return get_line_keyword_matcher(lang).requires_indentation(line)
 
 
 def preprocess_blocks(code, level, lang):
@@ -3258,6 +4207,7 @@ def preprocess_blocks(code, level, lang):
     indent_size_adapted = False  # FH We can remove this now since we changed in indenter a bit in Nov 2022
     line_number = 0
     next_line_needs_indentation = False
+    keywords = get_line_keyword_matcher(lang)
     for line in lines:
         if ' _ ' in line or line == '_':
             raise hedy.exceptions.CodePlaceholdersPresentException(line_number=line_number+1)
@@ -3318,10 +4268,7 @@ def preprocess_blocks(code, level, lang):
             for i in range(difference_in_indents):
                 processed_code[-1] += '#ENDBLOCK'
 
-        if line_requires_indentation(line, lang):
-            next_line_needs_indentation = True
-        else:
-            next_line_needs_indentation = False
+        next_line_needs_indentation = keywords.requires_indentation(line)
 
         # save to compare for next line
         previous_number_of_indents = current_number_of_indents
@@ -3336,99 +4283,36 @@ def preprocess_blocks(code, level, lang):
     return "\n".join(processed_code)
 
 
+# a line with an if and one of these has a command after the condition, and needs an else
+IF_LINE_COMMANDS = ("print", "ask", "forward", "turn", "play")
+IF_LINE_EXCLUDED_COMMANDS = ("pressed",)
+
+
 def preprocess_ifs(code, lang='en'):
     processed_code = []
     lines = code.split("\n")
+    keywords = get_line_keyword_matcher(lang)
 
-    def starts_with(command, line):
-        if lang in ALL_KEYWORD_LANGUAGES:
-            command_plus_translated_command = [command, KEYWORDS[lang].get(command)]
-            for c in command_plus_translated_command:
-                #  starts with the keyword and next character is a space
-                if line[0:len(c)] == c and (len(c) == len(line) or line[len(c)] == ' '):
-                    return True
-            return False
-        else:
-            return line[0:len(command)] == command
-
-    def starts_with_after_repeat(command, line):
-        elements_in_line = line.split()
-        keywords_in_lang = KEYWORDS.get(lang, KEYWORDS['en'])
-        repeat_plus_translated = ['repeat', keywords_in_lang.get('repeat')]
-        times_plus_translated = ['times', keywords_in_lang.get('times')]
-
-        if len(elements_in_line) > 2 and elements_in_line[0] in repeat_plus_translated and elements_in_line[2] in times_plus_translated:
-            line = ' '.join(elements_in_line[3:])
-
-        if lang in ALL_KEYWORD_LANGUAGES:
-            command_plus_translated_command = [command, KEYWORDS[lang].get(command)]
-            for c in command_plus_translated_command:
-                #  starts with the keyword and next character is a space
-                if line[0:len(c)] == c and (len(c) == len(line) or line[len(c)] == ' '):
-                    return True
-            return False
-        else:
-            return line[0:len(command)] == command
-
-    def contains(command, line):
-        if lang in ALL_KEYWORD_LANGUAGES:
-            if not command == '=':
-                command_plus_translated_command = [command, KEYWORDS[lang].get(command)]
-            else:
-                command_plus_translated_command = [command]
-            for c in command_plus_translated_command:
-                if c in line:
-                    return True
-            return False
-        else:
-            return command in line
-
-    def contains_two(command, line):
-        if lang in ALL_KEYWORD_LANGUAGES:
-            command_plus_translated_command = [command, KEYWORDS[lang].get(command)]
-            for c in command_plus_translated_command:
-                if line.count(' ' + c + ' ') >= 2:  # surround in spaces since we dont want to mathc something like 'dishwasher is sophie'
-                    return True
-            return False
-
-    def contains_any_of(commands, line):
-        # translation is not needed here, happens in contains
-        if lang in ALL_KEYWORD_LANGUAGES:
-            for c in commands:
-                if contains(c, line):
-                    return True
-            return False
-        else:
-            for c in commands:
-                if contains(c, line):
-                    return True
-            return False
-
-    def next_non_empty_line(lines, start_line_number):
-        if start_line_number > len(lines):
-            return ''  # end of code, return empty so that starts_with doesnt find anything
-        else:
-            for i in range(start_line_number + 1, len(lines)):
-                if lines[i] == '':
-                    continue
-                else:
-                    return lines[i]
-
-        return ''  # nothing found? return empty so that starts_with doesnt find anything
+    # the next non-empty line after every line, empty if there is none, so that starts_with doesnt find anything
+    next_non_empty_lines = [''] * len(lines)
+    next_non_empty_line = ''
+    for i in range(len(lines) - 1, -1, -1):
+        next_non_empty_lines[i] = next_non_empty_line
+        if lines[i] != '':
+            next_non_empty_line = lines[i]
 
     for i in range(len(lines) - 1):
         line = lines[i]
 
         # if this line starts with if but does not contain an else, and the next non-empty line too is not an else.
-        if (starts_with('if', line) or starts_with_after_repeat('if', line)) and (not starts_with('else', next_non_empty_line(lines, i))) and (not contains('else', line)):
+        if ((keywords.starts_with('if', line) or keywords.starts_with_after_repeat('if', line))
+                and not keywords.starts_with('else', next_non_empty_lines[i])
+                and not keywords.contains('else', line)):
             # is this line just a condition and no other keyword (because that is no problem)
-            commands = ["print", "ask", "forward", "turn", "play"]
-            excluded_commands = ["pressed"]
-
             if (
-                (contains_any_of(commands, line) or contains_two('is', line)
-                 or (contains('is', line) and contains('=', line)))
-                and not contains_any_of(excluded_commands, line)
+                (keywords.contains_any_of(IF_LINE_COMMANDS, line) or keywords.contains_two('is', line)
+                 or (keywords.contains('is', line) and keywords.contains('=', line)))
+                and not keywords.contains_any_of(IF_LINE_EXCLUDED_COMMANDS, line)
             ):
                 # a second command, but also no else in this line -> check next line!
 
@@ -3460,6 +4344,98 @@ def check_program_size_is_valid(input_string):
         raise exceptions.InputTooBigException(lines_of_code=number_of_lines, max_lines=MAX_LINES)
 
 
+# The time it takes to transpile a program is about linear in its number of lines and tokens, on top of
+# a fixed time for every program, and lines and tokens take longer in the higher levels. Milliseconds,
+# fitted on the public programs and on dense programs of MAX_LINES lines with tests/benchmarks/program_cost.py
+PROGRAM_COST_BASE_MS = 24
+PROGRAM_COST_MS_PER_LINE = {
+    1: 0.19, 2: 1.92, 3: 1.9, 4: 0.1, 5: 0.86, 6: 1.5, 7: 1.04, 8: 0.97, 9: 2.57,
+    10: 2.43, 11: 1.3, 12: 2.27, 13: 4.51, 14: 4.6, 15: 3.59, 16: 19.14, 17: 16.03, 18: 6.4,
+}
+PROGRAM_COST_MS_PER_TOKEN = {
+    1: 0.1, 2: 0.1, 3: 0.23, 4: 0.72, 5: 1.17, 6: 0.82, 7: 0.89, 8: 0.88, 9: 0.82,
+    10: 0.83, 11: 0.87, 12: 0.98, 13: 0.96, 14: 0.92, 15: 0.89, 16: 0.27, 17: 0.37, 18: 0.31,
+}
+# Lines and tokens always take some time, even where the fit finds none, so that every level has a limit
+PROGRAM_COST_MIN_MS_PER_LINE = 0.1
+PROGRAM_COST_MIN_MS_PER_TOKEN = 0.1
+# On top of that, the time of nested blocks grows with the square of their depth, and for every line with an
+# unbalanced quote the parser tries many ways to read the rest of the line. Fitted over all levels.
+PROGRAM_COST_MS_PER_NESTING_SQUARED = 0.65
+PROGRAM_COST_MS_PER_UNBALANCED_LINE = 38
+# The estimate is this many times the fitted time, for slower machines and busy servers
+PROGRAM_COST_SAFETY_FACTOR = 2
+PROGRAM_TOKEN_REGEX = re.compile(r"\w+|\S")
+# From level 4 on a quoted text is parsed as a single terminal
+PROGRAM_TOKEN_REGEX_QUOTED = re.compile(r"'[^'\n]*'|\"[^\"\n]*\"|\w+|\S")
+ProgramComplexity = namedtuple('ProgramComplexity', ['lines', 'longest_line', 'tokens', 'nesting_depth',
+                                                     'unbalanced_quotes', 'costliest_line'])
+
+
+def measure_program_complexity(input_string, level):
+    """
+    Measures the features of a program that make it expensive to transpile at the given level, in one
+    pass over the program.
+
+    The nesting depth counts the indented blocks (brackets take no noticeable time), unbalanced_quotes is
+    the number of lines with a quote that isn't closed from level 4 on, where texts are quoted, and
+    costliest_line is the (1-based) number of the line with the most tokens.
+    """
+    tokens = longest_line = unbalanced_quotes = nesting_depth = 0
+    costliest_line, costliest_line_tokens = 1, -1
+    indents = [0]
+    quoted = int(level) >= 4
+    token_regex = PROGRAM_TOKEN_REGEX_QUOTED if quoted else PROGRAM_TOKEN_REGEX
+    lines = input_string.replace('\r\n', '\n').split('\n')
+    for number, line in enumerate(lines, 1):
+        line_tokens = token_regex.findall(line)
+        tokens += len(line_tokens)
+        if len(line_tokens) > costliest_line_tokens:
+            costliest_line, costliest_line_tokens = number, len(line_tokens)
+        longest_line = max(longest_line, len(line))
+        # A quote without a closing quote is a token of its own
+        if quoted and ("'" in line_tokens or '"' in line_tokens):
+            unbalanced_quotes += 1
+
+        if line.strip():
+            indent = len(line) - len(line.lstrip(' '))
+            while indent < indents[-1]:
+                indents.pop()
+            if indent > indents[-1]:
+                indents.append(indent)
+        nesting_depth = max(nesting_depth, len(indents) - 1)
+
+    return ProgramComplexity(len(lines), longest_line, tokens, nesting_depth, unbalanced_quotes, costliest_line)
+
+
+def estimate_program_cost(complexity, level):
+    """Estimates how many milliseconds it takes to transpile a program with the given complexity."""
+    level = int(level)
+    per_line = max(PROGRAM_COST_MIN_MS_PER_LINE,
+                   PROGRAM_COST_MS_PER_LINE.get(level, max(PROGRAM_COST_MS_PER_LINE.values())))
+    per_token = max(PROGRAM_COST_MIN_MS_PER_TOKEN,
+                    PROGRAM_COST_MS_PER_TOKEN.get(level, max(PROGRAM_COST_MS_PER_TOKEN.values())))
+    return PROGRAM_COST_SAFETY_FACTOR * (PROGRAM_COST_BASE_MS + complexity.lines * per_line
+                                         + complexity.tokens * per_token
+                                         + complexity.nesting_depth ** 2 * PROGRAM_COST_MS_PER_NESTING_SQUARED
+                                         + complexity.unbalanced_quotes * PROGRAM_COST_MS_PER_UNBALANCED_LINE)
+
+
+def check_program_complexity_is_valid(input_string, level, stats=None):
+    """
+    Rejects programs that are estimated to take longer than MAX_PROGRAM_COST_MS to transpile, before
+    they are parsed. Measuring a program of MAX_LINES lines takes about a millisecond.
+    """
+    stats = stats if stats is not None else NullTranspileStats()
+    complexity = measure_program_complexity(input_string, level)
+    cost = estimate_program_cost(complexity, level)
+    stats.set('input_tokens', complexity.tokens)
+    stats.set('input_nesting_depth', complexity.nesting_depth)
+    stats.set('input_estimated_cost', round(cost))
+    if cost > MAX_PROGRAM_COST_MS:
+        raise exceptions.InputTooComplexException(line_number=complexity.costliest_line)
+
+
 def process_input_string(input_string, level, lang, preprocess_ifs_enabled=True):
     result = input_string.replace('\r\n', '\n')
 
@@ -3481,10 +4457,25 @@ def process_input_string(input_string, level, lang, preprocess_ifs_enabled=True)
     return result
 
 
-def parse_input(input_string, level, lang):
-    parser = get_parser(level, lang, skip_faulty=source_map.skip_faulty)
+def parse_input(input_string, level, lang, skip_faulty=False, stats=None):
+    stats = stats if stats is not None else NullTranspileStats()
+    backend = get_parser_backend(level, skip_faulty)
+    if backend != "earley":
+        with stats.timed('get_parser'):
+            parser = get_parser(level, lang, skip_faulty=skip_faulty, backend=backend, stats=stats)
+        try:
+            with stats.timed('parse_lalr'):
+                parse_result = parser.parse(input_string + '\n')
+            return parse_result.children[0]
+        except lark.exceptions.UnexpectedInput:
+            # Earley accepts more programs, and gives the errors we know how to report
+            pass
+
+    with stats.timed('get_parser'):
+        parser = get_parser(level, lang, skip_faulty=skip_faulty, stats=stats)
     try:
-        parse_result = parser.parse(input_string + '\n')
+        with stats.timed('parse'):
+            parse_result = parser.parse(input_string + '\n')
         return parse_result.children[0]  # getting rid of the root could also be done in the transformer would be nicer
     except lark.UnexpectedEOF:
         lines = input_string.split('\n')
@@ -3510,30 +4501,209 @@ def parse_input(input_string, level, lang):
             raise e
 
 
-def is_program_valid(program_root, input_string, level, lang):
+class FragmentCache:
+    """Least-recently-used cache of the parse trees of program fragments, see parse_input_incrementally.
+
+    Like the ParserCache, the cache has a memory budget: the trees (and the texts of
+    the fragments they are stored under) are measured when they are added, and the
+    least recently used trees are evicted until their combined size fits `max_bytes`.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # key -> (tree, size)
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.mutex = threading.Lock()
+
+    def get(self, key):
+        with self.mutex:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, tree, size=None):
+        if size is None:
+            size = _memory_footprint((key, tree))
+        if size > self.max_bytes:
+            return
+        with self.mutex:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            while self.entries and self.current_bytes + size > self.max_bytes:
+                self.current_bytes -= self.entries.popitem(last=False)[1][1]
+                self.evictions += 1
+            self.entries[key] = (tree, size)
+            self.current_bytes += size
+
+    def clear(self):
+        with self.mutex:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self.mutex:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+FRAGMENT_CACHE = FragmentCache(int(getenv('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
+
+# Marks a fragment that could not be parsed on its own
+UNPARSABLE_FRAGMENT = 'unparsable'
+
+
+def parse_input_incrementally(input_string, level, lang, stats=None):
+    """Same as parse_input, but reuses the parse trees of lines and blocks that were parsed before.
+
+    When a student edits one line of a long program, only that line has to be parsed
+    again. The program is split into fragments: a line that starts a new command,
+    together with the lines that belong to it (indented lines, #ENDBLOCK lines, else
+    and elif lines and empty lines). Every fragment is parsed on its own, and the
+    trees are cached by their text, level and language. The trees of the fragments
+    are then combined into the tree of the whole program, with the positions moved
+    to where the fragment is in the program.
+
+    If the program can't be split, or a fragment does not parse on its own into
+    whole commands, the program is parsed as a whole, so the result (and the error)
+    is always exactly what parse_input gives.
+
+    Only the parsing is incremental: the lookup table, the checks and the transformers
+    still run over the tree of the whole program, because what a line transpiles to
+    depends on the variables that are defined in the rest of the program.
+    """
+    stats = stats if stats is not None else NullTranspileStats()
+    fragments = split_into_fragments(input_string, level, lang)
+    if len(fragments) < 2:
+        return parse_input(input_string, level, lang, stats=stats)
+
+    children = []
+    first = last = None
+    line_offset = position_offset = 0
+    for fragment in fragments:
+        key = (level, lang, fragment)
+        tree = FRAGMENT_CACHE.get(key)
+        if tree is None:
+            stats.inc('parse_fragment_misses')
+            tree = _parse_fragment(fragment, level, lang, stats)
+            FRAGMENT_CACHE.put(key, tree)
+        else:
+            stats.inc('parse_fragment_hits')
+        if tree is UNPARSABLE_FRAGMENT:
+            return parse_input(input_string, level, lang, stats=stats)
+
+        shifted = _shift_positions(tree, line_offset, position_offset)
+        children.extend(shifted.children)
+        first = first or shifted
+        last = shifted
+        line_offset += fragment.count('\n') + 1
+        position_offset += len(fragment) + 1
+
+    meta = copy.copy(first.meta)
+    for attribute in ['end_line', 'end_column', 'end_pos', 'container_end_line', 'container_end_column']:
+        setattr(meta, attribute, getattr(last.meta, attribute))
+    return Tree(first.data, children, meta)
+
+
+def split_into_fragments(input_string, level, lang):
+    """Split a (preprocessed) program into the texts of its fragments, see parse_input_incrementally."""
+    continuation_keywords = {'else', 'elif', KEYWORDS.get(lang, KEYWORDS['en']).get('else'),
+                             KEYWORDS.get(lang, KEYWORDS['en']).get('elif')}
+    fragments = []
+    for line in input_string.split('\n'):
+        first_word = line.split(' ', 1)[0]
+        starts_fragment = (line.strip() != '' and not line.startswith(' ') and not line.startswith('#ENDBLOCK')
+                           and first_word not in continuation_keywords)
+        if starts_fragment and fragments and fragments[-1][1]:
+            fragments.append([line, True])
+        elif fragments:
+            fragments[-1][0] += '\n' + line
+            fragments[-1][1] = fragments[-1][1] or starts_fragment
+        else:
+            fragments.append([line, starts_fragment])
+    return [text for text, _ in fragments]
+
+
+def _parse_fragment(fragment, level, lang, stats=None):
+    try:
+        tree = parse_input(fragment, level, lang, stats=stats)
+    except Exception:
+        return UNPARSABLE_FRAGMENT
+    # Only whole commands can be combined, anything else (such as an error_invalid, which
+    # is only allowed at the start of a program) has to be parsed in the context of the program
+    if any(not isinstance(c, Tree) or c.data not in ['command', 'define'] for c in tree.children):
+        return UNPARSABLE_FRAGMENT
+    return tree
+
+
+def _shift_positions(node, lines, characters):
+    """Return a copy of a parse tree that starts `lines` lines and `characters` characters later."""
+    if isinstance(node, Token):
+        return Token(node.type, node.value,
+                     _shift(node.start_pos, characters), _shift(node.line, lines), node.column,
+                     _shift(node.end_line, lines), node.end_column, _shift(node.end_pos, characters))
+    if isinstance(node, Tree):
+        meta = copy.copy(node.meta)
+        for attribute, value in vars(node.meta).items():
+            if attribute.endswith('line'):
+                setattr(meta, attribute, value + lines)
+            elif attribute.endswith('pos'):
+                setattr(meta, attribute, value + characters)
+        return Tree(node.data, [_shift_positions(c, lines, characters) for c in node.children], meta)
+    return node
+
+
+def _shift(value, offset):
+    return value + offset if value is not None else None
+
+
+def is_program_valid(program_root, input_string, level, lang, context=None):
     # IsValid raises the appropriate exception when an error production (starting with error_)
     # is found in the parse tree
-    IsValid(level, lang, input_string).transform(program_root)
+    context = context or TranspileContext(level, lang)
+    create_validator(input_string, level, lang, context).transform(program_root)
+
 
+def create_validator(input_string, level, lang, context):
+    if context.accept_errors:
+        return IsValidSkippingFaulty(level, lang, input_string, context.skip_faulty, context.skipped_errors)
+    return IsValid(level, lang, input_string, context.skip_faulty)
 
-def repair_leading_space(input_string, lang, level, line):
+
+def repair_leading_space(input_string, lang, level, line, skip_faulty=False):
     fixed_code = program_repair.remove_leading_spaces(input_string)
     result = None
     if fixed_code != input_string:  # only if we have made a successful fix
         try:
-            fixed_result = transpile_inner(fixed_code, level, lang)
+            fixed_result = transpile_inner(fixed_code, level, lang,
+                                           context=TranspileContext(level, lang, skip_faulty=skip_faulty))
             result = fixed_result
             raise exceptions.InvalidSpaceException(
                 level=level, line_number=line, fixed_code=fixed_code, fixed_result=result)
         except exceptions.HedyException as E:
             if type(E) is not exceptions.InvalidSpaceException:
-                transpile_inner(fixed_code, level)
+                transpile_inner(fixed_code, level, context=TranspileContext(level, skip_faulty=skip_faulty))
                 # The fixed code contains another error. Only report the original error for now.
     return fixed_code, result
 
 
-def is_program_complete(abstract_syntax_tree, level):
-    is_complete = IsComplete(level).transform(abstract_syntax_tree)
+def is_program_complete(abstract_syntax_tree, level, is_complete=None):
+    if is_complete is None:
+        is_complete = IsComplete(level).transform(abstract_syntax_tree)
     if not is_complete[0]:
         incomplete_command_and_line = is_complete[1][0]
         incomplete_command = incomplete_command_and_line[0]
@@ -3542,48 +4712,66 @@ def is_program_complete(abstract_syntax_tree, level):
                                                     line_number=line)
 
 
-def create_lookup_table(abstract_syntax_tree, level, lang, input_string):
-    visitor = LookupEntryCollector(level)
-    visitor.visit_topdown(abstract_syntax_tree)
-    entries = visitor.lookup
+def create_lookup_table(abstract_syntax_tree, level, lang, input_string, skip_faulty=False, entries=None):
+    if entries is None:
+        visitor = LookupEntryCollector(level)
+        visitor.visit_topdown(abstract_syntax_tree)
+        entries = visitor.lookup
 
-    TypeValidator(entries, level, lang, input_string).transform(abstract_syntax_tree)
+    TypeValidator(entries, level, lang, input_string, skip_faulty).transform(abstract_syntax_tree)
 
     return entries
 
 
-def create_AST(input_string, level, lang="en"):
-    program_root = parse_input(input_string, level, lang)
-
-    # checks whether any error production nodes are present in the parse tree
-    is_program_valid(program_root, input_string, level, lang)
-    abstract_syntax_tree = ExtractAST().transform(program_root)
-    is_program_complete(abstract_syntax_tree, level)
+def create_AST(input_string, level, lang="en", context=None):
+    context = context or TranspileContext(level, lang)
+    stats = context.stats
+    if context.incremental and not context.skip_faulty:
+        program_root = parse_input_incrementally(input_string, level, lang, stats)
+    else:
+        program_root = parse_input(input_string, level, lang, context.skip_faulty, stats)
+
+    # Checks whether any error production nodes are present in the parse tree, and runs the
+    # other analyses of the parse tree in the same pass. The errors of those are raised below,
+    # in the order in which the analyses used to run.
+    with stats.timed('analyze'):
+        analysis = AnalyzeProgram(create_validator(input_string, level, lang, context), level).analyze(program_root)
+    stats.set('parse_tree_nodes', analysis.nodes)
+    analysis.raise_error('extract')
+    abstract_syntax_tree = analysis.ast
+    analysis.raise_error('complete')
+    is_program_complete(abstract_syntax_tree, level, analysis.completeness_result)
 
     if not valid_echo(abstract_syntax_tree):
         raise exceptions.LonelyEchoException()
 
-    lookup_table = create_lookup_table(abstract_syntax_tree, level, lang, input_string)
-    commands = AllCommands(level).transform(program_root)
+    analysis.raise_error('lookup')
+    with stats.timed('type_validation'):
+        lookup_table = create_lookup_table(abstract_syntax_tree, level, lang, input_string, context.skip_faulty,
+                                           analysis.lookup)
+    analysis.raise_error('commands')
+    commands = analysis.commands
     # FH, dec 2023. I don't love how AllCommands works on program root and not on AST,
     # but his will do for now. One day we should really start to clean up our AST!
 
     return abstract_syntax_tree, lookup_table, commands
 
 
-def transpile_inner(input_string, level, lang="en", populate_source_map=False, is_debug=False, unused_allowed=False):
-    check_program_size_is_valid(input_string)
-    input_string = process_input_string(input_string, level, lang)
+def transpile_inner(input_string, level, lang="en", populate_source_map=False, is_debug=False, unused_allowed=False,
+                    context=None):
+    context = context or TranspileContext(int(level), lang)
+    stats = context.stats
+    with stats.timed('preprocess'):
+        check_program_size_is_valid(input_string)
+        check_program_complexity_is_valid(input_string, level, stats)
+        input_string = process_input_string(input_string, level, lang)
 
     level = int(level)
     if level > HEDY_MAX_LEVEL:
         raise Exception(f'Levels over {HEDY_MAX_LEVEL} not implemented yet')
 
-    if populate_source_map:
-        source_map.clear()
-        source_map.set_level(level)
-        source_map.set_language(lang)
-        source_map.set_hedy_input(input_string)
+    source_map = context.source_map
+    source_map.set_hedy_input(input_string)
 
     # FH, may 2022. for now, we just output arabic numerals when the language is ar
     # this can be changed into a profile setting or could be detected
@@ -3594,11 +4782,13 @@ def transpile_inner(input_string, level, lang="en", populate_source_map=False, i
         numerals_language = "Latin"
 
     try:
-        abstract_syntax_tree, lookup_table, commands = create_AST(input_string, level, lang)
+        abstract_syntax_tree, lookup_table, commands = create_AST(input_string, level, lang, context)
 
         # grab the right transpiler from the lookup
         convertToPython = TRANSPILER_LOOKUP[level]
-        python = convertToPython(lookup_table, lang, numerals_language, is_debug).transform(abstract_syntax_tree)
+        with stats.timed('convert'):
+            python = convertToPython(lookup_table, lang, numerals_language, is_debug,
+                                     source_map).transform(abstract_syntax_tree)
 
         has_clear = "clear" in commands
         has_turtle = "forward" in commands or "turn" in commands or "color" in commands
@@ -3608,7 +4798,8 @@ def transpile_inner(input_string, level, lang="en", populate_source_map=False, i
         parse_result = ParseResult(python, source_map, has_turtle, has_pygame, has_clear, has_music, commands)
 
         if populate_source_map:
-            source_map.set_python_output(python)
+            with stats.timed('source_map'):
+                source_map.set_python_output(python)
 
         if not unused_allowed:
             for x in lookup_table:
@@ -1,6 +1,8 @@
 import logging
 import os
+from collections.abc import Mapping
 from os import path
+from types import MappingProxyType
 
 import static_babel_content
 
@@ -446,15 +448,53 @@ for lang in sorted(languages):
     if os.path.exists(path.join(data_root, './grammars/keywords-' + lang + '.lark')):
         ALL_KEYWORD_LANGUAGES[lang] = lang[0:2].upper()  # first two characters
 
-# Load and cache all keyword yamls
-KEYWORDS = {}
-for lang in ALL_KEYWORD_LANGUAGES.keys():
-    KEYWORDS[lang] = YamlFile.for_file(f'{content_dir}/keywords/{lang}.yaml').to_dict()
-    for k, v in KEYWORDS[lang].items():
-        if isinstance(v, str) and "|" in v:
-            # when we have several options, pick the first one as default
-            # Some keys are ints, turn them into strings
-            KEYWORDS[lang][k] = v.split('|')[0]
+
+class KeywordIndex:
+    """The keywords of all languages, indexed from English to the local keywords and back.
+
+    Every English keyword has one or more local keywords, separated by a `|` in the YAML
+    files. The first one is the one we translate to, all of them are translated back to
+    English. The index is built once, when this module is imported, and is immutable.
+    """
+
+    def __init__(self, keywords_per_language):
+        self._to_local = {}
+        self._to_en = {}
+        for lang, keywords in keywords_per_language.items():
+            to_local = {k: tuple(str(v).split('|')) for k, v in keywords.items()}
+            to_en = {}
+            for k, translations in to_local.items():
+                for translation in translations:
+                    # if a local keyword translates more than one English keyword, the first one wins
+                    to_en.setdefault(translation, k)
+            self._to_local[lang] = MappingProxyType(to_local)
+            self._to_en[lang] = MappingProxyType(to_en)
+
+    @staticmethod
+    def from_directory(directory):
+        languages = sorted(f[:-len('.yaml')] for f in os.listdir(directory) if f.endswith('.yaml'))
+        return KeywordIndex({lang: YamlFile.for_file(path.join(directory, f'{lang}.yaml')).to_dict()
+                             for lang in languages})
+
+    def translations(self, lang):
+        """Return a mapping from every English keyword to the tuple of its local keywords."""
+        return self._to_local.get(lang, MappingProxyType({}))
+
+    def to_local(self, keyword, lang):
+        """Translate an English keyword, or return it as is if the language doesn't have it."""
+        translations = self._to_local.get(lang, {}).get(keyword)
+        return translations[0] if translations else keyword
+
+    def to_en(self, keyword, lang):
+        """Translate any of the local keywords back to English, or return it as is if it is not a keyword."""
+        return self._to_en.get(lang, {}).get(keyword, keyword)
+
+
+KEYWORD_INDEX = KeywordIndex.from_directory(f'{content_dir}/keywords')
+
+# The keywords of every keyword language, with the keyword we translate to
+KEYWORDS = {lang: MappingProxyType({k: v[0] for k, v in KEYWORD_INDEX.translations(lang).items()})
+            for lang in ALL_KEYWORD_LANGUAGES.keys()}
 
 
 class StructuredDataFile:
@@ -490,7 +530,7 @@ def deep_translate_keywords(yaml, keyword_language):
             return safe_format(yaml, **KEYWORDS.get(keyword_language))
         if isinstance(yaml, list):
             return [deep_translate_keywords(e, keyword_language) for e in yaml]
-        if isinstance(yaml, dict):
+        if isinstance(yaml, Mapping):
             return {k: deep_translate_keywords(v, keyword_language) for k, v in yaml.items()}
         return yaml
     except ValueError as E:
@@ -1,6 +1,8 @@
+import bisect
 import re
 import textwrap
 import exceptions
+from functools import cache
 from os import path
 from lark import Tree
 
@@ -24,6 +26,9 @@ class SourceRange:
     Tip: You can use a more advanced text editor like Notepad++ to get these values for a certain cursor position
     """
 
+    # a program has a range for every mapped fragment, in Hedy and in Python
+    __slots__ = ('from_line', 'from_column', 'to_line', 'to_column')
+
     def __init__(self, from_line, from_column, to_line, to_column):
         self.from_line = from_line
         self.from_column = from_column
@@ -36,15 +41,18 @@ class SourceRange:
     def __repr__(self):
         return self.__str__()
 
-    def __eq__(self, other):
+    def as_tuple(self):
+        return self.from_line, self.from_column, self.to_line, self.to_column
+
+    def contains(self, other):
         return (
-            self.from_line, self.from_column,
-            self.to_line, self.to_column
-        ) == (
-            other.from_line, other.from_column,
-            other.to_line, other.to_column
+            (self.from_line, self.from_column) <= (other.from_line, other.from_column) and
+            (other.to_line, other.to_column) <= (self.to_line, self.to_column)
         )
 
+    def __eq__(self, other):
+        return self.as_tuple() == other.as_tuple()
+
 
 class SourceCode:
     """
@@ -54,26 +62,21 @@ class SourceCode:
     a source_range (SourceRange) and the code (str)
     """
 
+    __slots__ = ('source_range', 'code', 'error', 'command_name', 'fragments')
+
     def __init__(self, source_range: SourceRange, code: str, error: Exception = None, command_name: str = None):
         self.source_range = source_range
         self.code = code
         self.error = error
         self.command_name = command_name
+        # for Python code: the (Hedy, Python) SourceCode pairs of the mapped fragments this code is made of
+        self.fragments = []
 
     def __hash__(self):
-        return hash((
-            self.source_range.from_line, self.source_range.from_column,
-            self.source_range.to_line, self.source_range.to_column
-        ))
+        return hash(self.source_range.as_tuple())
 
     def __eq__(self, other):
-        return (
-            self.source_range.from_line, self.source_range.from_column,
-            self.source_range.to_line, self.source_range.to_column
-        ) == (
-            other.source_range.from_line, other.source_range.from_column,
-            other.source_range.to_line, other.source_range.to_column
-        )
+        return self.source_range.as_tuple() == other.source_range.as_tuple()
 
     def __ne__(self, other):
         return not (self == other)
@@ -104,24 +107,27 @@ class SourceMap:
     the string representation of the sourcemap is defined as:
     [Start line]-[Start Character]/[End line]-[End Character] :
         [Code]
-    """
-
-    map = dict()
-    level = 0
 
-    skip_faulty = False
+    Every transpilation fills its own SourceMap, so that multiple programs can be
+    transpiled at the same time (e.g. from different threads).
+    """
 
     exceptions_not_to_skip = (
         exceptions.UnsupportedStringValue,
+        exceptions.InputTooComplexException,
     )
 
-    language = 'en'
-    hedy_code = ''
-    python_code = ''
-    grammar_rules = []
-
     def __init__(self):
-        self.get_grammar_rules()
+        self.map = dict()
+        self.level = 0
+        # if the mapping encounters an error and skip_faulty is True we will 'skip' the exception
+        self.skip_faulty = False
+        self.language = 'en'
+        self.hedy_code = ''
+        self.python_code = ''
+        self.grammar_rules = get_grammar_rules()
+        # the (Hedy, Python) SourceCode pairs that are not yet part of a bigger fragment
+        self.fragments = []
 
     def set_level(self, level):
         self.level = level
@@ -137,74 +143,83 @@ class SourceMap:
         self.hedy_code = hedy_code
 
     def set_python_output(self, python_code):
-        self.python_code = python_code
-        python_code_mapped = list()
-        hedy_lines = self.hedy_code.split('\n')
-        indent_size = find_program_indent_length(hedy_lines)
+        """Sets the Python ranges of the mapped fragments.
 
-        def line_col(context, idx):
-            return context.count('\n', 0, idx) + 1, idx - context.rfind('\n', 0, idx)
+        The transformers map a rule after the rules inside it, so add_source knows which fragments
+        every fragment is made of. Each fragment is looked for only in the code of the fragment it is
+        part of, after its preceding sibling.
 
-        for hedy_source_code, python_source_code in self.map.items():
+        The ranges are still found by searching the Python code for the code of each fragment, with
+        up to 10 indentations, and not recorded by the converters while they emit the code: they
+        build their code from the code of the rules inside it by formatting, indenting and inspecting
+        it. A fragment that appears more than once in its parent can get the range of the wrong one.
+        """
+        self.python_code = python_code
+        self.hedy_lines = self.hedy_code.split('\n')
+        self.indent_size = find_program_indent_length(self.hedy_lines)
+        self.line_starts = [0]
+        newline = python_code.find('\n')
+        while newline != -1:
+            self.line_starts.append(newline + 1)
+            newline = python_code.find('\n', newline + 1)
+
+        self._set_python_ranges(self.fragments, 0, len(python_code))
+
+    def _set_python_ranges(self, fragments, start, end):
+        cursor = start
+        for hedy_source_code, python_source_code in fragments:
             if hedy_source_code.error is not None or python_source_code.code == '':
                 continue
-            if self.level <= 7:
-                start_index = -1
-                number_of_indents = 0
-                while start_index == -1 and number_of_indents < 10:
-                    python_statement_code = textwrap.indent(python_source_code.code, '  '*number_of_indents)
-                    start_index = python_code.find(python_statement_code)
-                    code_char_length = len(python_source_code.code)
-
-                    for i in range(python_code_mapped.count(python_source_code.code)):
-                        start_index = python_code.find(python_statement_code, start_index+code_char_length)
-                        start_index = max(0, start_index)  # not found (-1) means that start_index = 0
-                    number_of_indents += 1
-            else:
-                number_of_indents = find_indent_length(
-                    hedy_lines[hedy_source_code.source_range.from_line - 1]) // indent_size
-
-                python_statement_code = textwrap.indent(python_source_code.code, '  '*number_of_indents)
-                start_index = python_code.find(python_statement_code)
-                code_char_length = len(python_source_code.code)
-
-                for i in range(python_code_mapped.count(python_source_code.code)):
-                    start_index = python_code.find(python_statement_code, start_index+code_char_length)
-                    start_index = max(0, start_index)  # not found (-1) means that start_index = 0
-
-            end_index = start_index + code_char_length
-            start_line, start_column = line_col(python_code, start_index)
-            end_line, end_column = line_col(python_code, end_index)
-
-            python_source_code.source_range = SourceRange(
-                start_line,
-                start_column,
-                end_line,
-                end_column
-            )
-
-            python_code_mapped.append(python_source_code.code)
 
-    def get_grammar_rules(self):
-        script_dir = path.abspath(path.dirname(__file__))
+            found = self._find_fragment(hedy_source_code, python_source_code.code, [(cursor, end), (start, end)])
+            if found is None:
+                self._set_python_ranges(python_source_code.fragments, start, end)
+                continue
+            start_index, statement_length = found
 
-        with open(path.join(script_dir, "grammars", "level1.lark"), "r", encoding="utf-8") as file:
-            grammar_text = file.read()
+            end_index = start_index + len(python_source_code.code)
+            python_source_code.source_range = SourceRange(*self._line_col(start_index), *self._line_col(end_index))
 
-        for i in range(2, 19):
-            with open(path.join(script_dir, "grammars", f'level{i}-Additions.lark'), "r", encoding="utf-8") as file:
-                grammar_text += '\n' + file.read()
+            cursor = start_index + statement_length
+            self._set_python_ranges(python_source_code.fragments, start_index, cursor)
 
-        self.grammar_rules = re.findall(r"([\w.]+):", grammar_text)
-        self.grammar_rules = [rule for rule in self.grammar_rules if 'text' not in rule]  # exclude text from mapping
-        self.grammar_rules = list(set(self.grammar_rules))  # remove duplicates
-        self.grammar_rules = [strip_priority_suffix(r) for r in self.grammar_rules]
+    def _find_fragment(self, hedy_source_code, code, scopes):
+        """Returns the index and length of the (indented) code in the first scope that contains it."""
+        if self.level <= 7:
+            indents = range(10)
+        else:
+            hedy_line = self.hedy_lines[hedy_source_code.source_range.from_line - 1]
+            expected_indent = find_indent_length(hedy_line) // self.indent_size
+            # fragments inside a line, such as expressions, are not indented, and fragments that
+            # start at the end of a line, such as else blocks, are indented like the next line
+            indents = [expected_indent] + [i for i in range(10) if i != expected_indent]
+
+        for scope_start, scope_end in scopes:
+            for number_of_indents in indents:
+                statement = textwrap.indent(code, '  ' * number_of_indents)
+                index = self.python_code.find(statement, scope_start, scope_end)
+                if index != -1:
+                    return index, len(statement)
+        return None
+
+    def _line_col(self, index):
+        line = bisect.bisect_right(self.line_starts, index)
+        return line, index - self.line_starts[line - 1] + 1
 
     def add_source(self, hedy_code: SourceCode, python_code: SourceCode):
+        # the fragments added before this one that lie within its Hedy range are part of it
+        start = len(self.fragments)
+        while start > 0 and hedy_code.source_range.contains(self.fragments[start - 1][0].source_range):
+            start -= 1
+        python_code.fragments = self.fragments[start:]
+        del self.fragments[start:]
+        self.fragments.append((hedy_code, python_code))
+
         self.map[hedy_code] = python_code
 
     def clear(self):
         self.map.clear()
+        self.fragments = []
         self.level = 0
         self.language = 'en'
         self.hedy_code = ''
@@ -235,6 +250,46 @@ class SourceMap:
             index += 1
         return response_map
 
+    def get_compact_result(self, errors_only=False):
+        """Returns the map in a compact form that is cheap to build and to send as JSON.
+
+        The result has the keys:
+        commands: the names of the commands in the map, every name once
+        mappings: a flat list of ints, 10 per mapping: the index of the mapping (as in get_result),
+            the index of its command in commands, the Hedy range and the Python range. Python
+            ranges that could not be found are 0/0-0/0.
+        errors: the errors of the mappings that have one, by the index of the mapping
+
+        If errors_only is True, only the mappings with an error are included, which is all
+        the client needs to underline the faulty code.
+        """
+        command_indexes = {}
+        mappings = []
+        errors = {}
+
+        for index, (hedy_source_code, python_source_code) in enumerate(self.map.items()):
+            error = hedy_source_code.error
+            if errors_only and error is None:
+                continue
+            if error is not None:
+                errors[index] = error
+
+            command_index = command_indexes.setdefault(hedy_source_code.command_name, len(command_indexes))
+            mappings.append(index)
+            mappings.append(command_index)
+            mappings.extend(hedy_source_code.source_range.as_tuple())
+            python_range = python_source_code.source_range
+            if python_range.from_line is None:
+                mappings.extend((0, 0, 0, 0))
+            else:
+                mappings.extend(python_range.as_tuple())
+
+        return {
+            'commands': list(command_indexes),
+            'mappings': mappings,
+            'errors': errors,
+        }
+
     def get_compressed_mapping(self):
         response_map = dict()
 
@@ -265,82 +320,97 @@ class SourceMap:
         return str()
 
 
-def source_map_rule(source_map: SourceMap):
+@cache
+def get_grammar_rules():
+    script_dir = path.abspath(path.dirname(__file__))
+
+    with open(path.join(script_dir, "grammars", "level1.lark"), "r", encoding="utf-8") as file:
+        grammar_text = file.read()
+
+    for i in range(2, 19):
+        with open(path.join(script_dir, "grammars", f'level{i}-Additions.lark'), "r", encoding="utf-8") as file:
+            grammar_text += '\n' + file.read()
+
+    grammar_rules = re.findall(r"([\w.]+):", grammar_text)
+    grammar_rules = [rule for rule in grammar_rules if 'text' not in rule]  # exclude text from mapping
+    grammar_rules = list(set(grammar_rules))  # remove duplicates
+    grammar_rules = [strip_priority_suffix(r) for r in grammar_rules]
+    return grammar_rules
+
+
+def source_map_rule(function):
     """ A decorator function that should decorator the transformer method (grammar rule)
         the decorator adds the hedy code & python code to the map when the transformer method (grammar rule) is used
+
+        The map is taken from the `source_map` attribute of the transformer instance.
     """
 
-    def decorator(function):
-        def wrapper(*args, **kwargs):
-            meta = args[1]
+    def wrapper(*args, **kwargs):
+        source_map = args[0].source_map
+        meta = args[1]
 
-            hedy_code_input = source_map.hedy_code[meta.start_pos:meta.end_pos]
-            hedy_code_input = hedy_code_input.replace('#ENDBLOCK', '')  # ENDBLOCK is not part of the Hedy code, remove
-            error = None
+        hedy_code_input = source_map.hedy_code[meta.start_pos:meta.end_pos]
+        hedy_code_input = hedy_code_input.replace('#ENDBLOCK', '')  # ENDBLOCK is not part of the Hedy code, remove
+        error = None
 
-            if not source_map.skip_faulty:
+        if not source_map.skip_faulty:
+            generated_python = function(*args, **kwargs)
+        else:
+            try:
                 generated_python = function(*args, **kwargs)
-            else:
-                try:
-                    generated_python = function(*args, **kwargs)
-
-                    # When parsing with skip_faulty enabled it could happen that because sanitization is not done
-                    # a tree is returned instead of a string containing valid Python code by a transformer method.
-                    # If this happens we have to raise an exception, we cannot map a Lark tree
-
-                    if (
-                        # if a Lark tree is returned
-                        isinstance(generated_python, Tree) or
-                        # if a Lark tree is returned as a string, we check with regex
-                        bool(re.match(r".*Tree\(.*Token\(.*\).*\).*", generated_python))
-                    ):
-                        raise Exception('Can not map a Lark tree, only strings')
-
-                except Exception as e:
-                    # If an exception is found, we set the Python code to pass (null operator)
-                    # we also map the error
-                    generated_python = 'pass'
-                    error = e
-
-            hedy_code = SourceCode(
-                SourceRange(
-                    meta.container_line, meta.container_column,
-                    meta.container_end_line, meta.container_end_column
-                ),
-                hedy_code_input,
-                error=error,
-                command_name=function.__name__
-            )
-
-            python_code = SourceCode(
-                # We don't know now, set_python_output will set the ranges later
-                SourceRange(None, None, None, None),
-                generated_python
-            )
-
-            source_map.add_source(hedy_code, python_code)
-            return generated_python
-
-        return wrapper
-
-    return decorator
-
-
-def source_map_transformer(source_map: SourceMap):
+
+                # When parsing with skip_faulty enabled it could happen that because sanitization is not done
+                # a tree is returned instead of a string containing valid Python code by a transformer method.
+                # If this happens we have to raise an exception, we cannot map a Lark tree
+
+                if (
+                    # if a Lark tree is returned
+                    isinstance(generated_python, Tree) or
+                    # if a Lark tree is returned as a string
+                    ('Tree(' in generated_python and 'Token(' in generated_python)
+                ):
+                    raise Exception('Can not map a Lark tree, only strings')
+
+            except Exception as e:
+                # If an exception is found, we set the Python code to pass (null operator)
+                # we also map the error
+                generated_python = 'pass'
+                error = e
+
+        hedy_code = SourceCode(
+            SourceRange(
+                meta.container_line, meta.container_column,
+                meta.container_end_line, meta.container_end_column
+            ),
+            hedy_code_input,
+            error=error,
+            command_name=function.__name__
+        )
+
+        python_code = SourceCode(
+            # We don't know now, set_python_output will set the ranges later
+            SourceRange(None, None, None, None),
+            generated_python
+        )
+
+        source_map.add_source(hedy_code, python_code)
+        return generated_python
+
+    return wrapper
+
+
+def source_map_transformer(cls):
     """ A decorator function that should decorate a transformer class
 
         This is used for convenience, instead of adding source_map_rule to all methods,
         source_map_transformer needs only to be added to the transformer class.
         This decorator add source_map_rule to all appropriate methods.
     """
-
-    def decorate(cls):
-        for rule in cls.__dict__:
-            if rule in source_map.grammar_rules:
-                setattr(cls, rule, source_map_rule(source_map)(getattr(cls, rule)))
-        return cls
-
-    return decorate
+    grammar_rules = get_grammar_rules()
+    for rule in list(cls.__dict__):
+        if rule in grammar_rules:
+            setattr(cls, rule, source_map_rule(getattr(cls, rule)))
+    return cls
 
 
 def find_indent_length(line):
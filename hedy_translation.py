@@ -2,11 +2,8 @@ from collections import namedtuple
 from lark import Token, Visitor
 from lark.exceptions import VisitError
 import hedy
-import operator
-from os import path
+import re
 import hedy_content
-from website.yaml_file import YamlFile
-import copy
 
 # Holds the token that needs to be translated, its line number, start and
 # end indexes and its value (e.g. ", ").
@@ -15,55 +12,34 @@ Rule = namedtuple("Rule", "keyword line start end value")
 
 def keywords_to_dict(lang="nl"):
     """ "Return a dictionary of keywords from language of choice. Key is english value is lang of choice"""
-    base = path.abspath(path.dirname(__file__))
+    return {k: list(v) for k, v in keyword_translations(lang).items()}
 
-    keywords_path = "content/keywords/"
-    yaml_filesname_with_path = path.join(base, keywords_path, lang + ".yaml")
 
-    # as we mutate this dict, we have to make a copy
-    # as YamlFile re-uses the yaml contents
-    command_combinations = copy.deepcopy(
-        YamlFile.for_file(yaml_filesname_with_path).to_dict()
-    )
-    for k, v in command_combinations.items():
-        command_combinations[k] = v.split("|")
-
-    return command_combinations
+def keyword_translations(lang):
+    """Return an immutable mapping from every English keyword to a tuple of its translations in
+    the language of choice, the first being the one we translate to."""
+    return hedy_content.KEYWORD_INDEX.translations(lang)
 
 
 def keywords_to_dict_single_choice(lang):
-    command_combinations = keywords_to_dict(lang)
-    return {k: v[0] for (k, v) in command_combinations.items()}
+    return {k: v[0] for (k, v) in keyword_translations(lang).items()}
 
 
 def all_keywords_to_dict():
     """Return a dictionary where each value is a list of the translations of that keyword (key). Used for testing"""
-    keyword_dict = {}
-    for lang in hedy_content.ALL_KEYWORD_LANGUAGES:
-        commands = keywords_to_dict_single_choice(lang)
-        keyword_dict[lang] = commands
-
-    all_translations = {k: [v.get(k, k) for v in keyword_dict.values()] for k in keyword_dict["en"]}
-    return all_translations
+    index = hedy_content.KEYWORD_INDEX
+    return {k: [index.to_local(k, lang) for lang in hedy_content.ALL_KEYWORD_LANGUAGES]
+            for k in index.translations("en")}
 
 
 def translate_keyword_from_en(keyword, lang="en"):
     # translated the keyword to a local lang
-    local_keywords = keywords_to_dict(lang)
-    if keyword in local_keywords.keys():
-        local_keyword = local_keywords[keyword][0]
-    else:
-        local_keyword = keyword
-    return local_keyword
+    return hedy_content.KEYWORD_INDEX.to_local(keyword, lang)
 
 
 def translate_keyword_to_en(keyword, lang):
     # translated the keyword to from a local lang
-    original_keywords = keywords_to_dict(lang)
-    for k, v in original_keywords.items():
-        if keyword in v:
-            return k
-    return keyword
+    return hedy_content.KEYWORD_INDEX.to_en(keyword, lang)
 
 
 def get_target_keyword(keyword_dict, keyword):
@@ -87,31 +63,29 @@ def translate_keywords(input_string, from_lang="en", to_lang="nl", level=1):
     try:
         processed_input = hedy.process_input_string(input_string, level, from_lang, preprocess_ifs_enabled=False)
 
-        hedy.source_map.clear()
-        hedy.source_map.set_skip_faulty(False)
-
-        parser = hedy.get_parser(level, from_lang, True, hedy.source_map.skip_faulty)
-        keyword_dict_from = keywords_to_dict(from_lang)
-        keyword_dict_to = keywords_to_dict(to_lang)
+        parser = hedy.get_parser(level, from_lang, True, False)
+        keyword_dict_from = keyword_translations(from_lang)
+        keyword_dict_to = keyword_translations(to_lang)
 
         program_root = parser.parse(processed_input + "\n").children[0]
 
         translator = Translator(processed_input)
         translator.visit(program_root)
-        ordered_rules = reversed(sorted(translator.rules, key=operator.attrgetter("line", "start")))
 
         # checks whether any error production nodes are present in the parse tree
         # hedy.is_program_valid(program_root, input_string, level, from_lang)
 
-        result = processed_input
-        for rule in ordered_rules:
+        replacements = []
+        for rule in translator.rules:
             if rule.keyword in keyword_dict_from and rule.keyword in keyword_dict_to:
-                lines = result.splitlines()
-                line = lines[rule.line - 1]
-                original = get_original_keyword(keyword_dict_from, rule.keyword, line)
+                original = get_original_keyword(keyword_dict_from, rule.keyword, rule.value)
                 target = get_target_keyword(keyword_dict_to, rule.keyword)
-                replaced_line = replace_token_in_line(line, rule, original, target)
-                result = replace_line(lines, rule.line - 1, replaced_line)
+                # Note that we need to replace the target value in the original value because some
+                # grammar rules have ambiguous length and value, e.g. _COMMA: _SPACES*
+                # (latin_comma | arabic_comma) _SPACES*
+                replacements.append((rule, rule.value.replace(original, target)))
+
+        result = replace_tokens(processed_input, replacements)
 
         # For now the needed post processing is only removing the 'end-block's added during pre-processing
         result = "\n".join([line for line in result.splitlines()])
@@ -134,30 +108,31 @@ def translate_keywords(input_string, from_lang="en", to_lang="nl", level=1):
         raise E
 
 
-def replace_line(lines, index, line):
-    before = "\n".join(lines[0:index])
-    after = "\n".join(lines[index + 1:])
-    if len(before) > 0:
-        before = before + "\n"
-    if len(after) > 0:
-        after = "\n" + after
-    return "".join([before, line, after])
+def replace_tokens(input_string, replacements):
+    """Return the input string with the tokens of the rules replaced by their new values.
 
+    `replacements` is a list of (rule, value) pairs. The positions of the rules are converted to
+    offsets in the input string with a table of line offsets, so that all tokens are replaced in
+    a single pass over the input string. If rules overlap, only the first one is applied."""
+    line_offsets = [0] + [match.end() for match in re.finditer("\n", input_string)]
 
-def replace_token_in_line(line, rule, original, target):
-    """Replaces a token in a line from the user input with its translated equivalent"""
-    before = "" if rule.start == 0 else line[0: rule.start]
-    after = "" if rule.end == len(line) - 1 else line[rule.end + 1:]
-    # Note that we need to replace the target value in the original value because some
-    # grammar rules have ambiguous length and value, e.g. _COMMA: _SPACES*
-    # (latin_comma | arabic_comma) _SPACES*
-    return before + rule.value.replace(original, target) + after
+    parts = []
+    position = 0
+    for rule, value in sorted(replacements, key=lambda r: (r[0].line, r[0].start)):
+        start = line_offsets[rule.line - 1] + rule.start
+        if start < position:
+            continue
+        parts.append(input_string[position:start])
+        parts.append(value)
+        position = line_offsets[rule.line - 1] + rule.end + 1
+    parts.append(input_string[position:])
+    return "".join(parts)
 
 
 def find_command_keywords(
-    input_string, lang, level, keywords, start_line, end_line, start_column, end_column
+    input_string, lang, level, keywords, start_line, end_line, start_column, end_column, skip_faulty=False
 ):
-    parser = hedy.get_parser(level, lang, True, hedy.source_map.skip_faulty)
+    parser = hedy.get_parser(level, lang, True, skip_faulty)
     program_root = parser.parse(input_string).children[0]
 
     translator = Translator(input_string)
@@ -179,9 +154,9 @@ def find_keyword_in_rules(rules, keyword, start_line, end_line, start_column, en
     return None
 
 
-def get_original_keyword(keyword_dict, keyword, line):
+def get_original_keyword(keyword_dict, keyword, value):
     for word in keyword_dict[keyword]:
-        if word in line:
+        if word in value:
             return word
 
     # If we can't find the keyword, it means that it isn't part of the valid keywords for this language
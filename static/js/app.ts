@@ -559,6 +559,8 @@ export async function runit(level: number, lang: string, disabled_prompt: string
           lang: lang,
           skip_faulty: false,
           is_debug: run_type === 'debug',
+          // the debugger needs the whole source map, otherwise we only get the mappings with errors
+          source_map: run_type === 'debug',
           tutorial: $('#code_output').hasClass("z-40"), // if so -> tutorial mode
           read_aloud : !!$('#speak_dropdown').val(),
           adventure_name: adventureName,
@@ -571,6 +573,9 @@ export async function runit(level: number, lang: string, disabled_prompt: string
         let response = await postJsonWithAchievements('/parse', data);
 
         program_data = response;
+        if (response.source_map) {
+          program_data.source_map = decodeSourceMap(response.source_map);
+        }
         console.log('Response', response);
 
         if (response.Warning && $('#editor').is(":visible")) {
@@ -863,6 +868,38 @@ window.onerror = function reportClientException(message, source, line_number, co
   });
 }
 
+/**
+ * The compact source map sent by /parse
+ *
+ * `mappings` has 10 numbers per mapping: the index of the mapping, the index of
+ * its command in `commands`, the Hedy range and the Python range (from line,
+ * from column, to line, to column).
+ */
+interface CompactSourceMap {
+  readonly commands: string[];
+  readonly mappings: number[];
+  readonly errors: Record<string, string>;
+}
+
+/**
+ * Turns the compact source map into mappings by their index, which is what
+ * the editors and the debugger use.
+ */
+function decodeSourceMap(sourceMap: CompactSourceMap) {
+  const result: { [x: string]: any; } = {};
+  const m = sourceMap.mappings;
+  for (let i = 0; i < m.length; i += 10) {
+    const index = m[i];
+    result[index] = {
+      hedy_range: { from_line: m[i + 2], from_column: m[i + 3], to_line: m[i + 4], to_column: m[i + 5] },
+      python_range: { from_line: m[i + 6], from_column: m[i + 7], to_line: m[i + 8], to_column: m[i + 9] },
+      error: sourceMap.errors[index] ?? null,
+      command: sourceMap.commands[m[i + 1]],
+    };
+  }
+  return result;
+}
+
 export function runPythonProgram(this: any, code: string, sourceMap: any, hasTurtle: boolean, hasPygame: boolean, hasSleep: boolean, hasClear: boolean, hasMusic: boolean, hasWarnings: boolean, cb: () => void, run_type: "run" | "debug" | "continue") {
   // If we are in the Parsons problem -> use a different output
   let outputDiv = $('#output');
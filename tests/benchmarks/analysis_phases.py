@@ -0,0 +1,106 @@
+"""Time the phases of create_AST and transpile_inner on the public programs.
+
+Runs the analyses of the parse tree one after the other, like create_AST used to,
+and fused in one pass (see hedy.AnalyzeProgram), and prints the time spent in every
+phase and the number of Trees that were created.
+
+Parsing takes most of the time, so only every `step`th program is used. Run from the
+root of the repository:
+
+    python -m tests.benchmarks.analysis_phases [step]
+"""
+import collections
+import json
+import sys
+import time
+from unittest import mock
+
+from lark import Tree
+from lark.exceptions import VisitError
+
+import exceptions
+import hedy
+
+PUBLIC_PROGRAMS = 'tests/test_public_programs/filtered-programs-2023-12-12.json'
+
+
+class Phases:
+    def __init__(self):
+        self.timings = collections.Counter()
+        self.trees = collections.Counter()
+
+    def run(self, phase, function, *args):
+        created = 0
+        tree_init = Tree.__init__
+
+        def counting_init(tree, *init_args, **kwargs):
+            nonlocal created
+            created += 1
+            tree_init(tree, *init_args, **kwargs)
+
+        with mock.patch.object(Tree, '__init__', counting_init):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.timings[phase] += time.perf_counter() - start
+                self.trees[phase] += created
+
+
+def analyze_sequentially(phases, root, code, level, lang):
+    phases.run('IsValid', hedy.is_program_valid, root, code, level, lang)
+    ast = phases.run('ExtractAST', hedy.ExtractAST().transform, root)
+    phases.run('IsComplete', hedy.is_program_complete, ast, level)
+    phases.run('valid_echo', hedy.valid_echo, ast)
+    collector = hedy.LookupEntryCollector(level)
+    phases.run('LookupEntryCollector', collector.visit_topdown, ast)
+    phases.run('TypeValidator', hedy.TypeValidator(collector.lookup, level, lang, code).transform, ast)
+    phases.run('AllCommands', hedy.AllCommands(level).transform, root)
+    return ast, collector.lookup
+
+
+def analyze_fused(phases, root, code, level, lang):
+    validator = hedy.create_validator(code, level, lang, hedy.TranspileContext(level, lang))
+    analysis = phases.run('AnalyzeProgram', hedy.AnalyzeProgram(validator, level).analyze, root)
+    for error in ['extract', 'complete']:
+        analysis.raise_error(error)
+    phases.run('IsComplete', hedy.is_program_complete, analysis.ast, level, analysis.completeness_result)
+    phases.run('valid_echo', hedy.valid_echo, analysis.ast)
+    analysis.raise_error('lookup')
+    phases.run('TypeValidator', hedy.TypeValidator(analysis.lookup, level, lang, code).transform, analysis.ast)
+    analysis.raise_error('commands')
+    return analysis.ast, analysis.lookup
+
+
+def main():
+    step = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    with open(PUBLIC_PROGRAMS, 'r') as f:
+        programs = json.load(f)[::step]
+
+    sequential, fused = Phases(), Phases()
+    count = 0
+    for p in programs:
+        level, lang = int(p['level']), p['language']
+        try:
+            code = hedy.process_input_string(p['code'], level, lang)
+            for phases, analyze in [(sequential, analyze_sequentially), (fused, analyze_fused)]:
+                # The fused analysis reuses the nodes of the parse tree, so both need their own
+                root = phases.run('parse', hedy.parse_input, code, level, lang)
+                ast, lookup = analyze(phases, root, code, level, lang)
+                converter = hedy.TRANSPILER_LOOKUP[level](lookup, lang, 'Latin', False, hedy.SourceMap())
+                phases.run('convert', converter.transform, ast)
+            count += 1
+        except (exceptions.HedyException, VisitError):
+            pass
+
+    print(f'{count} programs')
+    for name, phases in [('sequential', sequential), ('fused', fused)]:
+        print(f'\n{name}')
+        for phase, seconds in phases.timings.items():
+            print(f'{phase:>22} {seconds * 1000:>10.1f} ms {phases.trees[phase]:>10} trees')
+        analysis = sum(s for phase, s in phases.timings.items() if phase not in ['parse', 'convert'])
+        print(f"{'analysis total':>22} {analysis * 1000:>10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Compare the speed of the LALR and the Earley parser backends, per level.
+
+Parses the public programs of every level with the backend parse_input picks
+(see hedy.get_parser_backend) and with Earley only, and prints the speedup.
+
+Run from the root of the repository:
+
+    python -m tests.benchmarks.parser_backends
+"""
+import json
+import statistics
+import time
+from unittest import mock
+
+import exceptions
+import hedy
+
+PUBLIC_PROGRAMS = 'tests/test_public_programs/filtered-programs-2023-12-12.json'
+
+
+def load_programs():
+    with open(PUBLIC_PROGRAMS, 'r') as f:
+        programs = json.load(f)
+
+    by_level = {}
+    for p in programs:
+        level = int(p['level'])
+        try:
+            code = hedy.process_input_string(p['code'], level, p['language'])
+        except exceptions.HedyException:
+            continue
+        by_level.setdefault(level, []).append((code, p['language']))
+    return by_level
+
+
+def time_parse(programs, level, lalr_enabled):
+    timings = []
+    with mock.patch('hedy.lalr_parsers_enabled', lalr_enabled):
+        for code, lang in programs:
+            # Warm up the parser, we only want to measure parsing
+            hedy.get_parser(level, lang, backend=hedy.get_parser_backend(level))
+            hedy.get_parser(level, lang)
+
+            start = time.perf_counter()
+            try:
+                hedy.parse_input(code, level, lang)
+            except exceptions.HedyException:
+                pass
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def count_lalr_parses(programs, level):
+    if hedy.get_parser_backend(level) != 'lalr':
+        return 0
+    count = 0
+    for code, lang in programs:
+        parser = hedy.get_parser(level, lang, backend='lalr')
+        try:
+            parser.parse(code + '\n')
+            count += 1
+        except Exception:
+            pass
+    return count
+
+
+def main():
+    by_level = load_programs()
+    print(f"{'level':>5} {'backend':>8} {'programs':>8} {'lalr':>6} "
+          f"{'earley ms':>10} {'selected ms':>11} {'speedup':>8}")
+    for level in sorted(by_level):
+        programs = by_level[level]
+        earley = time_parse(programs, level, lalr_enabled=False)
+        selected = time_parse(programs, level, lalr_enabled=True)
+        lalr_count = count_lalr_parses(programs, level)
+        print(f"{level:>5} {hedy.get_parser_backend(level):>8} {len(programs):>8} {lalr_count:>6} "
+              f"{statistics.mean(earley) * 1000:>10.2f} {statistics.mean(selected) * 1000:>11.2f} "
+              f"{sum(earley) / sum(selected):>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
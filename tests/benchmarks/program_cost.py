@@ -0,0 +1,184 @@
+"""Calibrate the cost model that hedy uses to reject programs that are too complex to transpile.
+
+Every distinct program in tests/test_public_programs/filtered-programs-*.json is measured with
+hedy.measure_program_complexity and transpiled, with all parsers loaded beforehand. The public
+programs are small, so for every level dense programs of MAX_LINES lines are generated as well,
+with long lines of the commands that take the most time per token.
+
+For every level the milliseconds per line and per token are fitted with least squares, and
+compared with the ones in hedy.PROGRAM_COST_MS_PER_LINE and hedy.PROGRAM_COST_MS_PER_TOKEN. Both
+are at least hedy.PROGRAM_COST_MIN_MS_PER_LINE and hedy.PROGRAM_COST_MIN_MS_PER_TOKEN. The
+least squares fit follows the large programs, so the time every program takes regardless of its
+size, hedy.PROGRAM_COST_BASE_MS, is the 95th percentile of the time of the programs of at most
+SMALL_PROGRAM_LINES lines. The ratio of the actual to the estimated time (which includes
+hedy.PROGRAM_COST_SAFETY_FACTOR) shows how well the current model fits: the estimate should be
+above the actual time for almost every program, without being far above it for the large programs.
+
+Deeply nested blocks and lines with an unbalanced quote take more time than their lines and tokens
+tell. Programs of both are generated for every level that has them, and the time they take on top
+of the fitted time of their lines and tokens gives hedy.PROGRAM_COST_MS_PER_NESTING_SQUARED and
+hedy.PROGRAM_COST_MS_PER_UNBALANCED_LINE, fitted over all levels.
+
+The timings depend on the machine, so calibrate on the machines the web servers run on.
+
+Run from the root of the repository:
+
+    python -m tests.benchmarks.program_cost [--step 10]
+"""
+import argparse
+import time
+from unittest import mock
+
+import hedy
+from tests.benchmarks.transpile_corpus import load_programs, percentile
+
+VARIABLES = 'abcde'
+SMALL_PROGRAM_LINES = 5
+
+
+def dense_lines(level, number, length):
+    """Lines of `length` words or values that are valid at the level, by the name of their command."""
+    values = [VARIABLES[i % len(VARIABLES)] for i in range(length)]
+    assign = 'is' if level < 12 else '='
+    lines = {}
+    if level <= 3:
+        lines['print'] = 'print ' + ' '.join(f'w{i}' for i in range(length))
+    if 2 <= level <= 3:
+        lines['list'] = f'l{number} is ' + ', '.join(str(i) for i in range(length))
+    if 4 <= level <= 17:
+        lines['print'] = 'print ' + ' '.join(f"'t{i}' {values[i]}" for i in range(length // 2))
+    if level == 18:
+        lines['print'] = 'print(' + ', '.join(f"'t{i}', {values[i]}" for i in range(length // 2)) + ')'
+    if level >= 6:
+        lines['calculation'] = f'v{number} {assign} ' + ' + '.join(f'{values[i]} * {i}' for i in range(length // 4 + 1))
+    if level >= 16:
+        lines['list'] = f'l{number} = [' + ', '.join(str(i) for i in range(length)) + ']'
+    return lines
+
+
+def dense_programs(level):
+    """Programs of MAX_LINES lines of every command of dense_lines, with short and long lines."""
+    assign = 'is' if level < 12 else '='
+    definitions = [f'{v} {assign} {i}' for i, v in enumerate(VARIABLES, 1)] if level >= 2 else []
+    count = hedy.MAX_LINES - len(definitions)
+    programs = []
+    for length in (10, 20, 40):
+        for command in dense_lines(level, 0, length):
+            lines = [dense_lines(level, number, length)[command] for number in range(count)]
+            programs.append(('\n'.join(definitions + lines), level, 'en'))
+    return programs
+
+
+def nested_programs(level):
+    """Programs of blocks nested ever deeper, at the levels where a repeat can have a block inside."""
+    if level < 9:
+        return []
+    programs = []
+    for depth in (10, 20, 40):
+        lines = ['    ' * i + 'repeat 2 times' for i in range(depth)] + ['    ' * depth + "print 'a'"]
+        programs.append(('\n'.join(lines), level, 'en'))
+    return programs
+
+
+def unbalanced_programs(level):
+    """Programs of which every line has an unbalanced quote, from the first level with quotes."""
+    if level < 4:
+        return []
+    return [('\n'.join(f"print 'a{number}" + ' b' * 20 for number in range(count)), level, 'en')
+            for count in (20, 50, hedy.MAX_LINES)]
+
+
+def measure(programs):
+    """Return the (complexity, milliseconds) of every program, per level."""
+    measurements = {}
+    for level, lang in sorted({(level, lang) for _, level, lang in programs}):
+        hedy.get_parser(level, lang)
+        hedy.get_parser(level, lang, backend=hedy.get_parser_backend(level))
+
+    for code, level, lang in programs:
+        if code.count('\n') > hedy.MAX_LINES:
+            continue
+        complexity = hedy.measure_program_complexity(code, level)
+        start = time.perf_counter()
+        try:
+            hedy.transpile(code, level, lang, skip_faulty=False, unused_allowed=True)
+        except Exception:
+            # Faulty programs take time as well
+            pass
+        measurements.setdefault(level, []).append((complexity, (time.perf_counter() - start) * 1000))
+    return measurements
+
+
+def fit(measurements):
+    """The milliseconds per line and per token that fit the (lines, tokens, milliseconds) best, in the least
+    squares sense."""
+    ll = sum(lines * lines for lines, _, _ in measurements)
+    lt = sum(lines * tokens for lines, tokens, _ in measurements)
+    tt = sum(tokens * tokens for _, tokens, _ in measurements)
+    lm = sum(lines * ms for lines, _, ms in measurements)
+    tm = sum(tokens * ms for _, tokens, ms in measurements)
+    determinant = ll * tt - lt * lt
+    per_line = (lm * tt - tm * lt) / determinant if determinant else 0
+    per_token = (tm * ll - lm * lt) / determinant if determinant else 0
+    # Neither can be negative, fit the other one alone in that case
+    if per_line < 0:
+        per_line, per_token = 0, tm / max(1, tt)
+    elif per_token < 0:
+        per_line, per_token = lm / max(1, ll), 0
+    return max(hedy.PROGRAM_COST_MIN_MS_PER_LINE, per_line), max(hedy.PROGRAM_COST_MIN_MS_PER_TOKEN, per_token)
+
+
+def fit_extra(values):
+    """The milliseconds per unit of a feature that fit the (feature, extra milliseconds) best, in the least
+    squares sense."""
+    return max(0, sum(x * ms for x, ms in values) / max(1, sum(x * x for x, _ in values)))
+
+
+# All programs are transpiled, also the ones the current model would reject
+@mock.patch('hedy.MAX_PROGRAM_COST_MS', float('inf'))
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--step', type=int, default=10, help='only use every STEP-th public program')
+    args = parser.parse_args()
+
+    programs = load_programs(args.step)
+    special = []
+    for level in range(1, hedy.HEDY_MAX_LEVEL + 1):
+        programs.extend(dense_programs(level))
+        special.extend(nested_programs(level) + unbalanced_programs(level))
+    measurements = measure(programs)
+    special_measurements = measure(special)
+
+    print(f"{'level':>5} {'programs':>8} {'max tokens':>10} {'max ms':>8} {'per line':>8} {'per token':>9} "
+          f"{'p95 actual/estimate':>19} {'max':>5} {'min large':>9}")
+    per_line, per_token = {}, {}
+    for level, values in sorted(measurements.items()):
+        fitted = fit([(c.lines, c.tokens, ms) for c, ms in values])
+        per_line[level], per_token[level] = round(fitted[0], 2), round(fitted[1], 2)
+        ratios = sorted(ms / hedy.estimate_program_cost(c, level) for c, ms in values)
+        # The ratio of the programs of MAX_LINES lines tells how much the estimate overshoots them
+        large = [ms / hedy.estimate_program_cost(c, level) for c, ms in values if c.lines >= hedy.MAX_LINES]
+        print(f"{level:>5} {len(values):>8} {max(c.tokens for c, _ in values):>10} "
+              f"{max(ms for _, ms in values):>8.1f} {per_line[level]:>8.2f} {per_token[level]:>9.2f} "
+              f"{percentile(ratios, 95):>19.2f} {ratios[-1]:>5.2f} {min(large, default=0):>9.2f}")
+
+    # The time of the special programs on top of the fitted time of their lines and tokens
+    nesting, unbalanced = [], []
+    for level, values in special_measurements.items():
+        for c, ms in values:
+            extra = ms - (c.lines * per_line.get(level, 0) + c.tokens * per_token.get(level, 0))
+            if c.unbalanced_quotes:
+                unbalanced.append((c.unbalanced_quotes, extra))
+            else:
+                nesting.append((c.nesting_depth ** 2, extra))
+
+    small = sorted(ms for values in measurements.values() for c, ms in values if c.lines <= SMALL_PROGRAM_LINES)
+    print(f'\nFitted PROGRAM_COST_BASE_MS = {round(percentile(small, 95))}')
+    print(f'Fitted PROGRAM_COST_MS_PER_LINE = {per_line}')
+    print(f'Fitted PROGRAM_COST_MS_PER_TOKEN = {per_token}')
+    print(f'Fitted PROGRAM_COST_MS_PER_NESTING_SQUARED = {round(fit_extra(nesting), 2)}')
+    print(f'Fitted PROGRAM_COST_MS_PER_UNBALANCED_LINE = {round(fit_extra(unbalanced), 1)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Time SourceMap.set_python_output on programs of growing length.
+
+The Python ranges of the source map should take time linear in the length of the
+program, so the time per line should stay about the same as the programs grow.
+
+Run from the root of the repository:
+
+    python -m tests.benchmarks.source_maps
+"""
+import time
+from unittest import mock
+
+import hedy
+
+# Blocks of Hedy code that are repeated to make long programs. The variables are defined in the first
+# block, because variables that are first defined after line 100 are not recognised in all places.
+BLOCKS = {
+    4: "naam is ask 'hoe heet je?'\nprint 'hallo ' naam\nprint 'tot ziens'",
+    8: "antwoord is ask 'hoeveel?'\nrepeat 3 times\n    print 'hallo ' antwoord\n    print 'tot ziens'",
+    12: "prijs = 12\nif prijs is 12\n    print 'duur ' prijs\nelse\n    print 'goedkoop'",
+    16: "lijst = [1, 2, 3]\nfor x in lijst\n    print 'nummer ' x\nprint lijst[1]",
+}
+LINES = [50, 100, 200, 400, 800]
+REPEATS = 3
+
+
+def make_program(level, lines):
+    block = BLOCKS[level]
+    blocks = lines // (block.count('\n') + 1)
+    return '\n'.join([block] * blocks)
+
+
+def time_source_map(code, level):
+    result = hedy.transpile(code, level, 'en', skip_faulty=False, unused_allowed=True)
+    source_map = result.source_map
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        source_map.set_python_output(source_map.python_code)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(source_map.map)
+
+
+# Programs are longer than the editor allows
+@mock.patch('hedy.MAX_LINES', max(LINES))
+def main():
+    print(f"{'level':>5} {'lines':>6} {'ranges':>7} {'ms':>9} {'ms/line':>8}")
+    for level in BLOCKS:
+        for lines in LINES:
+            code = make_program(level, lines)
+            seconds, ranges = time_source_map(code, level)
+            actual_lines = code.count('\n') + 1
+            print(f"{level:>5} {actual_lines:>6} {ranges:>7} {seconds * 1000:>9.2f} "
+                  f"{seconds * 1000 / actual_lines:>8.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Replay the public programs through hedy.transpile and report latency, throughput and memory.
+
+Every distinct program in tests/test_public_programs/filtered-programs-*.json is
+transpiled in two modes, each in a fresh process:
+
+- warm: the parsers of all levels and languages are loaded before the programs are timed
+- cold: the parsers and parse trees kept in memory are dropped before every program, so
+  every program pays for loading its parser, like the first program of a new worker
+
+For every mode the latency percentiles are reported per level, per language and for
+all programs, together with the throughput and the peak RSS of the process.
+
+The results can be saved as a JSON baseline, and compared with an earlier baseline:
+the run fails if the p50 or p95 of a group got slower by more than the threshold.
+Timings depend on the machine, so only compare with baselines from the same machine.
+
+Run from the root of the repository (or with `doit benchmark`):
+
+    python -m tests.benchmarks.transpile_corpus [--step 10] [--save FILE] [--baseline FILE]
+"""
+import argparse
+import glob
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import hedy
+
+PUBLIC_PROGRAMS = 'tests/test_public_programs/filtered-programs-*.json'
+MODES = ['warm', 'cold']
+PERCENTILES = [50, 95, 99]
+# Groups with fewer programs are reported, but too noisy to compare with a baseline
+MIN_PROGRAMS_TO_COMPARE = 20
+
+
+def load_programs(step):
+    """Return every `step`th distinct (code, level, language) of the public programs."""
+    programs = {}
+    for file_name in sorted(glob.glob(PUBLIC_PROGRAMS)):
+        with open(file_name, 'r', encoding='utf-8') as f:
+            for p in json.load(f):
+                programs.setdefault((p['code'], int(p['level']), p['language']), None)
+    return sorted(programs)[::step]
+
+
+def transpile(code, level, lang):
+    start = time.perf_counter()
+    try:
+        hedy.transpile(code, level, lang, skip_faulty=False, unused_allowed=True)
+    except Exception:
+        # Faulty programs are part of the load as well
+        pass
+    return time.perf_counter() - start
+
+
+def run(programs, mode):
+    """Transpile the programs in this process, and return the timings in seconds."""
+    if mode == 'warm':
+        for level, lang in sorted({(level, lang) for _, level, lang in programs}):
+            hedy.get_parser(level, lang)
+            hedy.get_parser(level, lang, backend=hedy.get_parser_backend(level))
+
+    timings = []
+    for code, level, lang in programs:
+        if mode == 'cold':
+            hedy.PARSER_CACHE.clear()
+            hedy.FRAGMENT_CACHE.clear()
+        timings.append(transpile(code, level, lang))
+    return timings
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    summary = {'programs': len(timings), 'mean_ms': statistics.mean(timings) * 1000}
+    for p in PERCENTILES:
+        summary[f'p{p}_ms'] = percentile(timings, p) * 1000
+    return summary
+
+
+def percentile(sorted_values, p):
+    """The nearest-rank percentile."""
+    index = max(0, -(-len(sorted_values) * p // 100) - 1)
+    return sorted_values[index]
+
+
+def report(programs, timings):
+    groups = {}
+    for (_, level, lang), seconds in zip(programs, timings):
+        groups.setdefault(f'level {level}', []).append(seconds)
+        groups.setdefault(f'lang {lang}', []).append(seconds)
+    return {
+        'all': summarize(timings),
+        'groups': {name: summarize(groups[name]) for name in sorted(groups, key=group_order)},
+        'throughput_per_second': len(timings) / sum(timings),
+        # kilobytes on Linux, bytes on macOS
+        'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def group_order(name):
+    kind, value = name.split(' ', 1)
+    return kind, int(value) if value.isdigit() else 0, value
+
+
+def run_in_subprocess(mode, step):
+    """Run one mode in a fresh process, so the caches and the peak RSS are its own."""
+    with tempfile.NamedTemporaryFile(suffix='.json') as output:
+        subprocess.run([sys.executable, '-m', 'tests.benchmarks.transpile_corpus', '--step', str(step),
+                        '--run-mode', mode, '--output', output.name], check=True)
+        with open(output.name, 'r') as f:
+            return json.load(f)
+
+
+def compare(results, baseline, threshold):
+    """Print the changes of p50 and p95 against the baseline, and return the regressions."""
+    regressions = []
+    print(f"\n{'mode':>5} {'group':>12} {'':>4} {'baseline ms':>12} {'now ms':>9} {'change':>8}")
+    for mode in MODES:
+        if mode not in results or mode not in baseline:
+            continue
+        now = dict(results[mode]['groups'], all=results[mode]['all'])
+        before = dict(baseline[mode]['groups'], all=baseline[mode]['all'])
+        for group in now:
+            if group not in before or min(now[group]['programs'], before[group]['programs']) < MIN_PROGRAMS_TO_COMPARE:
+                continue
+            for key in ['p50_ms', 'p95_ms']:
+                change = now[group][key] / before[group][key] - 1
+                regressed = change > threshold
+                if regressed:
+                    regressions.append((mode, group, key, change))
+                print(f"{mode:>5} {group:>12} {key[:3]:>4} {before[group][key]:>12.2f} {now[group][key]:>9.2f} "
+                      f"{change:>+7.0%}{' REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def print_results(results):
+    for mode in MODES:
+        if mode not in results:
+            continue
+        result = results[mode]
+        print(f"\n{mode}: {result['all']['programs']} programs, {result['throughput_per_second']:.1f} programs/s, "
+              f"peak RSS {result['peak_rss']}")
+        print(f"{'group':>12} {'programs':>8} {'mean ms':>8} " + ' '.join(f"{f'p{p} ms':>8}" for p in PERCENTILES))
+        for group, summary in dict(result['groups'], all=result['all']).items():
+            print(f"{group:>12} {summary['programs']:>8} {summary['mean_ms']:>8.2f} "
+                  + ' '.join(f"{summary[f'p{p}_ms']:>8.2f}" for p in PERCENTILES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--step', type=int, default=10, help='only use every STEP-th program')
+    parser.add_argument('--modes', default=','.join(MODES), help='comma separated modes to run')
+    parser.add_argument('--save', help='save the results to this JSON file, to use as a baseline later')
+    parser.add_argument('--baseline', help='compare with the results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fail if a p50 or p95 is slower than the baseline by more than this fraction')
+    parser.add_argument('--run-mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        programs = load_programs(args.step)
+        timings = run(programs, args.run_mode)
+        with open(args.output, 'w') as f:
+            json.dump(report(programs, timings), f)
+        return
+
+    results = {'step': args.step, 'python': platform.python_version()}
+    for mode in args.modes.split(','):
+        results[mode] = run_in_subprocess(mode, args.step)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nSaved the results to {args.save}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('step') != args.step:
+            print(f"\nThe baseline used every {baseline.get('step')}th program, this run every {args.step}th")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} timings regressed by more than {args.threshold:.0%}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import unittest
+
+import exceptions
+import hedy
+from tests.test_incremental_parsing import public_programs_sample
+from tests.test_parser_backends import comparable
+
+# Programs with errors that are found by the different analyses
+erroneous_programs = [
+    (1, "print hallo\nprnt daar"),
+    (1, "print\nask"),
+    (1, "echo hallo\nask wie ben jij?"),
+    (2, "naam is\nprint naam"),
+    (2, "print hallo at random"),
+    (3, "dieren is hond, kat\nprint dieren at 5"),
+    (4, "naam is ask 'hoe heet je?'\nprint 'hallo ' naam\nprint hallo"),
+    (6, "a is 5\nb is a + hallo\nprint b"),
+    (8, "repeat 3 times\nprint 'a'"),
+    (12, "print 1.5.3"),
+    (12, "a = 'hallo' + 5\nprint a"),
+    (12, "define groet with naam\n    print 'hallo ' naam\n\ncall groet with 'Hedy'"),
+    (12, "call groet\ndefine groet\n    print 'hallo'"),
+    (16, "lijst = [1, 2\nprint lijst[1]"),
+]
+
+
+def analysis_result(create_ast, code, level, lang):
+    try:
+        code = hedy.process_input_string(code, level, lang)
+        ast, lookup_table, commands = create_ast(code, level, lang)
+        lookup = [(e.name, comparable(e.tree), e.definition_line, e.access_line, e.skip_hashing, e.type_)
+                  for e in lookup_table]
+        return comparable(ast), lookup, commands
+    except exceptions.HedyException as E:
+        return type(E).__name__, E.arguments
+    except Exception as E:
+        return type(E).__name__, str(E)
+
+
+def create_ast_sequentially(input_string, level, lang):
+    """create_AST as it was before the analyses were fused, running them one after the other."""
+    context = hedy.TranspileContext(level, lang)
+    program_root = hedy.parse_input(input_string, level, lang, context.skip_faulty)
+    hedy.is_program_valid(program_root, input_string, level, lang, context)
+    abstract_syntax_tree = hedy.ExtractAST().transform(program_root)
+    hedy.is_program_complete(abstract_syntax_tree, level)
+    if not hedy.valid_echo(abstract_syntax_tree):
+        raise exceptions.LonelyEchoException()
+    lookup_table = hedy.create_lookup_table(abstract_syntax_tree, level, lang, input_string, context.skip_faulty)
+    commands = hedy.AllCommands(level).transform(program_root)
+    return abstract_syntax_tree, lookup_table, commands
+
+
+class TestAnalysisPass(unittest.TestCase):
+    """Differential tests: the fused analysis must give exactly the results of the separate analyses."""
+
+    def assert_same_analysis(self, code, level, lang):
+        self.assertEqual(analysis_result(create_ast_sequentially, code, level, lang),
+                         analysis_result(hedy.create_AST, code, level, lang))
+
+    def test_public_programs(self):
+        for code, level, lang in public_programs_sample():
+            with self.subTest(level=level, lang=lang, code=code):
+                self.assert_same_analysis(code, level, lang)
+
+    def test_erroneous_programs(self):
+        for level, code in erroneous_programs:
+            with self.subTest(level=level, code=code):
+                self.assert_same_analysis(code, level, 'en')
@@ -0,0 +1,54 @@
+import json
+import unittest
+from unittest import mock
+
+import exceptions
+import hedy
+
+
+class TestCompactSourceMap(unittest.TestCase):
+    def decode(self, compact):
+        """Turns the compact source map back into the result of get_result, like the client does."""
+        result = {}
+        m = compact['mappings']
+        for i in range(0, len(m), 10):
+            index = m[i]
+            result[index] = {
+                'hedy_range': dict(zip(['from_line', 'from_column', 'to_line', 'to_column'], m[i + 2:i + 6])),
+                'python_range': dict(zip(['from_line', 'from_column', 'to_line', 'to_column'], m[i + 6:i + 10])),
+                'error': compact['errors'].get(index),
+                'command': compact['commands'][m[i + 1]],
+            }
+        return result
+
+    def test_compact_result_has_the_same_mappings(self):
+        code = "naam is ask 'hoe heet je?'\nprint 'hallo ' naam\nprint 'tot ziens'"
+        source_map = hedy.transpile(code, 4, 'en', skip_faulty=False).source_map
+
+        compact = source_map.get_compact_result()
+
+        self.assertEqual(source_map.get_result(), self.decode(compact))
+        # every command name is sent once
+        self.assertEqual(len(set(compact['commands'])), len(compact['commands']))
+        self.assertEqual(compact, json.loads(json.dumps(compact)))
+
+    def test_errors_only(self):
+        with mock.patch.dict('os.environ', {'ENABLE_SKIP_FAULTY': 'True'}):
+            source_map = hedy.transpile("print hallo\nfoo bar\nprint daar", 2, 'en').source_map
+
+        compact = source_map.get_compact_result(errors_only=True)
+        mappings = self.decode(compact)
+
+        self.assertEqual(1, len(mappings))
+        index, mapping = next(iter(mappings.items()))
+        expected = source_map.get_result()[index]
+        self.assertEqual(expected['hedy_range'], mapping['hedy_range'])
+        self.assertEqual(expected['command'], mapping['command'])
+        # faulty code has no Python range
+        self.assertEqual({'from_line': 0, 'from_column': 0, 'to_line': 0, 'to_column': 0}, mapping['python_range'])
+        self.assertIsInstance(mapping['error'], exceptions.MissingCommandException)
+
+    def test_errors_only_without_errors(self):
+        source_map = hedy.transpile("print hallo", 1, 'en', skip_faulty=False).source_map
+
+        self.assertEqual({'commands': [], 'mappings': [], 'errors': {}}, source_map.get_compact_result(True))
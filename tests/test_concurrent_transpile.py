@@ -0,0 +1,45 @@
+import os
+import textwrap
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import hedy
+
+
+PROGRAMS = [
+    ('print hallo\nprint wereld', 1),
+    ('naam is Hedy\nprint naam', 2),
+    ('dieren is hond, kat\nprint dieren at random', 3),
+    ("print 'hallo'\nprnt 'fout'\nprint 'wereld'", 4),
+    (textwrap.dedent("""\
+        for i in range 1 to 10
+            print i
+        print 'klaar'"""), 11),
+    (textwrap.dedent("""\
+        define hallo with naam
+            print 'hallo ' naam
+        call hallo with 'Hedy'"""), 13),
+]
+
+
+def transpile_or_error(code, level):
+    try:
+        result = hedy.transpile(code, level, 'en')
+        return result.code, result.source_map.get_compressed_mapping()
+    except hedy.exceptions.HedyException as E:
+        return type(E).__name__
+
+
+class TestConcurrentTranspile(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ["ENABLE_SKIP_FAULTY"] = 'True'
+
+    def test_transpile_from_many_threads(self):
+        expected = [transpile_or_error(code, level) for code, level in PROGRAMS]
+
+        work = PROGRAMS * 10
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda p: transpile_or_error(*p), work))
+
+        self.assertEqual(expected * 10, results)
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from ruamel import yaml
+
+from website import content_bundle
+from website.yaml_file import YamlFile
+
+QUIZ = {'levels': {1: {1: {'question_text': 'Welke?'}, 2: {'question_text': 'Waarom?'}}, 2: {}}}
+CHEATSHEET = {1: [{'name': 'print'}], 2: [{'name': 'is'}]}
+
+
+class TestContentBundle(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.content_dir = os.path.join(directory.name, 'content')
+        bundle_dir = os.path.join(directory.name, 'content-bundle')
+        os.makedirs(bundle_dir)
+        for patcher in [mock.patch('website.content_bundle.CONTENT_DIR', self.content_dir),
+                        mock.patch('website.content_bundle.BUNDLE_DIR', bundle_dir),
+                        mock.patch('website.content_bundle._BUNDLES', {})]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.quiz = self.write('quizzes', QUIZ)
+        self.write('cheatsheets', CHEATSHEET)
+        content_bundle.write_bundle(bundle_dir, 'nl', lambda filename: YamlFile(filename).load_uncached())
+
+    def write(self, content_type, data):
+        filename = os.path.join(self.content_dir, content_type, 'nl.yaml')
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w', encoding='utf-8') as f:
+            yaml.YAML(typ='safe', pure=True).dump(data, f)
+        return filename
+
+    def test_values_are_decoded_per_key(self):
+        quiz = content_bundle.load(self.quiz)
+
+        self.assertEqual([1, 2], list(quiz['levels']))
+        self.assertEqual({'question_text': 'Waarom?'}, quiz['levels'][1][2])
+        self.assertEqual(QUIZ['levels'], {k: v for k, v in quiz['levels'].items()})
+        cheatsheet = content_bundle.load(os.path.join(self.content_dir, 'cheatsheets', 'nl.yaml'))
+        self.assertEqual(CHEATSHEET[2], cheatsheet[2])
+
+    def test_values_are_decoded_once(self):
+        quiz = content_bundle.load(self.quiz)
+
+        with mock.patch('website.content_bundle.pickle.loads', wraps=content_bundle.pickle.loads) as loads:
+            first = quiz['levels'][1]
+            self.assertIs(first, quiz['levels'][1])
+            self.assertEqual(1, loads.call_count)
+
+    def test_changed_files_are_not_taken_from_the_bundle(self):
+        self.write('quizzes', {'levels': {}})
+
+        self.assertIsNone(content_bundle.load(self.quiz))
+
+    def test_only_bundled_content_is_loaded(self):
+        pages = self.write('pages', {'title': 'Hedy'})
+
+        self.assertIsNone(content_bundle.load(pages))
+        self.assertIsNone(content_bundle.load(os.path.join(self.content_dir, 'quizzes', 'fr.yaml')))
+
+    def test_yaml_file_loads_from_the_bundle(self):
+        with mock.patch('website.yaml_file.YAML_CACHE.max_bytes', 0):
+            data = YamlFile(self.quiz).access()
+
+        self.assertIsInstance(data, content_bundle.BundledMapping)
+        self.assertEqual(QUIZ, YamlFile(self.quiz).to_dict())
@@ -0,0 +1,122 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import exceptions
+import hedy
+from website.transpile_pool import TranspileTimeoutError, TranspileWorkerError
+
+
+class TestDetectLevel(unittest.TestCase):
+    def test_candidate_levels(self):
+        self.assertEqual(list(range(1, hedy.HEDY_MAX_LEVEL + 1)), hedy.candidate_levels('print hallo'))
+        self.assertEqual([1], hedy.candidate_levels('echo hallo'))
+        self.assertEqual(list(range(7, hedy.HEDY_MAX_LEVEL + 1)),
+                         hedy.candidate_levels("herhaal 3 keer print 'a'", 'nl'))
+        self.assertEqual(list(range(12, hedy.HEDY_MAX_LEVEL + 1)), hedy.candidate_levels('define f\n    call f'))
+        # a command must be a word of its own
+        self.assertEqual(list(range(1, hedy.HEDY_MAX_LEVEL + 1)), hedy.candidate_levels('forward 100'))
+
+    def test_lowest_valid_level(self):
+        code = "naam is ask 'hoe heet je?'\nprint 'hallo ' naam"
+
+        detection = hedy.detect_level(code)
+
+        # from level 2 on, variables can be set
+        self.assertEqual(2, detection.level)
+        self.assertEqual(hedy.transpile(code, 2).code, detection.result.code)
+        self.assertEqual([1], sorted(detection.errors))
+        self.assertFalse(detection.timed_out)
+
+    def test_levels_without_the_commands_are_not_tried(self):
+        detection = hedy.detect_level("naam is ask 'wie ben jij?'\nif naam is Hedy print 'hoi' else print 'doei'")
+
+        self.assertEqual(5, detection.level)
+        self.assertEqual({}, detection.errors)
+
+    def test_no_valid_level(self):
+        detection = hedy.detect_level('prnt hallo', levels=[1, 2, 3])
+
+        self.assertIsNone(detection.level)
+        self.assertIsInstance(detection.errors[3], exceptions.InvalidCommandException)
+
+    def test_skipped_errors_make_a_level_invalid(self):
+        with mock.patch.dict('os.environ', {'ENABLE_SKIP_FAULTY': 'True'}):
+            detection = hedy.detect_level('print hallo\nprnt hallo', levels=[1, 2], transpile_function=hedy.transpile)
+
+        self.assertIsNone(detection.level)
+        self.assertEqual([1, 2], sorted(detection.errors))
+
+    def test_parallel_levels_wait_for_the_lower_levels(self):
+        lower_levels_done = threading.Event()
+
+        def transpile(code, level, lang):
+            if level == 4:
+                return mock.Mock(source_map=mock.Mock(map={}))
+            lower_levels_done.wait(1)
+            time.sleep(0.1)
+            raise exceptions.ParseException(level=level, location=(1, 1), found='x')
+
+        detection = hedy.detect_level('print hallo', levels=[2, 3, 4], transpile_function=transpile, max_workers=3)
+
+        self.assertEqual(4, detection.level)
+        self.assertEqual([2, 3], sorted(detection.errors))
+
+    def test_timeout(self):
+        def transpile(code, level, lang):
+            time.sleep(0.5 if level == 1 else 0)
+            return mock.Mock(source_map=mock.Mock(map={}))
+
+        start = time.monotonic()
+        detection = hedy.detect_level('print hallo', levels=[1, 2], timeout=0.1, transpile_function=transpile,
+                                      max_workers=2)
+
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertTrue(detection.timed_out)
+        # a higher valid level is better than nothing
+        self.assertEqual(2, detection.level)
+
+    def test_levels_that_dont_fit_in_the_time_left_are_skipped(self):
+        transpiled = []
+
+        def transpile(code, level, lang):
+            transpiled.append(level)
+            return mock.Mock(source_map=mock.Mock(map={}))
+
+        with mock.patch('hedy.estimate_program_cost', side_effect=lambda complexity, level: 5000 if level == 1 else 1):
+            detection = hedy.detect_level('print hallo', levels=[1, 2], timeout=1, transpile_function=transpile)
+
+        self.assertEqual([2], transpiled)
+        self.assertEqual(2, detection.level)
+        self.assertTrue(detection.timed_out)
+
+    def test_timed_out_levels_are_not_invalid(self):
+        def transpile(code, level, lang):
+            if level == 1:
+                raise TranspileTimeoutError('level 1 took too long')
+            return mock.Mock(source_map=mock.Mock(map={}))
+
+        for max_workers in [None, 2]:
+            with self.subTest(max_workers=max_workers):
+                detection = hedy.detect_level('print hallo', levels=[1, 2], transpile_function=transpile,
+                                              max_workers=max_workers)
+
+                self.assertEqual(2, detection.level)
+                self.assertEqual({}, detection.errors)
+                self.assertTrue(detection.timed_out)
+
+    def test_levels_that_cant_be_transpiled_are_undecided(self):
+        def transpile(code, level, lang):
+            if level == 1:
+                raise TranspileWorkerError('the worker died')
+            raise exceptions.InputTooComplexException(line_number=1)
+
+        for max_workers in [None, 2]:
+            with self.subTest(max_workers=max_workers):
+                detection = hedy.detect_level('print hallo', levels=[1, 2], transpile_function=transpile,
+                                              max_workers=max_workers)
+
+                self.assertIsNone(detection.level)
+                self.assertEqual({}, detection.errors)
+                self.assertTrue(detection.timed_out)
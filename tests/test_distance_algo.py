@@ -124,3 +124,35 @@ class TestsKeywordSuggestions(unittest.TestCase):
         keywords = hedy.get_suggestions_for_language('en', level)
         closest = hedy.closest_command(mistake, keywords)
         self.assertEqual(correct, closest)
+
+    @parameterized.expand([
+        (1, 'pnirt'),
+        (4, 'sk'),
+        (12, 'rint'),
+        (15, 'irpnt'),
+        (16, 'whilee'),
+        (18, 'xyzqq'),
+        (18, 'print'),
+    ])
+    def test_suggestion_index_suggests_the_same_command(self, level, mistake):
+        keywords = hedy.get_suggestions_for_language('en', level)
+        index = hedy.get_suggestion_index('en', level)
+        self.assertEqual(hedy.closest_command(mistake, keywords), hedy.closest_command(mistake, index))
+
+    def test_suggestion_index_suggests_the_first_of_the_closest_commands(self):
+        index = hedy.SuggestionIndex(['bat', 'cat', 'at'])
+        self.assertEqual('bat', hedy.closest_command('xat', index))
+        self.assertEqual('at', hedy.closest_command('t', index))
+        self.assertEqual(None, hedy.closest_command('xyz', index, threshold=1))
+
+    @parameterized.expand([
+        ('print', 'pnirt'),
+        ('', 'abc'),
+        ('kitten', 'sitting'),
+        ('herhaal', 'herhal'),
+        ('forward', 'backward'),
+    ])
+    def test_bounded_distance(self, s1, s2):
+        distance = hedy.calculate_minimum_distance(s1, s2)
+        for limit in range(6):
+            self.assertEqual(min(distance, limit + 1), hedy.bounded_distance(s1, s2, limit))
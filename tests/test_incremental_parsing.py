@@ -0,0 +1,115 @@
+import json
+import textwrap
+import unittest
+
+import exceptions
+import hedy
+from tests.test_parser_backends import comparable
+
+public_programs_file_name = 'tests/test_public_programs/filtered-programs-2023-12-12.json'
+
+with open(public_programs_file_name, 'r') as public_programs_file:
+    public_programs = json.load(public_programs_file)
+
+# The public programs take too long to parse them all twice, so we take a sample of every level
+PROGRAMS_PER_LEVEL = 8
+
+
+def public_programs_sample():
+    count_per_level = {}
+    for p in public_programs:
+        level = int(p['level'])
+        if count_per_level.get(level, 0) < PROGRAMS_PER_LEVEL and p['code'].count('\n') > 1:
+            count_per_level[level] = count_per_level.get(level, 0) + 1
+            yield p['code'], level, p['language']
+
+
+def transpile_result(code, level, lang, incremental):
+    try:
+        result = hedy.transpile(code, level, lang, skip_faulty=False, unused_allowed=True,
+                                incremental=incremental)
+        return result.code, result.source_map.get_result(), result.commands
+    except exceptions.HedyException as E:
+        return type(E).__name__, E.arguments
+
+
+class TestIncrementalParsing(unittest.TestCase):
+    def setUp(self):
+        hedy.FRAGMENT_CACHE.clear()
+
+    def test_split_into_fragments(self):
+        code = hedy.process_input_string(textwrap.dedent("""\
+
+            naam is ask 'hoi'
+            if naam is hedy
+                print 'a'
+            else
+                print 'c'
+
+            print 'd'"""), 9, 'en')
+
+        self.assertEqual([
+            "\nnaam is ask 'hoi'",
+            "if naam is hedy\n    print 'a'#ENDBLOCK\nelse\n    print 'c'\n#ENDBLOCK",
+            "print 'd'"
+        ], hedy.split_into_fragments(code, 9, 'en'))
+
+    def test_else_in_keyword_language_stays_with_if(self):
+        code = "dier is kat\nals dier is kat print 'ja'\nanders print 'nee'"
+
+        self.assertEqual(2, len(hedy.split_into_fragments(code, 5, 'nl')))
+
+    def test_unchanged_lines_are_reused(self):
+        code = "print hallo\nforward 100\nprint daar"
+        hedy.transpile(code, 2, 'en', incremental=True)
+        hits = hedy.FRAGMENT_CACHE.stats()['hits']
+
+        result = hedy.transpile(code.replace('daar', 'ginder'), 2, 'en', incremental=True)
+
+        self.assertEqual(hits + 2, hedy.FRAGMENT_CACHE.stats()['hits'])
+        self.assertIn("print(f'ginder')", result.code)
+
+    def test_cache_stays_within_its_memory_budget(self):
+        cache = hedy.FragmentCache(max_bytes=1000)
+        cache.put('a', 'tree a', size=400)
+        cache.put('b', 'tree b', size=400)
+        cache.get('a')
+        cache.put('c', 'tree c', size=400)
+        cache.put('d', 'too big', size=2000)
+
+        self.assertEqual('tree a', cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(800, cache.stats()['bytes'])
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def test_cached_trees_are_measured(self):
+        hedy.transpile("print hallo\nforward 100\nprint daar", 2, 'en', incremental=True)
+
+        stats = hedy.FRAGMENT_CACHE.stats()
+        self.assertEqual(3, stats['entries'])
+        self.assertGreater(stats['bytes'], 0)
+
+    def test_errors_are_the_same(self):
+        code = "print hallo\nprnt daar\nprint ginder"
+
+        with self.assertRaises(exceptions.InvalidCommandException) as context:
+            hedy.transpile(code, 3, 'en', skip_faulty=False, incremental=True)
+
+        self.assertEqual(2, context.exception.arguments['line_number'])
+
+    def test_public_programs_give_same_trees(self):
+        for code, level, lang in public_programs_sample():
+            with self.subTest(level=level, lang=lang, code=code):
+                try:
+                    code = hedy.process_input_string(code, level, lang)
+                    expected = comparable(hedy.parse_input(code, level, lang))
+                except exceptions.HedyException:
+                    continue
+                self.assertEqual(expected, comparable(hedy.parse_input_incrementally(code, level, lang)))
+
+    def test_public_programs_give_same_transpile_result(self):
+        for code, level, lang in public_programs_sample():
+            with self.subTest(level=level, lang=lang, code=code):
+                self.assertEqual(transpile_result(code, level, lang, incremental=False),
+                                 transpile_result(code, level, lang, incremental=True))
@@ -0,0 +1,15 @@
+import os
+import unittest
+
+from content import yaml_to_lark_utils
+
+
+class TestKeywordGrammars(unittest.TestCase):
+    def test_committed_grammars_match_the_keyword_yamls(self):
+        # The keyword grammars are regenerated from the YAMLs when the parser bundle
+        # is built, so a change made only in the grammar file would be lost there
+        for filename, grammar in yaml_to_lark_utils.generate_Lark_grammars_from_yaml().items():
+            with self.subTest(filename=filename):
+                path = os.path.join(yaml_to_lark_utils.current_grammar_path, filename)
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.assertEqual(grammar, f.read())
@@ -0,0 +1,46 @@
+import unittest
+
+import hedy
+import hedy_content
+from hedy_content import KeywordIndex
+
+
+class TestKeywordIndex(unittest.TestCase):
+    index = KeywordIndex({
+        'en': {'is': 'is', 'echo': 'echo', 'not_in': 'not in'},
+        'eo': {'echo': 'eĥu|ehhu|ehxu', 'is': 'estas'},
+    })
+
+    def test_to_local_uses_the_first_translation(self):
+        self.assertEqual('eĥu', self.index.to_local('echo', 'eo'))
+        self.assertEqual('not in', self.index.to_local('not_in', 'en'))
+
+    def test_to_en_knows_all_translations(self):
+        self.assertEqual('echo', self.index.to_en('eĥu', 'eo'))
+        self.assertEqual('echo', self.index.to_en('ehxu', 'eo'))
+
+    def test_unknown_keywords_and_languages_are_returned_as_is(self):
+        self.assertEqual('print', self.index.to_local('print', 'eo'))
+        self.assertEqual('vraag', self.index.to_en('vraag', 'eo'))
+        self.assertEqual('echo', self.index.to_local('echo', 'nl'))
+        self.assertEqual({}, dict(self.index.translations('nl')))
+
+    def test_translations_are_immutable(self):
+        with self.assertRaises(TypeError):
+            self.index.translations('eo')['echo'] = ('echo',)
+
+    def test_keywords_has_the_first_translation(self):
+        self.assertEqual('vraag', hedy_content.KEYWORDS['nl']['ask'])
+        self.assertEqual('هو', hedy_content.KEYWORDS['ar']['is'])
+
+    def test_list_keywords_falls_back_to_english(self):
+        commands = ['ask', 'ifpressed', 'not_in']
+
+        self.assertEqual(['vraag', 'ingedrukt', 'niet in'], hedy.get_list_keywords(commands, 'nl'))
+        self.assertEqual(['ask', 'pressed', 'not in'], hedy.get_list_keywords(commands, 'xx'))
+
+    def test_standardize_keyword(self):
+        all_commands = hedy.AllCommands(5)
+
+        self.assertEqual('is', all_commands.standardize_keyword('assign_list'))
+        self.assertEqual('print', all_commands.standardize_keyword('print'))
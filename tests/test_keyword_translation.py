@@ -0,0 +1,59 @@
+import time
+import unittest
+
+import hedy_translation
+from hedy_translation import Rule
+
+
+class TestKeywordTranslation(unittest.TestCase):
+    def test_keyword_translations_are_cached_and_immutable(self):
+        translations = hedy_translation.keyword_translations('nl')
+
+        self.assertIs(translations, hedy_translation.keyword_translations('nl'))
+        self.assertEqual('vraag', translations['ask'][0])
+        with self.assertRaises(TypeError):
+            translations['ask'] = ('ask',)
+
+    def test_keywords_to_dict_returns_a_copy(self):
+        keywords = hedy_translation.keywords_to_dict('nl')
+        keywords['ask'].append('vraagt')
+
+        self.assertNotIn('vraagt', hedy_translation.keywords_to_dict('nl')['ask'])
+
+    def test_replace_tokens(self):
+        code = "print hallo\nask wie\n  echo"
+        replacements = [
+            (Rule('echo', 3, 2, 5, 'echo'), 'echo'),
+            (Rule('ask', 2, 0, 2, 'ask'), 'vraag'),
+            (Rule('print', 1, 0, 4, 'print'), 'print'),
+        ]
+
+        self.assertEqual("print hallo\nvraag wie\n  echo", hedy_translation.replace_tokens(code, replacements))
+
+    def test_overlapping_tokens_are_replaced_once(self):
+        replacements = [
+            (Rule('is', 1, 1, 4, ' is '), ' = '),
+            (Rule('is', 1, 2, 3, 'is'), 'is'),
+        ]
+
+        self.assertEqual("a = 1", hedy_translation.replace_tokens("a is 1", replacements))
+
+    def test_keyword_in_text_is_not_the_original(self):
+        # is has two translations in Arabic, the original is the one in the token, not the first one in the line
+        code = "x هي 'هو'\nprint x"
+
+        result = hedy_translation.translate_keywords(code, from_lang="ar", to_lang="en", level=4)
+
+        self.assertEqual("x is 'هو'\nprint x", result)
+
+    def test_long_programs_are_replaced_in_linear_time(self):
+        lines = 20000
+        code = "ask wie\n" * lines
+        replacements = [(Rule('ask', line, 0, 2, 'ask'), 'vraag') for line in range(1, lines + 1)]
+
+        start = time.perf_counter()
+        result = hedy_translation.replace_tokens(code, replacements)
+
+        # Replacing line by line takes minutes
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertEqual("vraag wie\n" * lines, result)
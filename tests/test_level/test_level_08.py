@@ -1235,10 +1235,10 @@ class TestsLevel8(HedyTester):
             '2/1-2/7': '2/1-2/7',
             '2/1-2/57': '2/1-2/61',
             '3/1-3/15': '3/1-3/17',
-            '4/8-4/14': '2/27-2/33',
+            '4/8-4/14': '5/7-5/13',
             '5/5-5/9': '9/1-9/5',
             '5/5-5/47': '9/1-9/47',
-            '6/11-6/15': '1/1-1/5',
+            '6/11-6/15': '10/12-10/16',
             '6/5-6/15': '10/1-10/17',
             '4/1-6/24': '4/1-11/18',
             '7/1-7/32': '12/1-12/34',
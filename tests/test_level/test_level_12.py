@@ -2551,28 +2551,28 @@ class TestsLevel12(HedyTester):
             '2/1-2/43': '2/1-9/9',
             '3/1-3/6': '10/1-10/6',
             '3/1-3/44': '10/1-17/9',
-            '4/4-4/8': '4/3-4/7',
+            '4/4-4/8': '18/30-18/34',
             '4/4-4/23': '18/4-18/77',
-            '5/5-5/10': '21/1-21/6',
-            '5/13-5/18': '23/1-23/6',
+            '5/5-5/10': '19/1-19/6',
+            '5/13-5/18': '19/11-19/16',
             '5/5-5/25': '19/1-19/20',
             '4/1-5/34': '18/1-19/22',
-            '6/4-6/8': '4/14-4/18',
+            '6/4-6/8': '20/30-20/34',
             '6/4-6/19': '20/4-20/73',
-            '7/5-7/10': '25/1-25/6',
-            '7/13-7/18': '1/1-1/6',
+            '7/5-7/10': '21/1-21/6',
+            '7/13-7/18': '21/11-21/16',
             '7/5-7/25': '21/1-21/21',
             '6/1-7/34': '20/1-21/23',
-            '8/4-8/9': '10/42-10/47',
+            '8/4-8/9': '22/30-22/35',
             '8/4-8/20': '22/4-22/74',
-            '9/5-9/10': '19/1-19/6',
-            '9/13-9/18': '21/1-21/6',
+            '9/5-9/10': '23/1-23/6',
+            '9/13-9/18': '23/11-23/16',
             '9/5-9/25': '23/1-23/20',
             '8/1-9/34': '22/1-23/22',
-            '10/4-10/9': '12/3-12/8',
+            '10/4-10/9': '24/30-24/35',
             '10/4-10/19': '24/4-24/73',
-            '11/5-11/10': '23/1-23/6',
-            '11/13-11/18': '25/1-25/6',
+            '11/5-11/10': '25/1-25/6',
+            '11/13-11/18': '25/11-25/16',
             '11/5-11/25': '25/1-25/21',
             '10/1-11/34': '24/1-25/23',
             '12/23-12/28': '26/25-26/30',
@@ -536,12 +536,12 @@ class TestsLevel14(HedyTester):
         expected_source_map = {
             '1/1-1/4': '1/1-1/4',
             '1/1-1/29': '1/1-8/9',
-            '2/4-2/7': '3/3-3/6',
+            '2/4-2/7': '9/30-9/33',
             '2/4-2/12': '9/4-9/64',
             '3/5-3/37': '10/1-10/39',
             '2/1-3/46': '9/1-10/41',
             '5/5-5/35': '12/1-12/37',
-            '3/46-5/44': '12/-248-3/3',
+            '3/46-5/44': '10/41-12/39',
             '2/1-5/44': '9/1-12/39',
             '1/1-5/45': '1/1-12/39'
         }
@@ -277,7 +277,7 @@ class TestsLevel15(HedyTester):
             '1/1-1/11': '1/1-1/11',
             '2/7-2/13': '2/33-2/39',
             '2/7-2/19': '2/7-2/71',
-            '3/5-3/11': '8/5-8/11',
+            '3/5-3/11': '3/1-3/7',
             '3/5-3/38': '3/1-9/18',
             '2/1-3/47': '2/1-11/18',
             '4/1-4/40': '12/1-12/46',
@@ -575,7 +575,7 @@ class TestsLevel17(HedyTester):
 
         expected_source_map = {
             '1/5-1/6': '1/10-1/11',
-            '2/11-2/12': '1/1-1/2',
+            '2/11-2/12': '3/5-3/6',
             '2/5-2/12': '3/1-3/18',
             '1/1-2/21': '1/1-4/18',
             '3/1-3/35': '5/1-5/41',
@@ -0,0 +1,37 @@
+import unittest
+
+import hedy
+
+
+class TestLineKeywordMatcher(unittest.TestCase):
+    def test_starts_with_keyword_and_translation(self):
+        keywords = hedy.get_line_keyword_matcher('nl')
+
+        self.assertTrue(keywords.starts_with('if', 'if x is 3'))
+        self.assertTrue(keywords.starts_with('if', 'als x is 3'))
+        self.assertTrue(keywords.starts_with('if', 'als'))
+        self.assertFalse(keywords.starts_with('if', 'alsof is 3'))
+        self.assertTrue(keywords.starts_with_after_repeat('if', 'herhaal 3 keer als x is 3 print 5'))
+
+    def test_contains(self):
+        keywords = hedy.get_line_keyword_matcher('nl')
+
+        self.assertTrue(keywords.contains_any_of(('print', 'ask'), 'als x is 3 vraag 5'))
+        self.assertFalse(keywords.contains_any_of(('print', 'ask'), 'als x is 3'))
+        self.assertTrue(keywords.contains_two('is', 'als x is 3 y is 5'))
+        self.assertFalse(keywords.contains_two('is', 'als dishwasher is 3'))
+
+    def test_requires_indentation(self):
+        self.assertTrue(hedy.line_requires_indentation('    repeat 3 times', 'en'))
+        self.assertTrue(hedy.line_requires_indentation('herhaal 3 keer', 'nl'))
+        self.assertTrue(hedy.line_requires_indentation('else:', 'en'))
+        self.assertFalse(hedy.line_requires_indentation('elsewhere is 5', 'en'))
+        # a language without keywords of its own
+        self.assertTrue(hedy.line_requires_indentation('repeat 3 times', 'xx'))
+
+    def test_preprocess_ifs_looks_past_empty_lines(self):
+        code = "if x is 3 print 'a'\n\n\nelse print 'b'\nif x is 4 print 'c'\n\nprint 'd'"
+
+        self.assertEqual(
+            "if x is 3 print 'a'\n\n\nelse print 'b'\nif x is 4 print 'c' else x__x__x__x is 5\n\nprint 'd'",
+            hedy.preprocess_ifs(code, 'en'))
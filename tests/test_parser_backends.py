@@ -0,0 +1,91 @@
+import json
+import unittest
+from unittest import mock
+
+from lark import Token, Tree
+from lark.exceptions import UnexpectedInput
+
+import exceptions
+import hedy
+
+public_programs_file_name = 'tests/test_public_programs/filtered-programs-2023-12-12.json'
+
+with open(public_programs_file_name, 'r') as public_programs_file:
+    public_programs = json.load(public_programs_file)
+
+# Hand-written programs for the corners of the grammar that the public programs don't cover
+extra_programs = [
+    'print',
+    'print hallo\n\n\nprint daar\n',
+    'printhallo',
+    'color purple',
+    'color purple is nice',
+    'color 5',
+    'turn left',
+    'turn links',
+    'forward',
+    'forward 100 meters',
+    'ask\necho',
+    '   print hallo',
+    'print hallo # comment',
+    '# just a comment',
+    'prnt hallo',
+    'play C4',
+]
+
+
+def comparable(node):
+    """The parse tree as nested tuples, including the positions the source map uses."""
+    if isinstance(node, Token):
+        return (node.type, node.value, node.line, node.column, node.end_line, node.end_column,
+                node.start_pos, node.end_pos)
+    if isinstance(node, Tree):
+        return node.data, sorted(vars(node.meta).items()), tuple(comparable(c) for c in node.children)
+    return node
+
+
+def programs_for_level(level):
+    programs = [(p['code'], p['language']) for p in public_programs if int(p['level']) == level]
+    return programs + [(code, 'en') for code in extra_programs]
+
+
+def transpile_with(backend, code, level, lang):
+    with mock.patch('hedy.lalr_parsers_enabled', backend == 'lalr'):
+        try:
+            result = hedy.transpile(code, level, lang, skip_faulty=False, unused_allowed=True)
+            return result.code, result.source_map.get_result()
+        except exceptions.HedyException as E:
+            return type(E).__name__, E.arguments
+
+
+class TestParserBackends(unittest.TestCase):
+    """Differential tests: LALR must give exactly the parse trees Earley gives."""
+
+    def test_lalr_levels_give_same_trees_as_earley(self):
+        for level in sorted(hedy.LALR_LEVELS):
+            for code, lang in programs_for_level(level):
+                with self.subTest(level=level, lang=lang, code=code):
+                    try:
+                        code = hedy.process_input_string(code, level, lang)
+                    except exceptions.HedyException:
+                        continue
+                    try:
+                        lalr_tree = hedy.get_parser(level, lang, backend='lalr').parse(code + '\n')
+                    except UnexpectedInput:
+                        # parse_input falls back to Earley
+                        continue
+
+                    earley_tree = hedy.get_parser(level, lang).parse(code + '\n')
+                    self.assertEqual(comparable(earley_tree), comparable(lalr_tree))
+
+    def test_lalr_levels_give_same_transpile_output_as_earley(self):
+        for level in sorted(hedy.LALR_LEVELS):
+            for code, lang in programs_for_level(level):
+                with self.subTest(level=level, lang=lang, code=code):
+                    self.assertEqual(transpile_with('earley', code, level, lang),
+                                     transpile_with('lalr', code, level, lang))
+
+    def test_skip_faulty_uses_earley(self):
+        self.assertEqual('lalr', hedy.get_parser_backend(1))
+        self.assertEqual('earley', hedy.get_parser_backend(1, skip_faulty=True))
+        self.assertEqual('earley', hedy.get_parser_backend(hedy.HEDY_MAX_LEVEL))
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import hedy
+
+
+class TestParserBundle(unittest.TestCase):
+    def setUp(self):
+        self.bundle = tempfile.TemporaryDirectory()
+        self.cache = tempfile.TemporaryDirectory()
+        self.patches = [
+            mock.patch('hedy.get_parser_bundle_directory', return_value=self.bundle.name),
+            mock.patch('hedy._get_parser_cache_directory', return_value=self.cache.name),
+        ]
+        for patch in self.patches:
+            patch.start()
+        hedy.PARSER_CACHE.clear()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        hedy.PARSER_CACHE.clear()
+        self.bundle.cleanup()
+        self.cache.cleanup()
+
+    def test_parsers_are_loaded_from_bundle(self):
+        hedy.write_parser_bundle_files(self.bundle.name, 1, 'en', skip_faulty=False)
+        hedy.write_parser_bundle_files(self.bundle.name, 1, 'nl', skip_faulty=False)
+
+        result = hedy.transpile('vooruit 100\nprint hallo', 1, 'nl')
+
+        self.assertIn("print('hallo')", result.code)
+        self.assertEqual([], os.listdir(self.cache.name))
+
+    def test_parsers_missing_from_bundle_are_cached_to_temp_directory(self):
+        hedy.get_parser(1, 'en')
+
+        self.assertEqual([], os.listdir(self.bundle.name))
+        self.assertNotEqual([], os.listdir(self.cache.name))
@@ -0,0 +1,46 @@
+import unittest
+
+import hedy
+from hedy import ParserCache
+
+
+class TestParserCache(unittest.TestCase):
+    def test_get_parser_is_served_from_memory(self):
+        first = hedy.get_parser(1, 'en')
+        hits = hedy.PARSER_CACHE.stats()['hits']
+
+        second = hedy.get_parser(1, 'en')
+
+        self.assertIs(first, second)
+        self.assertEqual(hits + 1, hedy.PARSER_CACHE.stats()['hits'])
+
+    def test_size_is_measured(self):
+        cache = ParserCache(max_bytes=100 * 1024 * 1024)
+
+        cache.put('a', hedy.get_parser(1, 'en'))
+
+        # a parser takes at least a few hundred kilobytes
+        self.assertGreater(cache.stats()['bytes'], 100 * 1024)
+
+    def test_evicts_least_frequently_used(self):
+        cache = ParserCache(max_bytes=100 * 1024 * 1024)
+        cache.put('popular', ['parser'] * 100)
+        cache.put('unpopular', ['parser'] * 100)
+        for _ in range(3):
+            cache.get('popular')
+        cache.max_bytes = cache.stats()['bytes']
+
+        cache.put('new', ['parser'] * 100)
+
+        self.assertIsNotNone(cache.get('popular'))
+        self.assertIsNone(cache.get('unpopular'))
+        self.assertIsNotNone(cache.get('new'))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def test_parser_larger_than_budget_is_not_cached(self):
+        cache = ParserCache(max_bytes=10)
+
+        cache.put('a', ['parser'] * 100)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, cache.stats()['bytes'])
@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+
+from flask import Flask
+from flask_babel import Babel, force_locale, get_translations
+
+from website import preload
+
+SMAPS_ROLLUP = """55f3c8cab000-7fffc1890000 ---p 00000000 00:00 0                          [rollup]
+Rss:                1388 kB
+Pss:                 256 kB
+Shared_Clean:       1244 kB
+Shared_Dirty:          0 kB
+Private_Clean:        40 kB
+Private_Dirty:       104 kB
+"""
+
+
+class TestPreload(unittest.TestCase):
+    def test_parse_smaps(self):
+        fields = preload.parse_smaps(SMAPS_ROLLUP)
+
+        self.assertEqual(1388 * 1024, fields['Rss'])
+        self.assertEqual(104 * 1024, fields['Private_Dirty'])
+        self.assertEqual(6, len(fields))
+
+    def test_memory_usage(self):
+        with mock.patch('builtins.open', mock.mock_open(read_data=SMAPS_ROLLUP)):
+            usage = preload.memory_usage()
+
+        self.assertEqual({'rss': 1388 * 1024, 'pss': 256 * 1024, 'unique': 144 * 1024, 'shared': 1244 * 1024}, usage)
+
+    def test_memory_usage_not_available(self):
+        with mock.patch('builtins.open', side_effect=FileNotFoundError):
+            self.assertIsNone(preload.memory_usage())
+        self.assertEqual('memory usage not available', preload.format_memory_usage(None))
+
+    def test_memory_usage_is_logged_once_per_interval(self):
+        with mock.patch('website.preload._last_memory_log', 0), \
+                mock.patch('website.preload.memory_usage', return_value={'unique': 1, 'shared': 2}), \
+                mock.patch('website.querylog.log_value') as log_value:
+            preload.log_memory_usage()
+            preload.log_memory_usage()
+
+        log_value.assert_called_once_with(memory_unique_bytes=1, memory_shared_bytes=2)
+
+    def test_translations_are_kept_after_preloading(self):
+        app = Flask(__name__)
+        babel = Babel(app)
+
+        preload.preload_translations(app, ['nl', 'fr'])
+
+        with app.test_request_context(), force_locale('nl'):
+            self.assertIs(babel.domain_instance.cache['nl', 'messages'], get_translations())
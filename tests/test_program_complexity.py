@@ -0,0 +1,112 @@
+import time
+import unittest
+from unittest import mock
+
+import exceptions
+import hedy
+
+
+class TestProgramComplexity(unittest.TestCase):
+    def test_measure(self):
+        code = "for i in range 1 to 3\n    if i == 2\n        print 'twee\n    print ((i + 1) * [1])\n"
+
+        complexity = hedy.measure_program_complexity(code, 12)
+
+        self.assertEqual(5, complexity.lines)
+        self.assertEqual(25, complexity.longest_line)
+        self.assertEqual(27, complexity.tokens)
+        # two indented blocks, the brackets don't count
+        self.assertEqual(2, complexity.nesting_depth)
+        self.assertEqual(1, complexity.unbalanced_quotes)
+        self.assertEqual(4, complexity.costliest_line)
+
+    def test_estimate_grows_with_tokens_and_level(self):
+        small = hedy.measure_program_complexity("print 'hallo'", 4)
+        large = hedy.measure_program_complexity("print 'hallo'\n" * 50, 4)
+
+        self.assertLess(hedy.estimate_program_cost(small, 4), hedy.estimate_program_cost(large, 4))
+        self.assertLess(hedy.estimate_program_cost(large, 1), hedy.estimate_program_cost(large, 16))
+
+    def test_estimate_grows_with_nesting_depth(self):
+        flat = '\n'.join(["print 'a'"] * 20)
+        nested = '\n'.join('    ' * i + 'repeat 2 times' for i in range(19)) + '\n' + '    ' * 19 + "print 'a'"
+
+        flat_complexity = hedy.measure_program_complexity(flat, 12)
+        nested_complexity = hedy.measure_program_complexity(nested, 12)
+
+        self.assertEqual(19, nested_complexity.nesting_depth)
+        self.assertLess(hedy.estimate_program_cost(flat_complexity, 12) + 100,
+                        hedy.estimate_program_cost(nested_complexity, 12))
+
+    def test_estimate_grows_with_unbalanced_quotes(self):
+        balanced = hedy.measure_program_complexity('\n'.join(["print 'a b c'"] * 20), 6)
+        unbalanced = hedy.measure_program_complexity('\n'.join(["print 'a b c"] * 20), 6)
+
+        self.assertEqual(20, unbalanced.unbalanced_quotes)
+        self.assertLess(hedy.estimate_program_cost(balanced, 6) + 100, hedy.estimate_program_cost(unbalanced, 6))
+
+    def test_quotes_inside_texts_are_balanced(self):
+        self.assertEqual(0, hedy.measure_program_complexity('print "it\'s" \'say "hi"\'', 4).unbalanced_quotes)
+        # before level 4 texts are not quoted
+        self.assertEqual(0, hedy.measure_program_complexity("print it's", 2).unbalanced_quotes)
+
+    def test_large_valid_programs_are_not_rejected(self):
+        # About a thousand tokens in 96 lines, which takes about a second to transpile
+        definitions = [f'{name} = {value}' for value, name in enumerate('abcde', 1)]
+        lines = [f'v{i} = a + b * c - d + e' for i in range(96 - len(definitions))]
+        code = '\n'.join(definitions + lines)
+
+        for level in range(12, hedy.HEDY_MAX_LEVEL + 1):
+            with self.subTest(level=level):
+                complexity = hedy.measure_program_complexity(code, level)
+                self.assertLess(hedy.estimate_program_cost(complexity, level), hedy.MAX_PROGRAM_COST_MS)
+                result = hedy.transpile(code, level, 'en', skip_faulty=False, unused_allowed=True)
+                self.assertIn('v90 = a + b * c - d + e', result.code)
+
+    def test_quoted_text_is_one_token_from_level_4(self):
+        code = "print 'hallo (wereld)'"
+
+        self.assertEqual(7, hedy.measure_program_complexity(code, 3).tokens)
+        self.assertEqual(2, hedy.measure_program_complexity(code, 4).tokens)
+        self.assertEqual(0, hedy.measure_program_complexity(code, 4).nesting_depth)
+
+    def test_programs_over_budget_are_rejected_before_parsing(self):
+        code = "print 'hallo'\nprint " + " + ".join(['1'] * 100)
+
+        with mock.patch('hedy.MAX_PROGRAM_COST_MS', 50), mock.patch('hedy.parse_input') as parse_input:
+            with self.assertRaises(exceptions.InputTooComplexException) as context:
+                hedy.transpile(code, 6, 'en', skip_faulty=False)
+
+        self.assertEqual({'line_number': 2}, context.exception.arguments)
+        parse_input.assert_not_called()
+
+    def test_huge_programs_are_rejected_at_every_level(self):
+        # The fit finds no time per token at level 1 and no time per line at level 4
+        words = ' '.join(f'w{i}' for i in range(1000))
+        code = '\n'.join([f'prnt {words}'] * hedy.MAX_LINES)
+
+        for level in [1, 4]:
+            with self.subTest(level=level), mock.patch('hedy.parse_input') as parse_input:
+                with self.assertRaises(exceptions.InputTooComplexException):
+                    hedy.transpile(code, level, 'en', skip_faulty=False)
+                parse_input.assert_not_called()
+
+    def test_rejected_programs_are_not_skipped(self):
+        code = "print 'hallo'\nprint " + " + ".join(['1'] * 100)
+
+        with mock.patch('hedy.MAX_PROGRAM_COST_MS', 50), \
+                mock.patch.dict('os.environ', {'ENABLE_SKIP_FAULTY': 'True'}), \
+                mock.patch('hedy.transpile_inner_with_skipping_faulty') as skipping_faulty:
+            with self.assertRaises(exceptions.InputTooComplexException):
+                hedy.transpile(code, 6, 'en')
+
+        skipping_faulty.assert_not_called()
+
+    def test_long_words_are_transpiled_in_linear_time(self):
+        # The regex that finds the list usages in print used to backtrack on long words
+        code = "print '" + 'a' * 2000 + "'"
+
+        start = time.perf_counter()
+        hedy.transpile(code, 4, 'en', skip_faulty=False)
+
+        self.assertLess(time.perf_counter() - start, 5)
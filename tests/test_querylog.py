@@ -1,3 +1,4 @@
+import os
 import unittest
 
 from website import log_queue, querylog
@@ -38,3 +39,23 @@ class TestQueryLog(unittest.TestCase):
         self.assertEqual(self.records[0]['banaan'], 'geel')
         self.assertEqual(self.records[0]['bloem'], 'rood')
         self.assertEqual(self.records[0]['terminated'], True)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_writer_thread_is_started_after_fork(self):
+        queue = log_queue.LogQueue('forked', batch_window_s=300)
+        self.assertIsNone(queue.thread)
+        queue.add({'banaan': 'geel'})
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # the parent writes the records that were queued before the fork
+                empty = queue.thread is None and not queue.records_queue
+                queue.add({'bloem': 'rood'})
+                os._exit(0 if empty and queue.thread.is_alive() else 1)
+            finally:
+                os._exit(2)
+        _, status = os.waitpid(pid, 0)
+
+        self.assertEqual(0, os.waitstatus_to_exitcode(status))
+        self.assertEqual(1, sum(len(records) for records in queue.records_queue.values()))
@@ -0,0 +1,55 @@
+import textwrap
+import unittest
+
+import exceptions
+import hedy
+
+
+class TestSharedParsers(unittest.TestCase):
+    def setUp(self):
+        self.enabled = hedy.shared_parsers_enabled
+        hedy.shared_parsers_enabled = True
+        hedy.PARSER_CACHE.clear()
+
+    def tearDown(self):
+        hedy.shared_parsers_enabled = self.enabled
+        hedy.PARSER_CACHE.clear()
+
+    def test_languages_share_the_english_parser_tables(self):
+        english = hedy.get_parser(4, 'en')
+        dutch = hedy.get_parser(4, 'nl')
+
+        self.assertIsNot(english, dutch)
+        self.assertIs(english.parser.parser.predictions, dutch.parser.parser.predictions)
+
+    def test_keywords_of_the_language_are_recognized(self):
+        code = textwrap.dedent("""\
+            dieren is hond, kat
+            herhaal 3 keer print 'hoera'
+            print dieren op willekeurig""")
+
+        result = hedy.transpile(code, 7, 'nl')
+
+        self.assertIn("for __i__ in range(int('3')):", result.code)
+        self.assertIn('random.choice(dieren)', result.code)
+
+    def test_keywords_of_other_languages_are_not_recognized(self):
+        with self.assertRaises(exceptions.HedyException):
+            hedy.transpile('herhaal 3 keer print "a"', 7, 'fr')
+
+    def test_error_location_is_in_original_text(self):
+        code = textwrap.dedent("""\
+            vooruit 100
+            prnt hallo""")
+
+        with self.assertRaises(exceptions.InvalidCommandException) as context:
+            hedy.transpile(code, 1, 'nl', skip_faulty=False)
+
+        self.assertEqual(2, context.exception.arguments['line_number'])
+        self.assertEqual('prnt', context.exception.arguments['invalid_command'])
+
+    def test_source_map_is_in_original_text(self):
+        result = hedy.transpile('vooruit 100\ndraai links', 1, 'nl')
+
+        second_line = result.source_map.get_result()[1]['hedy_range']
+        self.assertEqual({'from_line': 2, 'from_column': 1, 'to_line': 2, 'to_column': 12}, second_line)
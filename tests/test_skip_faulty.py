@@ -0,0 +1,39 @@
+import unittest
+from unittest import mock
+
+import exceptions
+import hedy
+
+
+class TestSkipFaulty(unittest.TestCase):
+    code = "print hallo\nfoo bar\nprint daar\nfoo bar"
+
+    def transpile(self):
+        with mock.patch.dict('os.environ', {'ENABLE_SKIP_FAULTY': 'True'}):
+            return hedy.transpile(self.code, 2, 'en')
+
+    def skipped_errors(self, result):
+        return [(v['hedy_range']['from_line'], v['error']) for v in result.source_map.get_result().values()
+                if v['error'] is not None]
+
+    def test_errors_of_skipped_code_have_their_line_numbers(self):
+        result = self.transpile()
+
+        self.assertEqual("print(f'hallo')\npass\nprint(f'daar')\npass", result.code)
+        errors = self.skipped_errors(result)
+        self.assertEqual([2, 4], [line for line, _ in errors])
+        self.assertTrue(all(isinstance(error, exceptions.MissingCommandException) for _, error in errors))
+        self.assertEqual([2, 4], [error.arguments['line_number'] for _, error in errors])
+
+    def test_skipped_code_is_not_transpiled_again(self):
+        with mock.patch('hedy.transpile_inner', wraps=hedy.transpile_inner) as transpile_inner:
+            self.transpile()
+
+        # once without skipping faulty code, once with
+        self.assertEqual(2, transpile_inner.call_count)
+
+    def test_validator_is_not_changed(self):
+        self.transpile()
+
+        with self.assertRaises(exceptions.MissingCommandException):
+            hedy.transpile(self.code, 2, 'en', skip_faulty=False)
@@ -0,0 +1,50 @@
+import textwrap
+import unittest
+
+import hedy
+
+
+class TestSourceMapRanges(unittest.TestCase):
+    def mapped_lines(self, code, level, commands=('assign', 'print')):
+        """Returns the (Hedy line, Python line) of the mapped commands, in the order they are mapped."""
+        source_map = hedy.transpile(code, level, 'en', skip_faulty=False).source_map
+        return [(m['hedy_range']['from_line'], m['python_range']['from_line'])
+                for m in source_map.get_result().values() if m['command'] in commands]
+
+    def test_duplicate_lines_map_to_their_own_line(self):
+        code = textwrap.dedent("""\
+            print 'hallo'
+            print 'daar'
+            print 'hallo'
+            print 'hallo'""")
+
+        self.assertEqual([(1, 1), (2, 2), (3, 3), (4, 4)], self.mapped_lines(code, 4))
+
+    def test_duplicate_lines_in_blocks_map_to_their_own_line(self):
+        code = textwrap.dedent("""\
+            x = 1
+            print x
+            if x = 1
+                x = 1
+                print x
+            x = 1
+            print x""")
+
+        # the Python code has the same lines as the Hedy code
+        expected = [(line, line) for line in [1, 2, 4, 5, 6, 7]]
+        for level in range(12, 17):
+            with self.subTest(level=level):
+                self.assertEqual(expected, self.mapped_lines(code, level))
+
+    def test_duplicate_lines_in_repeat_map_to_their_own_line(self):
+        code = textwrap.dedent("""\
+            print 'hallo'
+            repeat 2 times
+                print 'hallo'
+            print 'hallo'""")
+
+        lines = self.mapped_lines(code, 8)
+
+        self.assertEqual([1, 3, 4], [hedy_line for hedy_line, _ in lines])
+        python_lines = [python_line for _, python_line in lines]
+        self.assertEqual(sorted(set(python_lines)), python_lines)
@@ -0,0 +1,39 @@
+import unittest
+
+import hedy
+from hedy import LookupEntry, SymbolTable
+
+
+def entry(name, definition_line):
+    return LookupEntry(name, None, definition_line, None, False)
+
+
+class TestSymbolTable(unittest.TestCase):
+    def setUp(self):
+        self.table = SymbolTable([entry('dier', 3), entry('dieren', 1), entry('dier', 2), entry('kleur', 5)])
+
+    def test_entries_keep_their_order(self):
+        self.assertEqual(['dier', 'dieren', 'dier', 'kleur'], [e.name for e in self.table])
+        self.assertEqual([3, 2], [e.definition_line for e in self.table.get('dier')])
+        self.assertEqual([], self.table.get('naam'))
+
+    def test_is_defined_before(self):
+        self.assertFalse(self.table.is_defined_before('dier', 1))
+        self.assertTrue(self.table.is_defined_before('dier', 2))
+        self.assertTrue(self.table.is_defined_before('dier', 10))
+        self.assertFalse(self.table.is_defined_before('naam', 10))
+
+    def test_with_prefix(self):
+        self.assertEqual(['dier', 'dier', 'dieren'], [e.name for e in self.table.with_prefix('dier')])
+        self.assertEqual([], self.table.with_prefix('dieret'))
+
+    def test_tokens_find_names(self):
+        self.assertIn(hedy.Token('NAME', 'kleur'), self.table)
+
+    def test_access_before_definition(self):
+        code = "print dier\ndier is kat"
+
+        with self.assertRaises(hedy.exceptions.AccessBeforeAssignException) as context:
+            hedy.transpile(code, 4, 'en', skip_faulty=False)
+
+        self.assertEqual(2, context.exception.arguments['definition_line_number'])
@@ -0,0 +1,67 @@
+import unittest
+
+import exceptions
+from website.transpile_cache import TranspileCache
+
+
+class TestTranspileCache(unittest.TestCase):
+    def test_second_transpile_is_a_hit(self):
+        cache = TranspileCache(max_bytes=1024 * 1024)
+
+        first = cache.transpile('print hallo', 1, 'en')
+        second = cache.transpile('print hallo', 1, 'en')
+
+        self.assertEqual("print('hallo')", first.code)
+        self.assertIs(first, second)
+        self.assertEqual(1, cache.stats()['hits'])
+        self.assertEqual(1, cache.stats()['misses'])
+
+    def test_key_includes_level(self):
+        cache = TranspileCache(max_bytes=1024 * 1024)
+
+        cache.transpile('print hallo', 1, 'en')
+        cache.transpile('print hallo', 2, 'en')
+
+        self.assertEqual(0, cache.stats()['hits'])
+        self.assertEqual(2, cache.stats()['entries'])
+
+    def test_cached_source_map_survives_next_transpile(self):
+        cache = TranspileCache(max_bytes=1024 * 1024)
+
+        first = cache.transpile('print hallo', 1, 'en')
+        mappings = first.source_map.get_result()
+        cache.transpile('print hallo\nprint daar', 1, 'en')
+
+        self.assertEqual(mappings, first.source_map.get_result())
+
+    def test_exceptions_are_cached(self):
+        cache = TranspileCache(max_bytes=1024 * 1024)
+
+        with self.assertRaises(exceptions.InvalidCommandException) as first:
+            cache.transpile('prnt hallo', 1, 'en')
+        with self.assertRaises(exceptions.InvalidCommandException) as second:
+            cache.transpile('prnt hallo', 1, 'en')
+
+        self.assertEqual(1, cache.stats()['hits'])
+        # the arguments are modified by the error translation, so every raise gets its own copy
+        self.assertIsNot(first.exception.arguments, second.exception.arguments)
+        self.assertEqual(first.exception.arguments, second.exception.arguments)
+
+    def test_evicts_least_recently_used(self):
+        cache = TranspileCache(max_bytes=1024 * 1024)
+        cache.transpile('print a', 1, 'en')
+        cache.max_bytes = cache.stats()['bytes']
+
+        cache.transpile('print b', 1, 'en')
+
+        self.assertEqual(1, cache.stats()['entries'])
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def test_zero_budget_disables_cache(self):
+        cache = TranspileCache(max_bytes=0)
+
+        cache.transpile('print hallo', 1, 'en')
+        cache.transpile('print hallo', 1, 'en')
+
+        self.assertEqual(0, cache.stats()['entries'])
+        self.assertEqual(0, cache.stats()['hits'])
@@ -0,0 +1,66 @@
+import unittest
+from unittest import mock
+
+import exceptions
+import hedy
+
+
+class TestTranspileMany(unittest.TestCase):
+    def test_results_in_order_with_errors(self):
+        items = [("print hallo", 1, 'en'), ("prnt hallo", 1, 'en'), ("print 'hallo'", 4, 'en')]
+
+        results = hedy.transpile_many(items, skip_faulty=False)
+
+        self.assertEqual(hedy.transpile("print hallo", 1, 'en').code, results[0].result.code)
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].result)
+        self.assertIsInstance(results[1].error, exceptions.InvalidCommandException)
+        self.assertEqual(hedy.transpile("print 'hallo'", 4, 'en').code, results[2].result.code)
+
+    def test_any_exception_is_an_error_of_the_program(self):
+        def transpile(code, level, lang):
+            if code == 'fail':
+                raise RuntimeError('not a Hedy exception')
+            return code
+
+        results = hedy.transpile_many([("fail", 1, 'en'), ("print a", 1, 'en')], transpile)
+
+        self.assertIsInstance(results[0].error, RuntimeError)
+        self.assertEqual('print a', results[1].result)
+
+    def test_exit_is_not_an_error_of_the_program(self):
+        def transpile(code, level, lang):
+            if code == 'exit':
+                raise SystemExit(1)
+            return code
+
+        with self.assertRaises(SystemExit):
+            hedy.transpile_many([("exit", 1, 'en'), ("print a", 1, 'en')], transpile)
+
+    def test_identical_programs_are_transpiled_once(self):
+        transpile = mock.Mock(side_effect=lambda code, level, lang: code.upper())
+        items = [("print a", 1, 'en'), ("print b", 1, 'en'), ("print a", 1, 'en'), ("print a", 1, 'nl')]
+
+        results = hedy.transpile_many(items, transpile)
+
+        self.assertEqual(['PRINT A', 'PRINT B', 'PRINT A', 'PRINT A'], [r.result for r in results])
+        self.assertEqual(3, transpile.call_count)
+
+    def test_programs_are_grouped_by_level_and_language(self):
+        transpiled = []
+
+        def transpile(code, level, lang):
+            transpiled.append((level, lang))
+
+        items = [("a", 1, 'en'), ("b", 2, 'en'), ("c", 1, 'nl'), ("d", 1, 'en'), ("e", 2, 'en')]
+        hedy.transpile_many(items, transpile)
+
+        self.assertEqual([(1, 'en'), (1, 'en'), (2, 'en'), (2, 'en'), (1, 'nl')], transpiled)
+
+    def test_worker_threads(self):
+        items = [(f"print {i}", 1 + i % 3, 'en') for i in range(12)]
+        expected = hedy.transpile_many(items, skip_faulty=False)
+
+        results = hedy.transpile_many(items, max_workers=4, skip_faulty=False)
+
+        self.assertEqual([r.result.code for r in expected], [r.result.code for r in results])
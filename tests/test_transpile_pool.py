@@ -0,0 +1,113 @@
+import os
+import unittest
+from unittest import mock
+
+from flask import Flask
+from flask_babel import Babel
+
+import exceptions
+import hedy
+from website.transpile_pool import (TranspilePool, TranspileTimeoutError, TranspileWorkerError, babel_app,
+                                    babel_settings_of)
+
+
+class TestTranspilePool(unittest.TestCase):
+    def setUp(self):
+        self.pool = TranspilePool(size=1, timeout=30, warm_levels=[1])
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_transpile_in_worker(self):
+        result = self.pool.transpile('print hallo', 1, 'en')
+
+        self.assertEqual("print('hallo')", result.code)
+        self.assertEqual(2, len(result.source_map.map))
+
+    def test_stats_of_worker_are_returned(self):
+        stats = hedy.TranspileStats()
+        self.pool.transpile('print hallo', 1, 'en', stats=stats)
+
+        self.assertEqual(1, stats.values['convert_cnt'])
+
+    def test_exceptions_are_raised_in_caller(self):
+        with self.assertRaises(exceptions.InvalidCommandException) as context:
+            self.pool.transpile('prnt hallo', 1, 'en')
+
+        self.assertEqual('prnt', context.exception.arguments['invalid_command'])
+
+    def test_worker_is_replaced_after_timeout(self):
+        self.pool.transpile('print hallo', 1, 'en')
+        self.pool.timeout = 0
+
+        with self.assertRaises(TranspileTimeoutError):
+            self.pool.transpile('print hallo', 1, 'en')
+
+        self.pool.timeout = 30
+        self.assertEqual("print('daar')", self.pool.transpile('print daar', 1, 'en').code)
+        self.assertEqual(1, self.pool.stats()['timeouts'])
+        self.assertEqual(1, self.pool.stats()['restarts'])
+
+    def test_waiting_for_a_starting_worker_stops_at_the_deadline(self):
+        self.pool.timeout = 0
+
+        with self.assertRaises(TranspileTimeoutError):
+            self.pool.transpile('print hallo', 1, 'en')
+
+        # the worker that is still starting is not replaced
+        self.assertEqual(0, self.pool.stats()['restarts'])
+        self.assertEqual(1, self.pool.stats()['idle'])
+        self.pool.timeout = 30
+        self.assertEqual("print('daar')", self.pool.transpile('print daar', 1, 'en').code)
+
+    def test_worker_is_dropped_if_it_cant_be_replaced(self):
+        self.pool.transpile('print hallo', 1, 'en')
+        self.pool.timeout = 0
+
+        with mock.patch.object(self.pool, '_new_worker', side_effect=OSError('no more processes')):
+            with self.assertRaises(TranspileTimeoutError):
+                self.pool.transpile('print hallo', 1, 'en')
+
+        self.assertEqual(0, self.pool.stats()['workers'])
+        self.assertEqual(0, self.pool.stats()['idle'])
+        # a new worker is started for the next program
+        self.pool.timeout = 30
+        self.assertEqual("print('daar')", self.pool.transpile('print daar', 1, 'en').code)
+        self.assertEqual(1, self.pool.stats()['workers'])
+
+    def test_dead_workers_are_not_reused(self):
+        self.pool.transpile('print hallo', 1, 'en')
+        worker = self.pool.workers[0]
+        worker.process.kill()
+        worker.process.join()
+
+        with self.assertRaises(TranspileWorkerError):
+            self.pool.transpile('print hallo', 1, 'en')
+
+        self.assertIsNot(worker, self.pool.workers[0])
+        self.assertEqual("print('daar')", self.pool.transpile('print daar', 1, 'en').code)
+
+    def test_size_zero_transpiles_in_process(self):
+        pool = TranspilePool(size=0)
+
+        self.assertEqual("print('hallo')", pool.transpile('print hallo', 1, 'en').code)
+        self.assertEqual([], pool.workers)
+
+    @unittest.skipUnless(os.path.exists('/proc/self/stat'), 'requires /proc')
+    def test_workers_are_forked_from_the_fork_server(self):
+        self.pool.transpile('print hallo', 1, 'en')
+
+        with open(f'/proc/{self.pool.workers[0].process.pid}/stat') as f:
+            parent_pid = int(f.read().split()[3])
+        self.assertNotEqual(os.getpid(), parent_pid)
+
+    def test_workers_use_the_translations_of_the_app(self):
+        app = Flask(__name__, root_path='/srv/hedy')
+        app.config['BABEL_TRANSLATION_DIRECTORIES'] = 'translations;more-translations'
+        Babel(app)
+
+        worker_app = babel_app(babel_settings_of(app))
+
+        self.assertEqual('/srv/hedy', worker_app.root_path)
+        self.assertEqual('translations;more-translations', worker_app.config['BABEL_TRANSLATION_DIRECTORIES'])
+        self.assertIn('babel', worker_app.extensions)
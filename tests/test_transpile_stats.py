@@ -0,0 +1,41 @@
+import unittest
+from unittest import mock
+
+import hedy
+
+
+class TestTranspileStats(unittest.TestCase):
+    def transpile(self, code, level, **kwargs):
+        stats = hedy.TranspileStats()
+        hedy.transpile(code, level, 'en', stats=stats, **kwargs)
+        return stats.values
+
+    def test_phases_are_timed(self):
+        values = self.transpile("naam is Hedy\nprint 'hallo ' naam", 4, skip_faulty=False)
+
+        for phase in ['preprocess', 'get_parser', 'parse', 'analyze', 'type_validation', 'convert', 'source_map']:
+            self.assertEqual(1, values[phase + '_cnt'], phase)
+            self.assertGreaterEqual(values[phase + '_ms'], 0, phase)
+        self.assertNotIn('skip_faulty_cnt', values)
+
+    def test_counters(self):
+        values = self.transpile("print hallo\nprint daar", 2, skip_faulty=False)
+
+        self.assertEqual(2, values['input_lines'])
+        self.assertGreater(values['parse_tree_nodes'], 2)
+        parser_sources = ['parser_memory', 'parser_shared', 'parser_disk', 'parser_build']
+        self.assertEqual(1, sum(values.get(source, 0) for source in parser_sources))
+
+    def test_skip_faulty_is_counted(self):
+        with mock.patch.dict('os.environ', {'ENABLE_SKIP_FAULTY': 'True'}):
+            values = self.transpile("print hallo\nfoo bar", 2)
+
+        self.assertEqual(1, values['skip_faulty_cnt'])
+        self.assertEqual(2, values['preprocess_cnt'])
+
+    def test_update_adds_timings_and_replaces_values(self):
+        stats = hedy.TranspileStats()
+        stats.update({'parse_ms': 2.0, 'parse_cnt': 1, 'input_lines': 3})
+        stats.update({'parse_ms': 1.0, 'parse_cnt': 1, 'input_lines': 5})
+
+        self.assertEqual({'parse_ms': 3.0, 'parse_cnt': 2, 'input_lines': 5}, stats.values)
@@ -1,8 +1,10 @@
 import os
+import tempfile
 import time
 import unittest
+from unittest import mock
 
-from website.yaml_file import YamlFile
+from website.yaml_file import YamlCache, YamlFile
 
 
 class TestYamlFile(unittest.TestCase):
@@ -29,8 +31,9 @@ class TestYamlFile(unittest.TestCase):
             original_data = file.load_uncached()
         original_seconds = time.time() - start
 
-        # Generate the pickle file
-        file.access()
+        # Generate the pickle file, which isn't needed if the file is in the content bundle
+        with mock.patch('website.content_bundle.load', return_value=None):
+            file.load()
 
         start = time.time()
         for _ in range(n):
@@ -41,3 +44,64 @@ class TestYamlFile(unittest.TestCase):
         print(
             f'YAML loading takes {original_seconds / n} seconds, unpickling takes {cached_seconds / n}'
             f'({original_seconds / cached_seconds:.1f}x faster)')
+
+
+class TestYamlCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache = YamlCache(1024 * 1024)
+        patcher = mock.patch('website.yaml_file.YAML_CACHE', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, name, contents):
+        filename = os.path.join(self.directory.name, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(contents)
+        return filename
+
+    def test_data_is_shared_between_requests(self):
+        file = YamlFile(self.write('adventures/nl.yaml', 'a: 1\n'))
+
+        with mock.patch('website.querylog.log_counter') as log_counter:
+            # Outside of a request, every access is a request of its own
+            first = file.access()
+            second = file.access()
+
+        self.assertIs(first, second)
+        self.assertEqual(1, self.cache.stats()['hits'])
+        log_counter.assert_any_call('yaml_loads_adventures_nl')
+        self.assertEqual(2, log_counter.call_count)
+
+    def test_changed_files_are_loaded_again(self):
+        filename = self.write('adventures/nl.yaml', 'a: 1\n')
+        file = YamlFile(filename)
+        file.access()
+
+        self.write('adventures/nl.yaml', 'a: 22\n')
+
+        self.assertEqual({'a': 22}, file.access())
+
+    def test_least_recently_used_language_is_evicted(self):
+        # room for two files
+        cache = YamlCache(1500)
+        data = {'a': 'x' * 300}
+
+        cache.put('adventures/nl.yaml', data, 1)
+        cache.put('quizzes/nl.yaml', data, 1)
+        self.assertEqual(2, cache.stats()['entries'])
+        cache.put('adventures/fr.yaml', data, 1)
+
+        self.assertIsNone(cache.get('adventures/nl.yaml', 1))
+        self.assertIsNone(cache.get('quizzes/nl.yaml', 1))
+        self.assertIs(data, cache.get('adventures/fr.yaml', 1))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def test_disabled_cache(self):
+        cache = YamlCache(0)
+
+        cache.put('adventures/nl.yaml', {'a': 1}, 1)
+
+        self.assertIsNone(cache.get('adventures/nl.yaml', 1))
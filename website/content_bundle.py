@@ -0,0 +1,171 @@
+"""Compiled content bundles, one per language.
+
+The content of a language is spread over a YAML file per type of content
+(content/adventures/nl.yaml, content/quizzes/nl.yaml, ...) of up to a few MB each,
+while most requests only need one adventure or one level of them. A content bundle
+holds all these files of one language in a single binary file, built ahead of
+time by `doit run content_bundle`:
+
+    MAGIC | offset and length of the index (8 bytes each) | values | index
+
+The index is a pickled dict with an entry per YAML file: the modification time
+and size of the YAML file the bundle was built from, and the offset and length of
+the pickled value of every top-level key. Values that are dicts themselves (the
+'adventures' of an adventures file, the 'levels' of a quiz) get an index of their
+own, so that a single adventure or level can be decoded.
+
+The server maps the bundle into memory and decodes values when they are first used
+(see BundledMapping). The pages of the mapped file are shared by all processes on the
+machine. A YAML file that changed after the bundle was built is loaded from the
+YAML file instead.
+"""
+import mmap
+import os
+import pickle
+import struct
+import threading
+from collections.abc import Mapping
+from os import path
+
+from utils import atomic_write_file
+from . import querylog
+
+ROOT_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+CONTENT_DIR = path.join(ROOT_DIR, 'content')
+BUNDLE_DIR = path.join(ROOT_DIR, 'content-bundle')
+
+# The content that is read through the classes in hedy_content, one file per language
+BUNDLED_CONTENT = ['adventures', 'cheatsheets', 'parsons', 'quizzes', 'slides', 'tutorials']
+
+MAGIC = b'HEDYCB01'
+HEADER = struct.Struct('>8sQQ')
+
+_BUNDLES = {}
+_BUNDLES_LOCK = threading.Lock()
+_MISSING = object()
+
+
+class BundledMapping(Mapping):
+    """A read-only dict of which the values are decoded from the bundle when they are first used.
+
+    The decoded values are kept, so callers that read the whole file (such as the
+    adventure loops in hedy_content) decode every value once. Like the rest of the
+    cached content they are shared, so they must never be changed.
+    """
+
+    def __init__(self, buffer, index):
+        self._buffer = buffer
+        self._index = index
+        self._values = {}
+
+    def __getitem__(self, key):
+        value = self._values.get(key, _MISSING)
+        if value is _MISSING:
+            entry = self._index[key]
+            if isinstance(entry, dict):
+                value = BundledMapping(self._buffer, entry)
+            else:
+                offset, length = entry
+                value = pickle.loads(self._buffer[offset:offset + length])
+            self._values[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return f'BundledMapping({list(self._index)!r})'
+
+
+class ContentBundle:
+    """The content bundle of one language, mapped into memory."""
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_length = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f'{filename} is not a content bundle')
+        self._buffer = memoryview(self._mmap)
+        self.index = pickle.loads(self._buffer[index_offset:index_offset + index_length])
+
+    def get(self, content_type, stamp):
+        """Return the data of a type of content, or None if the bundle doesn't have the same version of it."""
+        entry = self.index.get(content_type)
+        if entry is None or entry['stamp'] != stamp:
+            return None
+        return BundledMapping(self._buffer, entry['keys'])
+
+
+def load(filename):
+    """Return the data of a YAML file from its content bundle, or None if it is not bundled."""
+    directory, name = path.split(path.abspath(filename))
+    content_type = path.basename(directory)
+    if path.dirname(directory) != CONTENT_DIR or content_type not in BUNDLED_CONTENT or not name.endswith('.yaml'):
+        return None
+
+    bundle = get_bundle(name[:-len('.yaml')])
+    if bundle is None:
+        return None
+    data = bundle.get(content_type, file_stamp(filename))
+    if data is not None:
+        querylog.log_counter('content_bundle_loads')
+    return data
+
+
+def get_bundle(lang):
+    """Return the bundle of a language, or None if it wasn't built."""
+    with _BUNDLES_LOCK:
+        if lang not in _BUNDLES:
+            filename = path.join(BUNDLE_DIR, f'{lang}.bundle')
+            _BUNDLES[lang] = ContentBundle(filename) if path.isfile(filename) else None
+        return _BUNDLES[lang]
+
+
+def file_stamp(filename):
+    """The modification time and size of a file, which change when the file does."""
+    try:
+        stat = os.stat(filename)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return None
+
+
+def write_bundle(directory, lang, load_yaml):
+    """Write the bundle of a language to the directory. Used at build time by
+    build-tools/heroku/generate-content-bundle.
+
+    `load_yaml` loads the data of a YAML file."""
+    index = {}
+    values = []
+    offset = HEADER.size
+
+    def add(value):
+        nonlocal offset
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        values.append(data)
+        offset += len(data)
+        return offset - len(data), len(data)
+
+    for content_type in BUNDLED_CONTENT:
+        filename = path.join(CONTENT_DIR, content_type, f'{lang}.yaml')
+        if not path.isfile(filename):
+            continue
+        stamp = file_stamp(filename)
+        keys = {}
+        for key, value in load_yaml(filename).items():
+            if isinstance(value, dict):
+                keys[key] = {k: add(v) for k, v in value.items()}
+            else:
+                keys[key] = add(value)
+        index[content_type] = {'stamp': stamp, 'keys': keys}
+
+    data = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+    with atomic_write_file(path.join(directory, f'{lang}.bundle')) as f:
+        f.write(HEADER.pack(MAGIC, offset, len(data)))
+        for value in values:
+            f.write(value)
+        f.write(data)
@@ -6,9 +6,13 @@ import os
 import threading
 import time
 import traceback
+import weakref
 
 logger = logging.getLogger(__name__)
 
+# All queues in this process, to restart their writer threads in forked processes
+_QUEUES = weakref.WeakSet()
+
 
 class LogQueue:
     """A queue of records that still need to be written out.
@@ -29,6 +33,12 @@ class LogQueue:
     We need to use a mutex since the dict we keep the queue in is not
     thread-safe. We do as little work as possible every time we hold the mutex
     to allow for maximum parallelism.
+
+    The queues are created when their modules are imported, which may happen in
+    a process that forks later on (the gunicorn master with preload_app, the fork
+    server of the transpile pool). So the writer thread is only started when the
+    first record is queued, and a forked process gets an empty queue without a
+    thread: the records queued before the fork are written by the parent.
     """
 
     def __init__(self, name, batch_window_s, do_print=False):
@@ -38,8 +48,20 @@ class LogQueue:
         self.transmitter = None
         self.do_print = do_print
         self.mutex = threading.Lock()
-        self.thread = threading.Thread(target=self._write_thread, name=f"{name}Writer", daemon=True)
-        self.thread.start()
+        self.thread = None
+        _QUEUES.add(self)
+
+    def _ensure_thread(self):
+        # Called with the mutex held
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._write_thread, name=f"{self.name}Writer", daemon=True)
+            self.thread.start()
+
+    def _after_fork_in_child(self):
+        # The mutex may have been held by a thread that doesn't exist in this process
+        self.mutex = threading.Lock()
+        self.records_queue = collections.defaultdict(list)
+        self.thread = None
 
     def add(self, data):
         bucket = div_clip(time.time(), self.batch_window_s)
@@ -49,6 +71,7 @@ class LogQueue:
 
         with self.mutex:
             self.records_queue[bucket].append(data)
+            self._ensure_thread()
 
     def set_transmitter(self, transmitter):
         """Configure a function that will be called for every set of records.
@@ -103,6 +126,7 @@ class LogQueue:
                 bucket = div_clip(time.time(), self.batch_window_s)
                 with self.mutex:
                     self.records_queue[bucket].extend(all_records)
+                    self._ensure_thread()
                 os.unlink(claim_name)
             except OSError:
                 pass
@@ -152,6 +176,15 @@ class LogQueue:
             next_wake += self.batch_window_s
 
 
+def _reset_queues_after_fork():
+    for queue in list(_QUEUES):
+        queue._after_fork_in_child()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_queues_after_fork)
+
+
 def div_clip(x, y):
     """Return the highest value < x that's a multiple of y."""
     return int(x // y) * y
@@ -0,0 +1,106 @@
+"""Loading what every worker needs before gunicorn forks the workers.
+
+With PRELOAD_APP=true (see gunicorn.conf.py) the application is imported once, in the
+gunicorn master, and the workers are forked from it. Everything the master loads
+before the fork is shared by all workers, as long as neither of them writes to the
+memory pages it lives in. So the master loads the content, parsers and translations
+that (almost) every worker would otherwise load for itself on its first requests.
+
+Python writes to every object it touches: the reference count of an object changes
+when it is used and the garbage collector keeps its bookkeeping in the objects it
+tracks. The master loads all of this with the garbage collector disabled, and
+`gc.freeze()` then moves all objects that exist at the time of the fork out of the
+reach of the garbage collector, which takes care of the latter.
+
+`memory_usage` tells how much of the memory of a worker is still shared with the
+other workers.
+"""
+import threading
+import time
+
+from flask_babel import force_locale, get_translations
+
+import hedy
+from . import querylog
+
+# How often a worker logs its memory usage, in seconds
+MEMORY_LOG_INTERVAL_S = 60
+
+_last_memory_log = 0
+_last_memory_log_lock = threading.Lock()
+
+
+def preload_content(content):
+    """Load the files of StructuredDataFile objects (Adventures, Quizzes, ...)."""
+    for structured_data_file in content:
+        structured_data_file.file.access()
+
+
+def preload_parsers(levels):
+    """Build or restore the English parsers of the levels, for every backend parse_input uses."""
+    for level in levels:
+        for backend in sorted({'earley', hedy.get_parser_backend(level)}):
+            hedy.get_parser(level, 'en', backend=backend)
+
+
+def preload_translations(flask_app, languages):
+    """Load the Babel catalogs of the languages, which Flask-Babel keeps for the lifetime of the process."""
+    with flask_app.test_request_context():
+        for lang in languages:
+            with force_locale(lang):
+                get_translations()
+
+
+def memory_usage(pid='self'):
+    """Return the memory of a process in bytes, split up into the memory that only this
+    process uses ('unique') and the memory it shares with other processes ('shared').
+
+    'pss' counts shared memory divided by the number of processes that share it, so
+    the sum of 'pss' over all workers is their total memory usage. Returns None if the
+    numbers are not available, which is the case outside of Linux.
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', encoding='utf-8') as f:
+            fields = parse_smaps(f.read())
+    except OSError:
+        return None
+
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'unique': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+    }
+
+
+def parse_smaps(text):
+    """Parse the 'Name: 123 kB' lines of /proc/<pid>/smaps_rollup into a dict of bytes."""
+    fields = {}
+    for line in text.splitlines():
+        name, sep, value = line.partition(':')
+        parts = value.split()
+        if sep and len(parts) == 2 and parts[1] == 'kB' and parts[0].isdigit():
+            fields[name] = int(parts[0]) * 1024
+    return fields
+
+
+def log_memory_usage():
+    """Add the memory usage of this process to the current log record, at most once per MEMORY_LOG_INTERVAL_S."""
+    global _last_memory_log
+
+    now = time.monotonic()
+    with _last_memory_log_lock:
+        if now - _last_memory_log < MEMORY_LOG_INTERVAL_S:
+            return
+        _last_memory_log = now
+
+    usage = memory_usage()
+    if usage is not None:
+        querylog.log_value(**{f'memory_{name}_bytes': value for name, value in usage.items()})
+
+
+def format_memory_usage(usage):
+    """Describe the memory usage of a process for a log line."""
+    if usage is None:
+        return 'memory usage not available'
+    return ', '.join(f'{name} {value // (1024 * 1024)} MB' for name, value in usage.items())
@@ -179,12 +179,17 @@ def log_value(**kwargs):
 
 def log_time(name):
     """Log a time into the currently globally active Log Record."""
-    return THREAD_LOCAL.current_log_record.timer(name)
+    return _current_log_record().timer(name)
 
 
 def log_counter(name, count=1):
     """Increase the count of something in the currently globally active Log Record."""
-    return THREAD_LOCAL.current_log_record.inc(name, count)
+    return _current_log_record().inc(name, count)
+
+
+def _current_log_record():
+    # Threads started during a request (e.g. by hedy.transpile_many) have no record of their own
+    return getattr(THREAD_LOCAL, "current_log_record", None) or NullRecord()
 
 
 def timed(fn):
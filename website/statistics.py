@@ -7,7 +7,8 @@ from flask_babel import gettext
 import utils
 import hedy_content
 import exceptions as hedy_exceptions
-from hedy import check_program_size_is_valid, parse_input, is_program_valid, process_input_string, HEDY_MAX_LEVEL
+from hedy import (check_program_size_is_valid, check_program_complexity_is_valid, parse_input, is_program_valid,
+                  process_input_string, HEDY_MAX_LEVEL)
 import hedy
 import jinja_partials
 from website.flask_helpers import render_template
@@ -17,6 +18,7 @@ from website.auth import is_admin, is_teacher, requires_admin, requires_login
 from .database import Database
 from .website_module import WebsiteModule, route
 from bs4 import BeautifulSoup
+from lark.exceptions import VisitError
 
 """The Key tuple is used to aggregate the raw data by level, time or username."""
 Key = namedtuple("Key", ["name", "class_"])
@@ -681,11 +683,11 @@ class LiveStatisticsModule(WebsiteModule):
 
         # Load in all program data for that specific student
         student_programs = []
-        for item in programs:
+        error_classes = _get_errors_info([(item['code'], item['level'], item['lang']) for item in programs])
+        for item, error_class in zip(programs, error_classes):
             date = utils.delta_timestamp(item['date'])
             # This way we only keep the first 10 lines to show as preview to the user
             code = "\n".join(item['code'].split("\n")[:20])
-            error_class = _get_error_info(item['code'], item['level'], item['lang'])
             student_programs.append(
                 {'id': item['id'],
                  'code': code,
@@ -1228,27 +1230,41 @@ def _get_quiz_info(quiz_stats):
     return quiz_info
 
 
-def _get_error_info(code, level, lang='en'):
+@querylog.timed
+def _get_errors_info(items):
     """
-    Returns the server error given the code written by the student. Since the database only stores whether
-    the code produced an error or not, in order to get the error we have to rerun the code
-    through some hedy logic.
+    Returns the server error, or None, of every (code, level, lang) item written by the student. Since the database
+    only stores whether the code produced an error or not, in order to get the error we have to rerun the code
+    through some hedy logic. Identical programs are checked once.
     """
-    try:
-        check_program_size_is_valid(code)
+    errors = []
+    for result in hedy.transpile_many(items, _check_program):
+        if result.error is not None and not isinstance(result.error, hedy_exceptions.HedyException):
+            raise result.error
+        errors.append(result.error)
+    return errors
+
 
-        level = int(level)
-        if level > HEDY_MAX_LEVEL:
-            raise Exception(f'Levels over {HEDY_MAX_LEVEL} not implemented yet')
+def _check_program(code, level, lang='en'):
+    """Raises the HedyException of the first error in the program, if any."""
+    check_program_size_is_valid(code)
+    check_program_complexity_is_valid(code, level)
 
-        input_string = process_input_string(code, level, lang)
-        program_root = parse_input(input_string, level, lang)
+    level = int(level)
+    if level > HEDY_MAX_LEVEL:
+        raise Exception(f'Levels over {HEDY_MAX_LEVEL} not implemented yet')
 
-        # Checks whether any error production nodes are present in the parse tree
+    input_string = process_input_string(code, level, lang)
+    program_root = parse_input(input_string, level, lang)
+
+    # Checks whether any error production nodes are present in the parse tree
+    try:
         is_program_valid(program_root, input_string, level, lang)
-    except hedy_exceptions.HedyException as exc:
-        return exc
-    return None
+    except VisitError as E:
+        # Exceptions raised inside the validator are wrapped inside a VisitError
+        if isinstance(E.orig_exc, hedy_exceptions.HedyException):
+            raise E.orig_exc
+        raise
 
 
 def _translate_error(error_class, lang):
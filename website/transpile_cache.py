@@ -0,0 +1,190 @@
+import collections
+import glob
+import hashlib
+import os
+import sys
+import threading
+from os import path
+
+from flask import has_request_context
+from flask_babel import get_locale
+
+import exceptions
+import hedy
+from . import querylog
+
+ROOT_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Rough per-entry overhead of a source map mapping (two SourceCode objects, two
+# SourceRange objects and a dict slot). Only used to estimate the memory footprint.
+SOURCE_MAPPING_OVERHEAD_BYTES = 600
+ENTRY_OVERHEAD_BYTES = 1000
+
+
+class TranspileCache:
+    """A bounded, memory-budgeted cache of transpile results.
+
+    Kids run the same (or almost the same) program over and over again, and every
+    run goes through the Earley parser from scratch. This cache remembers the
+    `ParseResult` of a transpilation, keyed by a hash of everything that influences
+    the result: the code, level, language, the debug and unused variable flags and
+    the version of the grammars/transpiler.
+
+    `HedyException`s raised for a key are cached as well, so repeatedly running
+    a faulty program is cheap too.
+
+    Entries are evicted in least-recently-used order as soon as the estimated size
+    of all entries exceeds `max_bytes`. A budget of 0 disables the cache.
+
+    Cache misses are transpiled by `backend`, anything with a `transpile` function
+    that behaves like `hedy.transpile` (such as a `TranspilePool`).
+    """
+
+    def __init__(self, max_bytes, backend=hedy):
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.entries = collections.OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.mutex = threading.Lock()
+
+    def transpile(self, code, level, lang="en", is_debug=False, unused_allowed=False, incremental=False,
+                  stats=None):
+        """Drop-in replacement for `hedy.transpile` that consults the cache first.
+
+        On a cache hit nothing is transpiled, so nothing is added to `stats`.
+        """
+        if self.max_bytes <= 0:
+            return self.backend.transpile(code, level, lang, is_debug=is_debug, unused_allowed=unused_allowed,
+                                          incremental=incremental, stats=stats)
+
+        key = cache_key(code, level, lang, is_debug, unused_allowed)
+        with self.mutex:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is not None:
+            querylog.log_counter('transpile_cache_hit')
+            result, error = entry[0], entry[1]
+            if error is not None:
+                raise copy_exception(error)
+            return result
+
+        querylog.log_counter('transpile_cache_miss')
+        try:
+            result = self.backend.transpile(code, level, lang, is_debug=is_debug, unused_allowed=unused_allowed,
+                                            incremental=incremental, stats=stats)
+        except exceptions.HedyException as ex:
+            error = detach_exception(ex)
+            self._store(key, None, error, estimate_exception_size(error))
+            raise copy_exception(error) from None
+
+        self._store(key, result, None, estimate_result_size(result))
+        return result
+
+    def _store(self, key, result, error, size):
+        if size > self.max_bytes:
+            return
+        with self.mutex:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[2]
+            self.entries[key] = (result, error, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= evicted[2]
+                self.evictions += 1
+
+    def clear(self):
+        with self.mutex:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self.mutex:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def log_stats(self):
+        """Write the process-wide counters of the cache to the current querylog record."""
+        stats = self.stats()
+        querylog.log_value(transpile_cache_entries=stats['entries'],
+                           transpile_cache_bytes=stats['bytes'],
+                           transpile_cache_total_hits=stats['hits'],
+                           transpile_cache_total_misses=stats['misses'])
+
+
+def cache_key(code, level, lang, is_debug, unused_allowed):
+    # The generated Python code contains translated runtime error messages, so the
+    # locale of the current request is part of the key as well.
+    locale = str(get_locale()) if has_request_context() else ''
+    skip_faulty = bool(os.getenv('ENABLE_SKIP_FAULTY', False))
+    raw = '\x00'.join([
+        grammar_version(), str(level), str(lang), str(bool(is_debug)), str(bool(unused_allowed)),
+        str(skip_faulty), locale, code])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+_grammar_version = None
+
+
+def grammar_version():
+    """Return a hash over the files that determine the outcome of a transpilation."""
+    global _grammar_version
+    if _grammar_version is None:
+        files = sorted(glob.glob(path.join(ROOT_DIR, 'grammars', '*.lark')))
+        files += [path.join(ROOT_DIR, name) for name in ['hedy.py', 'hedy_sourcemap.py', 'exceptions.py']]
+        digest = hashlib.sha1()
+        for filename in files:
+            with open(filename, 'rb') as f:
+                digest.update(f.read())
+        _grammar_version = digest.hexdigest()
+    return _grammar_version
+
+
+def detach_exception(ex):
+    # Don't keep the frames of the transpilation alive in the cache
+    return copy_exception(ex).with_traceback(None)
+
+
+def copy_exception(ex):
+    """Shallow copy of a HedyException with its own 'arguments' dict.
+
+    copy.copy would share the 'arguments' dict between the copies, and the error
+    translation in app.py modifies the arguments in place.
+    """
+    clone = ex.__class__.__new__(ex.__class__)
+    clone.args = ex.args
+    clone.__dict__.update(ex.__dict__)
+    clone.arguments = dict(ex.arguments)
+    return clone
+
+
+def estimate_result_size(result):
+    if result is None:
+        return ENTRY_OVERHEAD_BYTES
+    size = ENTRY_OVERHEAD_BYTES + sys.getsizeof(result.code)
+    size += sum(sys.getsizeof(c) for c in result.commands)
+    for hedy_code, python_code in result.source_map.map.items():
+        size += SOURCE_MAPPING_OVERHEAD_BYTES + sys.getsizeof(hedy_code.code) + sys.getsizeof(python_code.code)
+    return size
+
+
+def estimate_exception_size(ex):
+    size = ENTRY_OVERHEAD_BYTES + sum(sys.getsizeof(v) for v in ex.arguments.values())
+    if isinstance(ex, exceptions.WarningException):
+        size += sys.getsizeof(ex.fixed_code or '') + estimate_result_size(ex.fixed_result)
+    return size
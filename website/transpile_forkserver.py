@@ -0,0 +1,11 @@
+"""Imported by the fork server of the TranspilePool, before it forks any worker.
+
+The fork server is a fresh process without threads from which the transpile
+workers are forked (see TranspilePool.start). Everything it loads is shared
+by the workers, so it loads the parsers of the levels the workers warm up.
+"""
+import hedy
+from config import config
+
+for level in config['transpile-pool']['warm_levels']:
+    hedy.get_parser(level, 'en')
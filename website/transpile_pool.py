@@ -0,0 +1,332 @@
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+
+from flask import Flask, has_request_context
+from flask_babel import Babel, force_locale, get_locale
+
+import hedy
+from . import querylog
+
+logger = logging.getLogger(__name__)
+
+# Starting a worker may involve building the parsers it pre-loads, which takes
+# much longer than transpiling a program. A worker that didn't start within this
+# time is replaced. A request only waits for a starting worker until its deadline.
+STARTUP_TIMEOUT_SECONDS = 300
+
+# The modules the fork server loads before it forks the workers. Not the main module
+# of the web server: app.py sets up the database, the configuration and background
+# threads, which the fork server must not have.
+FORKSERVER_PRELOAD = ['hedy', 'website.transpile_pool', 'website.transpile_forkserver']
+
+
+class TranspileTimeoutError(Exception):
+    """Raised when a program could not be transpiled within the deadline."""
+
+    def __init__(self, timeout):
+        super().__init__(f'Transpiling the program took longer than {timeout} seconds')
+        self.timeout = timeout
+
+
+class TranspileWorkerError(Exception):
+    """Raised when a transpile worker process died while handling a request."""
+
+
+class TranspilePool:
+    """Runs `hedy.transpile` in a pool of pre-forked worker processes.
+
+    A pathological program can keep the Earley parser busy for a very long time,
+    and there is no way to interrupt a thread that is doing that. A worker process
+    can be killed though: every request gets a wall-clock deadline, and a worker
+    that overruns it is terminated and replaced by a fresh one.
+
+    The workers are not forked from the web server process: its threads (and the
+    locks they may hold at the time of the fork) would not survive the fork. They
+    are forked from a fork server instead, a process without threads that loads
+    hedy and the parsers once (see website/transpile_forkserver.py), so the workers
+    share those. Before accepting work every worker loads the parsers for
+    `warm_levels` it doesn't have yet.
+
+    With a `size` of 0 the pool is disabled and programs are transpiled in the
+    calling thread, without a deadline. The fork server is required, so the pool
+    only works on platforms that support it.
+    """
+
+    def __init__(self, flask_app=None, size=0, timeout=10, warm_levels=()):
+        self.flask_app = flask_app
+        self.size = size
+        self.timeout = timeout
+        self.warm_levels = list(warm_levels)
+        self.idle = queue.Queue()
+        self.workers = []
+        self.waiting = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.mutex = threading.Lock()
+        self.started = False
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def start(self):
+        """Fork the worker processes. Safe to call more than once."""
+        if not self.enabled:
+            return
+        with self.mutex:
+            if self.started:
+                return
+            self.started = True
+            multiprocessing.get_context('forkserver').set_forkserver_preload(FORKSERVER_PRELOAD)
+            for _ in range(self.size):
+                worker = self._new_worker()
+                self.workers.append(worker)
+                self.idle.put(worker)
+
+    def stop(self):
+        with self.mutex:
+            for worker in self.workers:
+                worker.kill()
+            self.workers = []
+            self.idle = queue.Queue()
+            self.started = False
+
+    def transpile(self, code, level, lang="en", is_debug=False, unused_allowed=False, incremental=False,
+                  stats=None, locale=None):
+        """Drop-in replacement for `hedy.transpile` that runs in one of the workers.
+
+        The messages in the generated code are in `locale`, by default the locale of
+        the current request. Pass it when calling from a thread without a request.
+
+        Raises a `TranspileTimeoutError` if no worker became available, or the
+        worker didn't finish, within the deadline.
+        """
+        if not self.enabled:
+            return hedy.transpile(code, level, lang, is_debug=is_debug, unused_allowed=unused_allowed,
+                                  incremental=incremental, stats=stats)
+        self.start()
+
+        deadline = time.monotonic() + self.timeout
+        worker = self._acquire(deadline)
+        broken = True
+        try:
+            if locale is None and has_request_context():
+                locale = str(get_locale())
+            request = (code, level, lang, is_debug, unused_allowed, incremental, locale)
+            status, payload, stats_values = worker.transpile(request, deadline)
+            broken = False
+        except TimeoutError:
+            self._record_timeout()
+            raise TranspileTimeoutError(self.timeout) from None
+        except (EOFError, OSError) as ex:
+            raise TranspileWorkerError('The transpile worker stopped unexpectedly') from ex
+        finally:
+            self._release(worker, broken)
+
+        if stats is not None:
+            stats.update(stats_values)
+        if status == 'error':
+            raise payload
+        return payload
+
+    def _acquire(self, deadline):
+        self._refill()
+        with self.mutex:
+            self.waiting += 1
+        try:
+            worker = self.idle.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            self._record_timeout()
+            raise TranspileTimeoutError(self.timeout) from None
+        finally:
+            with self.mutex:
+                self.waiting -= 1
+
+        try:
+            ready = worker.wait_until_ready(deadline)
+        except BaseException:
+            self._release(worker, broken=True)
+            raise
+        if not ready:
+            # The worker is still starting, the next request can have it
+            self._release(worker)
+            self._record_timeout()
+            raise TranspileTimeoutError(self.timeout)
+        return worker
+
+    def _release(self, worker, broken=False):
+        """Put a worker back in the idle queue, or a replacement if it is broken or died."""
+        if not broken and worker.alive:
+            self.idle.put(worker)
+            return
+        replacement = self._replace(worker)
+        if replacement is not None:
+            self.idle.put(replacement)
+
+    def _new_worker(self):
+        return TranspileWorker(self.flask_app, self.warm_levels)
+
+    def _replace(self, worker):
+        """Kill a worker and start a new one in its place.
+
+        If no new worker can be started, the worker is dropped from the pool and None is
+        returned. The pool starts new workers for the missing ones later on, see _refill.
+        """
+        worker.kill()
+        try:
+            replacement = self._new_worker()
+        except Exception:
+            logger.exception('Could not start a transpile worker')
+            with self.mutex:
+                self.workers = [w for w in self.workers if w is not worker]
+            return None
+        with self.mutex:
+            self.restarts += 1
+            self.workers = [replacement if w is worker else w for w in self.workers]
+        return replacement
+
+    def _refill(self):
+        """Start new workers for the ones that were dropped from the pool."""
+        with self.mutex:
+            if not self.started or len(self.workers) >= self.size:
+                return
+            try:
+                while len(self.workers) < self.size:
+                    worker = self._new_worker()
+                    self.workers.append(worker)
+                    self.idle.put(worker)
+            except Exception:
+                logger.exception('Could not start a transpile worker')
+
+    def _record_timeout(self):
+        querylog.log_counter('transpile_timeout')
+        with self.mutex:
+            self.timeouts += 1
+
+    def stats(self):
+        with self.mutex:
+            return {
+                'size': self.size,
+                'workers': len(self.workers),
+                'idle': self.idle.qsize(),
+                'waiting': self.waiting,
+                'timeouts': self.timeouts,
+                'restarts': self.restarts,
+            }
+
+    def log_stats(self):
+        """Write the process-wide counters of the pool to the current querylog record."""
+        if not self.enabled:
+            return
+        stats = self.stats()
+        querylog.log_value(transpile_pool_size=stats['size'],
+                           transpile_pool_workers=stats['workers'],
+                           transpile_pool_idle=stats['idle'],
+                           transpile_pool_waiting=stats['waiting'],
+                           transpile_pool_total_timeouts=stats['timeouts'],
+                           transpile_pool_total_restarts=stats['restarts'])
+
+
+class TranspileWorker:
+    """A single worker process of the `TranspilePool`, and the pipe to talk to it."""
+
+    def __init__(self, flask_app, warm_levels):
+        context = multiprocessing.get_context('forkserver')
+        self.connection, child_connection = context.Pipe()
+        # The Flask app can't be sent to the worker, only what it needs to set up the translations
+        babel_settings = babel_settings_of(flask_app) if flask_app else None
+        self.process = context.Process(
+            target=serve, args=(child_connection, babel_settings, warm_levels), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.startup_deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+        self.ready = False
+
+    def wait_until_ready(self, deadline):
+        """Wait until the worker has started, but not beyond the deadline.
+
+        Returns False if the deadline passed first. Raises a `TranspileWorkerError` if the
+        worker failed to start, or didn't start within STARTUP_TIMEOUT_SECONDS.
+        """
+        if self.ready:
+            return True
+        if not self.connection.poll(max(0, min(deadline, self.startup_deadline) - time.monotonic())):
+            if time.monotonic() >= self.startup_deadline:
+                raise TranspileWorkerError('The transpile worker did not start in time')
+            return False
+        try:
+            self.connection.recv()
+        except EOFError:
+            raise TranspileWorkerError('The transpile worker failed to start') from None
+        self.ready = True
+        return True
+
+    @property
+    def alive(self):
+        return self.process.is_alive()
+
+    def transpile(self, request, deadline):
+        self.connection.send(request)
+        if not self.connection.poll(max(0, deadline - time.monotonic())):
+            raise TimeoutError()
+        return self.connection.recv()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+def babel_settings_of(flask_app):
+    """The root path and Babel configuration of a Flask app, see babel_app."""
+    return flask_app.root_path, {k: v for k, v in flask_app.config.items() if k.startswith('BABEL_')}
+
+
+def babel_app(babel_settings):
+    """A Flask app with the translations of the app the settings were taken from."""
+    root_path, config = babel_settings
+    flask_app = Flask(__name__, root_path=root_path)
+    flask_app.config.update(config)
+    Babel(flask_app)
+    return flask_app
+
+
+def serve(connection, babel_settings, warm_levels):
+    """Main loop of a worker process."""
+    # Ctrl-C in the development server is handled by the parent process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    flask_app = babel_app(babel_settings) if babel_settings else None
+
+    for level in warm_levels:
+        hedy.get_parser(level, 'en')
+    connection.send(('ready', None))
+
+    while True:
+        try:
+            code, level, lang, is_debug, unused_allowed, incremental, locale = connection.recv()
+        except EOFError:
+            return
+
+        stats = hedy.TranspileStats()
+        try:
+            if flask_app and locale:
+                with flask_app.app_context(), force_locale(locale):
+                    result = hedy.transpile(code, level, lang, is_debug=is_debug, unused_allowed=unused_allowed,
+                                            incremental=incremental, stats=stats)
+            else:
+                result = hedy.transpile(code, level, lang, is_debug=is_debug, unused_allowed=unused_allowed,
+                                        incremental=incremental, stats=stats)
+            reply = ('ok', result, stats.values)
+        except Exception as ex:
+            reply = ('error', ex.with_traceback(None), stats.values)
+
+        try:
+            connection.send(reply)
+        except Exception as ex:
+            # The result could not be pickled; it can't be sent in pieces, so nothing was written yet
+            connection.send(('error', TranspileWorkerError(f'Could not send the transpile result: {ex}'),
+                             stats.values))
@@ -1,11 +1,15 @@
+import collections
 import hashlib
 import logging
 from os import path
 import os
 import pickle
 import re
+import sys
 import tempfile
-from . import querylog
+import threading
+from collections.abc import Mapping
+from . import content_bundle, querylog
 
 from ruamel import yaml
 
@@ -38,8 +42,11 @@ class YamlFile:
       This means that accessing the same file twice in the same request will only load
       it once. If we don't do this, loading YAMLs takes 2s instead of 1 because of the
       duplicate loads.
-      - To keep the application memory footprint low, we don't cache the data
-        permanently, but drop it after the request is done.
+    - Keeps the loaded data in a process-wide cache with a memory budget (see YamlCache),
+      so that the files used most don't have to be loaded again in the next request.
+      This data is shared between requests, so it must never be changed.
+    - The content that is read one adventure or level at a time is compiled into a
+      bundle per language at build time, see content_bundle.
     - After we have successfully loaded a YAML file, we write a pickled version
       of that YAML file to disk, so that we can load the pickled version faster in
       the future future  (loading pickled data is ~400x faster than parsing a YAML
@@ -82,7 +89,9 @@ class YamlFile:
         can consider changing that behavior to always return an empty dict).
         """
         if self.exists():
-            return self.access()
+            data = self.access()
+            # Data from the content bundle is decoded when it is used
+            return data if isinstance(data, dict) else dict(data)
         return {}
 
     def access(self):
@@ -97,10 +106,15 @@ class YamlFile:
         if cached is not None:
             return cached
 
-        data = self.load()
+        stamp = self._file_stamp(self.filename) if YAML_CACHE.enabled else None
+        data = YAML_CACHE.get(self.filename, stamp)
+        if data is None:
+            data = self.load()
 
-        if not isinstance(data, dict):
-            raise RuntimeError(f"Contents of {self.filename} needs to be a dict, got: {data}")
+            if not isinstance(data, Mapping):
+                raise RuntimeError(f"Contents of {self.filename} needs to be a dict, got: {data}")
+
+            YAML_CACHE.put(self.filename, data, stamp)
 
         yaml_cache[self.filename] = data
         return data
@@ -108,9 +122,16 @@ class YamlFile:
     def load(self):
         """Load the data from disk.
 
-        Load from a pickle file if available, or load the original YAML
-        and write a pickle file otherwise.
+        Load from the content bundle or a pickle file if available, or load
+        the original YAML and write a pickle file otherwise.
         """
+        querylog.log_counter('yaml_loads')
+        querylog.log_counter(f'yaml_loads_{file_slug(self.filename)}')
+
+        bundled = content_bundle.load(self.filename)
+        if bundled is not None:
+            return bundled
+
         yaml_ts = self._file_timestamp(self.filename)
         pickle_ts = self._file_timestamp(self.pickle_filename)
 
@@ -150,6 +171,14 @@ class YamlFile:
         except FileNotFoundError:
             return None
 
+    def _file_stamp(self, filename):
+        """The modification time and size of a file, which change when the file does."""
+        try:
+            stat = os.stat(filename)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
     # Make this object look like a readonly 'dict'
     def __getitem__(self, key):
         return self.access()[key]
@@ -179,6 +208,129 @@ class YamlFile:
         return len(self.access())
 
 
+class YamlCache:
+    """Process-wide cache of the data of YAML files, shared between requests.
+
+    An entry is only used if the file still has the modification time and size it
+    had when it was loaded, otherwise the file is loaded again. The data is shared,
+    so it must never be changed.
+
+    Every language has a file per type of content (adventures/nl.yaml, quizzes/nl.yaml,
+    ...), and a page in a language uses most of them. The cache keeps the data of the
+    languages used most recently, until its (measured) size reaches `max_bytes`. When the
+    cache is full, all files of the least recently used language are evicted together.
+    A `max_bytes` of 0 disables the cache.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # filename -> (data, size, stamp)
+        self.entries = {}
+        # language -> filenames, least recently used first
+        self.languages = collections.OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.mutex = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, filename, stamp):
+        if not self.enabled:
+            return None
+        with self.mutex:
+            entry = self.entries.get(filename)
+            if entry is None or entry[2] != stamp:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.languages.move_to_end(file_language(filename))
+            return entry[0]
+
+    def put(self, filename, data, stamp):
+        if not self.enabled or stamp is None:
+            return
+        size = _data_size(data)
+        if size > self.max_bytes:
+            return
+        language = file_language(filename)
+        with self.mutex:
+            previous = self.entries.pop(filename, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+                self.languages[language].discard(filename)
+            while self.current_bytes + size > self.max_bytes:
+                victim = next((lang for lang in self.languages if lang != language), None)
+                if victim is None:
+                    # The other files of this language take all the space
+                    return
+                for victim_filename in self.languages.pop(victim):
+                    self.current_bytes -= self.entries.pop(victim_filename)[1]
+                self.evictions += 1
+            self.entries[filename] = (data, size, stamp)
+            self.languages.setdefault(language, set()).add(filename)
+            self.languages.move_to_end(language)
+            self.current_bytes += size
+
+    def clear(self):
+        with self.mutex:
+            self.entries.clear()
+            self.languages.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self.mutex:
+            return {
+                'entries': len(self.entries),
+                'languages': len(self.languages),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def log_stats(self):
+        """Write the process-wide counters of the cache to the current querylog record."""
+        stats = self.stats()
+        querylog.log_value(yaml_cache_entries=stats['entries'],
+                           yaml_cache_bytes=stats['bytes'],
+                           yaml_cache_total_hits=stats['hits'],
+                           yaml_cache_total_misses=stats['misses'],
+                           yaml_cache_total_evictions=stats['evictions'])
+
+
+def _data_size(data):
+    """Return the number of bytes used by data loaded from YAML: dicts, lists and scalars."""
+    size = 0
+    todo = [data]
+    while todo:
+        obj = todo.pop()
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            todo.extend(obj.keys())
+            todo.extend(obj.values())
+        elif isinstance(obj, list):
+            todo.extend(obj)
+    return size
+
+
+YAML_CACHE = YamlCache(int(os.getenv('YAML_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
+
+
+def file_language(filename):
+    """The language of a content file, e.g. 'nl' for content/adventures/nl.yaml."""
+    return path.splitext(path.basename(filename))[0]
+
+
+def file_slug(filename):
+    """A short name for a content file to log, e.g. 'adventures_nl' for content/adventures/nl.yaml."""
+    return re.sub(r'[^a-zA-Z0-9_]', '_', f'{path.basename(path.dirname(filename))}_{file_language(filename)}')
+
+
 def pathname_slug(x):
     """Turn a path name into an identifier we can use as a file name.
 